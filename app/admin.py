@@ -0,0 +1,62 @@
+import math
+import time
+
+from flask import Blueprint, render_template
+
+from .app import database, github_client
+from .auth import admin_required
+from .ratelimit import Priority
+
+bp = Blueprint("admin", __name__)
+
+
+@bp.get("/admin/rate-limit")
+@admin_required
+def rate_limit():
+    budget = github_client.budget
+    info = budget.snapshot()
+    if info is None:
+        return {"known": False}
+
+    return {
+        "known": True,
+        "remaining": info["remaining"],
+        "limit": info["limit"],
+        "resets_in": max(0, int(info["reset"] - time.time())),
+        "updated": info["updated"],
+        "allowed": {
+            priority.name.lower(): budget.allows(priority) for priority in Priority
+        },
+        "reserves": {
+            priority.name.lower(): budget.reserves[priority] for priority in Priority
+        },
+    }
+
+
+@bp.app_template_filter("duration")
+def duration(seconds: float | None) -> str:
+    if seconds is None:
+        return "-"
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f}{unit}"
+    return f"{seconds:.0f}s"
+
+
+@bp.app_template_filter("duration_range")
+def duration_range(bounds: tuple[float, float] | None) -> str:
+    if bounds is None:
+        return "-"
+    lower, upper = bounds
+    if math.isinf(upper):
+        return f"over {duration(lower)}"
+    return f"{duration(lower)} to {duration(upper)}"
+
+
+@bp.get("/admin/progress")
+@admin_required
+def progress():
+    """Where students are in each module and how long each step takes them"""
+    return render_template(
+        "admin_progress.html", modules=database.get().sessions.rollup()
+    )
@@ -4,11 +4,14 @@ from authlib.integrations.flask_client import OAuth
 from dotenv import load_dotenv
 from flask import Flask, render_template, session
 
-from .extensions import FlaskGithub, FlaskGitLearner
+from .extensions import FlaskDB, FlaskGithub, FlaskGitLearner
+from .metrics import FlaskMetrics
 
 oauth = OAuth()
+database = FlaskDB()
 github_client = FlaskGithub()
 gitlearner = FlaskGitLearner()
+request_metrics = FlaskMetrics()
 
 
 def create_app() -> Flask:
@@ -23,11 +26,31 @@ def create_app() -> Flask:
         DB_FILE="data.sqlite3",
         GITHUB_APP_ID=int(os.environ["GITHUB_APP_ID"]),
         GITHUB_ORGANIZATION=os.getenv("GITHUB_ORGANIZATION"),
+        GITHUB_WEBHOOK_SECRET=os.getenv("GITHUB_WEBHOOK_SECRET", ""),
+        ADMIN_USERS=[
+            login.strip()
+            for login in os.getenv("ADMIN_USERS", "").split(",")
+            if login.strip()
+        ],
+        POOL_SIZE=int(os.getenv("POOL_SIZE", "0")),
+        POOL_REFILL_INTERVAL=float(os.getenv("POOL_REFILL_INTERVAL", "30")),
+        MIRROR_DIR=os.getenv("MIRROR_DIR", ""),
+        METRICS_TOKEN=os.getenv("METRICS_TOKEN", ""),
+        STEP_CHECK_INTERVAL=float(os.getenv("STEP_CHECK_INTERVAL", "5")),
+        STEP_STREAM_LIFETIME=float(os.getenv("STEP_STREAM_LIFETIME", "60")),
+        STEP_STREAMS=int(os.getenv("STEP_STREAMS", "16")),
+        STEP_STREAMS_PER_USER=int(os.getenv("STEP_STREAMS_PER_USER", "2")),
+        CHECK_CACHE_TTL=float(os.getenv("CHECK_CACHE_TTL", "10")),
+        CHECK_CACHE_SIZE=int(os.getenv("CHECK_CACHE_SIZE", "4096")),
+        SWEEP_INTERVAL=float(os.getenv("SWEEP_INTERVAL", "86400")),
+        SWEEP_CONCURRENCY=int(os.getenv("SWEEP_CONCURRENCY", "4")),
     )
 
     with open(os.environ["GITHUB_PRIVATE_KEY_PATH"]) as f:
         app.config["GITHUB_PRIVATE_KEY"] = f.read()
 
+    database.init_app(app)
+    request_metrics.init_app(app)
     oauth.init_app(app)
     github_client.init_app(app)
     gitlearner.init_app(app)
@@ -66,4 +89,34 @@ def create_app() -> Flask:
 
     app.register_blueprint(modules_bp)
 
+    from .jobs import bp as jobs_bp
+    from .jobs import worker_cli
+
+    app.register_blueprint(jobs_bp)
+    app.cli.add_command(worker_cli)
+
+    from .admin import bp as admin_bp
+
+    app.register_blueprint(admin_bp)
+
+    from .webhooks import bp as webhooks_bp
+
+    app.register_blueprint(webhooks_bp)
+
+    from .metrics import bp as metrics_bp
+
+    app.register_blueprint(metrics_bp)
+
+    from .pool import pool_cli
+
+    app.cli.add_command(pool_cli)
+
+    from .module_templates import templates_cli
+
+    app.cli.add_command(templates_cli)
+
+    from .sweep import sweep_cli
+
+    app.cli.add_command(sweep_cli)
+
     return app
@@ -2,7 +2,7 @@ from functools import wraps
 
 from flask import Blueprint, current_app, redirect, session, url_for
 
-from db import DBManager
+from .app import database
 
 bp = Blueprint("auth", __name__)
 
@@ -17,6 +17,19 @@ def login_required(f):
     return decorated_function
 
 
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user = session.get("user")
+        if user is None:
+            return redirect(url_for("auth.login"))
+        if user["login"] not in current_app.config["ADMIN_USERS"]:
+            return "You are not an administrator", 403
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 @bp.route("/auth/login")
 def login():
     oauth = current_app.config["GITHUB_OAUTH"]
@@ -31,7 +44,7 @@ def authorize():
     oauth.authorize_access_token()
     session["user"] = oauth.get("user").json()
 
-    db = DBManager(current_app.config["DB_FILE"])
+    db = database.get()
     db.add_user(
         session["user"]["name"],
         session["user"]["email"],
@@ -0,0 +1,243 @@
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+
+from flask import current_app
+
+from db.create import DBManager, ModuleContext
+from module_core import CheckResult, Module, Session
+
+from .app import github_client, gitlearner
+from .metrics import labelled
+from .ratelimit import Priority, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# seconds between comment lines that keep idle streams open through proxies
+KEEPALIVE_INTERVAL = 15.0
+
+# seconds a status stream stays open before the browser is asked to reconnect,
+# so no stream holds a worker thread for long
+STREAM_LIFETIME = 60.0
+
+# milliseconds the browser waits before reconnecting a stream that ended
+STREAM_RETRY = 5000
+
+# seconds a check may run before others stop waiting for it and check themselves
+CHECK_LEASE = 30.0
+
+PREPARING_MESSAGE = "This step's repository is still being prepared"
+
+
+class _Flight:
+    """A check running in this worker, which other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: tuple[CheckResult, str] | None = None
+        self.error: BaseException | None = None
+
+
+_flights: dict[tuple[str, int], _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def single_flight(
+    db: DBManager,
+    repo: str,
+    step: int,
+    check: Callable[[], tuple[CheckResult, str]],
+    lease: float = CHECK_LEASE,
+    poll_interval: float = 0.1,
+) -> tuple[CheckResult, str]:
+    """Run a check of a repo's step, or share the result of one already running
+
+    Threads of a worker wait on the running check directly, for up to the
+    lease, and then check for themselves. Workers take a lease on the
+    (repo, step) in the database while they check it, and any other worker
+    polls for the stored result rather than checking again.
+    """
+    key = (repo, step)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leading = flight is None
+        if flight is None:
+            flight = _flights[key] = _Flight()
+
+    if not leading:
+        if not flight.done.wait(lease):
+            # the check is stuck, likely on GitHub, so don't hold this thread on it
+            return _shared_check(db, repo, step, check, lease, poll_interval)
+        if flight.error:
+            raise flight.error
+        assert flight.result
+        return flight.result
+
+    try:
+        flight.result = _shared_check(db, repo, step, check, lease, poll_interval)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _shared_check(
+    db: DBManager,
+    repo: str,
+    step: int,
+    check: Callable[[], tuple[CheckResult, str]],
+    lease: float,
+    poll_interval: float,
+) -> tuple[CheckResult, str]:
+    asked_at = time.time()
+    while True:
+        if db.checks.begin(repo, step, lease):
+            try:
+                result, message = check()
+            except BaseException:
+                db.checks.release(repo, step)
+                raise
+            db.checks.record(repo, step, result.name, message)
+            return result, message
+
+        # another worker is checking, use its result if it finishes with one
+        while True:
+            time.sleep(poll_interval)
+            stored = db.checks.get(repo, step)
+            if not stored:
+                break
+            if (
+                stored["checked_at"] is not None
+                and stored["checked_at"] >= asked_at
+                and stored["status"] in CheckResult.__members__
+            ):
+                return CheckResult[stored["status"]], stored["message"] or ""
+            if stored["running_until"] <= time.time():
+                break
+
+
+def step_session(
+    db: DBManager, module: Module, module_step: int, user: str, context: ModuleContext
+) -> Session:
+    """A user's session at a step, with cached checks shared between callers"""
+    session_info = context["session"]
+    assert session_info
+
+    def checker(session_: Session, step: int) -> tuple[CheckResult, str]:
+        def check() -> tuple[CheckResult, str]:
+            github_client.budget.acquire(Priority.INTERACTIVE)
+            step_ = module[step - 1]
+            with labelled(step=type(step_).__name__):
+                return step_.check(session_.repo, user)
+
+        return single_flight(db, session_info["repo"], step, check)
+
+    return Session(
+        github_client.forge,
+        user,
+        current_app.config["GITHUB_ORGANIZATION"],
+        module,
+        session_info["repo"],
+        module_step,
+        session_info["repo_info"],
+        context["head"],
+        github_client.mirrors,
+        checker,
+        gitlearner.checks,
+        db.state,
+    )
+
+
+def preparing(db: DBManager, context: ModuleContext) -> bool:
+    """Whether a step's action is still queued or running on the session's repo"""
+    session_info = context["session"]
+    assert session_info
+    return db.jobs.pending("step_action", session_info["repo"]) is not None
+
+
+def run_check(
+    db: DBManager, module: Module, module_step: int, user: str, context: ModuleContext
+) -> tuple[CheckResult, str]:
+    """Check a step of a user's session against its repository
+
+    A repository a step's action is still changing isn't checked yet.
+    """
+    if preparing(db, context):
+        return CheckResult.RECOVERABLE, PREPARING_MESSAGE
+    return step_session(db, module, module_step, user, context).check_step()
+
+
+def _event(data: dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def step_events(
+    db_file: str,
+    module: Module,
+    module_name: str,
+    module_step: int,
+    user: str,
+    interval: float,
+    poll_interval: float = 1.0,
+    timeout: float = STREAM_LIFETIME,
+) -> Iterator[str]:
+    """Stream a step's check status as server-sent events until it passes
+
+    Every stream for a repo reads the same stored result. Whichever stream
+    claims the repo first when a check is due runs it, so a repo is checked
+    once per interval (or right after a push) however many pages watch it.
+
+    A stream ends after `timeout` seconds, telling the browser when to
+    reconnect. The stream's connection is opened when it starts and closed
+    when it ends.
+    """
+    deadline = time.monotonic() + timeout
+    last_sent = None
+    last_write = time.monotonic()
+    with DBManager(db_file) as db:
+        while time.monotonic() < deadline:
+            context = db.sessions.context(user, module_name)
+            if not context or not context["session"]:
+                yield _event({"step": module_step, "status": "NO_SESSION"})
+                return
+            repo = context["session"]["repo"]
+
+            if not preparing(db, context) and db.checks.claim(
+                repo, module_step, interval
+            ):
+                try:
+                    run_check(db, module, module_step, user, context)
+                except RateLimitExceeded as e:
+                    db.checks.record(repo, module_step, "RATE_LIMITED", str(e))
+                except Exception:
+                    logger.exception("Checking %s step %s failed", repo, module_step)
+                    db.checks.record(
+                        repo, module_step, "ERROR", "Could not check this step"
+                    )
+
+            check = db.checks.get(repo, module_step)
+            if check and check["status"] and check["checked_at"] != last_sent:
+                last_sent = check["checked_at"]
+                last_write = time.monotonic()
+                yield _event(
+                    {
+                        "step": module_step,
+                        "status": check["status"],
+                        "message": check["message"],
+                    }
+                )
+                if check["status"] == CheckResult.GOOD.name:
+                    return
+            elif time.monotonic() - last_write > KEEPALIVE_INTERVAL:
+                last_write = time.monotonic()
+                yield ": keep-alive\n\n"
+
+            time.sleep(poll_interval)
+
+        yield f"retry: {STREAM_RETRY}\n\n"
@@ -1,19 +1,89 @@
+import fcntl
+import hashlib
+import threading
 import time
+from collections.abc import Callable
 
-from flask import Flask
+from flask import Flask, current_app, g
 from github import Auth, Github, GithubIntegration
 
 from db.create import DBManager
+from module_core import CheckCache, GithubForge, MirrorStore, NameAllocator
 from modules import active_modules
 
+from .metrics import GITHUB_LATENCY, TOKEN_REFRESHES, scope
+from .ratelimit import RateBudget
+from .rendering import InstructionRenderer
+from .streams import StreamSlots
+
+
+class FlaskDB:
+    """A Flask extension that shares one database connection per app context"""
+
+    def __init__(self, app: Flask | None = None):
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        # create the schema once at startup instead of on every request
+        DBManager(app.config["DB_FILE"]).close()
+        app.teardown_appcontext(self.teardown)
+
+    def get(self) -> DBManager:
+        """Get the current app context's connection, opening it on first use"""
+        if "db" not in g:
+            g.db = DBManager(current_app.config["DB_FILE"])
+        return g.db
+
+    def teardown(self, exception: BaseException | None):
+        db = g.pop("db", None)
+        if db is not None:
+            db.close()
+
+
+def _timed(request_json, on_response: Callable[[int, dict], None] | None = None):
+    """Wrap a PyGithub requester's requestJson to time every API call
+
+    Params:
+        on_response: called with the status and headers of each response
+    """
+
+    def timed(verb, url, *args, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = request_json(verb, url, *args, **kwargs)
+            status = str(result[0])
+            if on_response is not None:
+                on_response(result[0], result[1])
+            return result
+        finally:
+            GITHUB_LATENCY.observe(
+                time.perf_counter() - start, verb=verb, status=status, **scope()
+            )
+
+    return timed
+
 
 class FlaskGithub:
-    """A Flask extension that manages a GitHub app's acces token"""
+    """A Flask extension that manages a GitHub app's acces token
+
+    The installation token is cached in the database and shared by every worker.
+    It is loaded on first use, and refreshed ahead of expiry by whichever process
+    notices first while holding a file lock, so only one new token is minted.
+    """
+
+    # refresh tokens this many seconds before they expire
+    REFRESH_MARGIN = 300
 
     def __init__(self, app: Flask | None = None):
         self.github = None
         self.token = None
         self.token_expires = 0
+        self.budget = RateBudget()
+        self.forge = GithubForge(self.get_client)
+        self.mirrors: MirrorStore | None = None
+        self._lock = threading.Lock()
         if app:
             self.init_app(app)
 
@@ -23,21 +93,74 @@ class FlaskGithub:
         private_key = app.config["GITHUB_PRIVATE_KEY"]
 
         self.auth = Auth.AppAuth(app_id, private_key)
+        self.db_file = app.config["DB_FILE"]
+        self.lock_file = app.config.get("GITHUB_TOKEN_LOCK") or self.db_file + ".lock"
+        self.budget.db_file = self.db_file
+        if app.config.get("RATE_LIMIT_RESERVES"):
+            self.budget.reserves = app.config["RATE_LIMIT_RESERVES"]
+        if app.config.get("MIRROR_DIR"):
+            self.mirrors = MirrorStore(
+                app.config["MIRROR_DIR"], self.remote_url, self.git_token
+            )
+
+    def _is_fresh(self, expires_at: float) -> bool:
+        return time.time() < expires_at - self.REFRESH_MARGIN
 
-        self.refresh_token()
+    def _use_token(self, token: str, expires_at: float):
+        self.token = token
+        self.token_expires = expires_at
+
+        # lazy, so repos and orgs can be used without fetching them first
+        self.github = Github(auth=Auth.Token(self.token), lazy=True)
+        requester = self.github.requester
+        requester.requestJson = _timed(  # type: ignore[method-assign]
+            requester.requestJson, self.budget.on_response
+        )
 
     def refresh_token(self):
-        gi = GithubIntegration(auth=self.auth)
-        installation = gi.get_org_installation(self.org_name)
-        access_token = gi.get_access_token(installation.id)
-        self.token = access_token.token
-        self.token_expires = access_token.expires_at.timestamp()
+        """Use the shared token, minting a new one if it is about to expire"""
+        with DBManager(self.db_file) as db:
+            cached = db.tokens.get(self.org_name)
+            if cached and self._is_fresh(cached["expires_at"]):
+                self._use_token(cached["token"], cached["expires_at"])
+                TOKEN_REFRESHES.inc(outcome="shared")
+                return
+
+            with open(self.lock_file, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # another process may have refreshed while we waited for the lock
+                    cached = db.tokens.get(self.org_name)
+                    if cached and self._is_fresh(cached["expires_at"]):
+                        self._use_token(cached["token"], cached["expires_at"])
+                        TOKEN_REFRESHES.inc(outcome="shared")
+                        return
+
+                    gi = GithubIntegration(auth=self.auth)
+                    installation = gi.get_org_installation(self.org_name)
+                    access_token = gi.get_access_token(installation.id)
+                    expires_at = access_token.expires_at.timestamp()
+                    db.tokens.store(self.org_name, access_token.token, expires_at)
+                    self._use_token(access_token.token, expires_at)
+                    TOKEN_REFRESHES.inc(outcome="minted")
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def remote_url(self, full_name: str) -> str:
+        """An HTTPS URL git can fetch a repository from, given the app's token"""
+        return f"https://github.com/{full_name}.git"
 
-        self.github = Github(self.token)
+    def git_token(self) -> str:
+        """The app's token, for git to fetch with"""
+        self.get_client()
+        assert self.token
+        return self.token
 
     def get_client(self):
-        if time.time() > self.token_expires - 60:
-            self.refresh_token()
+        if self.github is None or not self._is_fresh(self.token_expires):
+            with self._lock:
+                if self.github is None or not self._is_fresh(self.token_expires):
+                    self.refresh_token()
         assert self.github
         return self.github
 
@@ -47,12 +170,68 @@ class FlaskGitLearner:
 
     def __init__(self, app: Flask | None = None):
         self.active_modules = active_modules
+        self.renderer = InstructionRenderer()
+        self.checks = CheckCache()
+        self.streams = StreamSlots()
+        self.template_digest = ""
+        self.db_file: str | None = None
+        self._local = threading.local()
+        # repository names are reserved in the database, shared by every worker
+        self.names = NameAllocator(self.reserve_name, release=self.release_name)
         if app:
             self.init_app(app)
 
     def init_app(self, app: Flask):
-        db = DBManager(app.config["DB_FILE"])
-        for module_name, module in self.active_modules.items():
-            db.modules.add(
-                {"name": module_name, "total_steps": len(module), "base_repo": None}
-            )
+        # registered from the registry's entries, so no module is imported here;
+        # each step's instructions are compiled the first time they are shown
+        with DBManager(app.config["DB_FILE"]) as db:
+            for entry in self.active_modules.entries.values():
+                db.modules.add(
+                    {
+                        "name": entry.name,
+                        "total_steps": entry.total_steps,
+                        "base_repo": entry.template,
+                    }
+                )
+
+        self.db_file = app.config["DB_FILE"]
+
+        self.checks.ttl = app.config.get("CHECK_CACHE_TTL", self.checks.ttl)
+        self.checks.size = app.config.get("CHECK_CACHE_SIZE", self.checks.size)
+        self.streams.total = app.config.get("STEP_STREAMS", self.streams.total)
+        self.streams.per_user = app.config.get(
+            "STEP_STREAMS_PER_USER", self.streams.per_user
+        )
+        self.template_digest = self._digest_templates(app)
+
+    def _names_db(self) -> DBManager:
+        assert self.db_file
+        if getattr(self._local, "db", None) is None:
+            self._local.db = DBManager(self.db_file)
+        return self._local.db
+
+    def reserve_name(self, name: str) -> bool:
+        """Reserve a repository name in the database, from any thread"""
+        return self._names_db().names.reserve(name)
+
+    def release_name(self, name: str):
+        """Give back a reserved name whose repository was never created"""
+        self._names_db().names.release(name)
+
+    @staticmethod
+    def _digest_templates(app: Flask) -> str:
+        """Hash the page templates so cached pages change when they do"""
+        digest = hashlib.sha1()
+        loader = app.jinja_loader
+        if loader is not None:
+            for name in sorted(loader.list_templates()):
+                source, _, _ = loader.get_source(app.jinja_env, name)
+                digest.update(source.encode())
+        return digest.hexdigest()
+
+    def step_page_etag(self, *parts: object) -> str:
+        """An ETag for a step page built from everything the page shows"""
+        digest = hashlib.sha1(self.template_digest.encode())
+        for part in parts:
+            digest.update(b"\0" + str(part).encode())
+        return digest.hexdigest()
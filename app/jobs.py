@@ -0,0 +1,261 @@
+import contextlib
+import logging
+import os
+import socket
+import threading
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import click
+from flask import Blueprint, current_app, session
+from flask.cli import AppGroup
+
+from db.create import DBManager
+from db.jobs import JobInfo
+from module_core import Forge, MirrorStore, Module, NameAllocator, Session
+from module_core.steps import repo_info_from
+
+from .app import database
+from .auth import login_required
+from .metrics import labelled, registry
+from .ratelimit import Priority, RateBudget
+from .sweep import forget_repo
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("jobs", __name__)
+worker_cli = AppGroup("worker", help="Run background jobs")
+
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 300.0
+
+
+@dataclass
+class JobContext:
+    """Everything a job handler needs to do its work"""
+
+    db: DBManager
+    forge: Forge
+    org_name: str
+    modules: Mapping[str, Module]
+    job: JobInfo
+    mirrors: MirrorStore | None = None
+    names: NameAllocator | None = None
+
+    @property
+    def payload(self) -> dict[str, Any]:
+        return self.job["payload"]
+
+    def checkpoint(self, **progress: Any):
+        """Save progress so a retried job skips work that already happened"""
+        self.payload.update(progress)
+        self.db.jobs.checkpoint(self.job["id"], self.payload)
+
+
+def create_session(ctx: JobContext) -> dict[str, Any]:
+    """Provision a repository for a user, add them to it and record the session"""
+    user = ctx.payload["user"]
+    module_name = ctx.payload["module"]
+    module = ctx.modules[module_name]
+
+    if "repo_info" not in ctx.payload:
+        pooled_repo = ctx.db.pool.claim(module_name)
+        if pooled_repo:
+            ctx.checkpoint(repo_info=pooled_repo, action_done=True)
+        else:
+            repo = module.create(ctx.forge, ctx.names)
+            ctx.checkpoint(repo_info=repo_info_from(repo), action_done=False)
+
+    info = ctx.payload["repo_info"]
+    session_ = Session(
+        ctx.forge,
+        user,
+        ctx.org_name,
+        module,
+        repo_name=info["name"],
+        repo_info=info,
+        state=ctx.db.state,
+    )
+    if not ctx.payload["action_done"]:
+        with labelled(step=type(module[0]).__name__):
+            module[0].action(session_.repo)
+        ctx.checkpoint(action_done=True)
+
+    session_.add_collaborator()
+
+    existing = ctx.db.sessions.get(user, module_name)
+    recorded = existing and existing["repo"] == info["name"]
+    if not recorded and not ctx.db.sessions.create_from_session(session_):
+        raise RuntimeError(f"Could not record session for {user} in {module_name}")
+
+    return {"repo": info["name"]}
+
+
+def step_action(ctx: JobContext) -> None:
+    """Run a step's action against a session's repository, then move the
+    session on to that step
+
+    The session only advances once the action is done, so the step can't be
+    checked against a repository the action hasn't changed yet.
+    """
+    user = ctx.payload["user"]
+    module_name = ctx.payload["module"]
+    module = ctx.modules[module_name]
+    step = ctx.payload["step"]
+    if not ctx.payload.get("action_done"):
+        session_ = Session(
+            ctx.forge,
+            user,
+            ctx.org_name,
+            module,
+            repo_name=ctx.payload["repo"],
+            current_step=step,
+            repo_info=ctx.payload.get("repo_info"),
+            state=ctx.db.state,
+        )
+        with labelled(step=type(module[step - 1]).__name__):
+            module[step - 1].action(session_.repo)
+        ctx.checkpoint(action_done=True)
+
+    existing = ctx.db.sessions.get(user, module_name)
+    if (
+        existing
+        and existing["repo"] == ctx.payload["repo"]
+        and existing["current_step"] < step
+    ):
+        ctx.db.sessions.update(user, module_name, step)
+
+
+def delete_repo(ctx: JobContext) -> None:
+    """Delete a repository, treating one that is already gone as deleted"""
+    ctx.forge.delete_repo(f"{ctx.org_name}/{ctx.payload['repo']}")
+    forget_repo(ctx.db, ctx.org_name, ctx.payload["repo"], ctx.mirrors)
+
+
+def sync_mirror(ctx: JobContext) -> None:
+    """Fetch a repository's latest pushes into its local mirror"""
+    if ctx.mirrors is not None:
+        ctx.mirrors.sync(f"{ctx.org_name}/{ctx.payload['repo']}")
+
+
+HANDLERS: dict[str, Callable[[JobContext], dict[str, Any] | None]] = {
+    "create_session": create_session,
+    "step_action": step_action,
+    "delete_repo": delete_repo,
+    "sync_mirror": sync_mirror,
+}
+
+PRIORITIES: dict[str, Priority] = {
+    "create_session": Priority.PROVISIONING,
+    "step_action": Priority.PROVISIONING,
+    "delete_repo": Priority.CLEANUP,
+    # git fetches don't count against the API rate limit
+    "sync_mirror": Priority.INTERACTIVE,
+}
+
+
+class Worker:
+    """Claims jobs from the queue and runs them until stopped"""
+
+    def __init__(
+        self,
+        db: DBManager,
+        forge: Forge,
+        org_name: str,
+        modules: Mapping[str, Module],
+        name: str | None = None,
+        poll_interval: float = 1.0,
+        budget: RateBudget | None = None,
+        mirrors: MirrorStore | None = None,
+        names: NameAllocator | None = None,
+    ):
+        self.db = db
+        self.forge = forge
+        self.org_name = org_name
+        self.modules = modules
+        self.budget = budget
+        self.mirrors = mirrors
+        self.names = names
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+
+    def run_once(self) -> bool:
+        """Run a single job if one is ready
+
+        Returns:
+            whether a job was claimed
+        """
+        job = self.db.jobs.claim(self.name)
+        if job is None:
+            return False
+
+        if self.budget is not None:
+            retry_at = self.budget.retry_at(PRIORITIES[job["kind"]])
+            if retry_at is not None:
+                self.db.jobs.defer(job["id"], retry_at)
+                return True
+
+        ctx = JobContext(
+            self.db,
+            self.forge,
+            self.org_name,
+            self.modules,
+            job,
+            self.mirrors,
+            self.names,
+        )
+        try:
+            with labelled(route=f"job:{job['kind']}"):
+                result = HANDLERS[job["kind"]](ctx)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["id"], job["kind"])
+            delay = min(RETRY_BASE_DELAY * 2 ** (job["attempts"] - 1), RETRY_MAX_DELAY)
+            self.db.jobs.fail(job["id"], f"{type(e).__name__}: {e}", delay)
+        else:
+            self.db.jobs.complete(job["id"], result)
+        return True
+
+    def run(self, stopped: threading.Event | None = None):
+        stopped = stopped or threading.Event()
+        while not stopped.is_set():
+            ran = self.run_once()
+            registry.flush()
+            if not ran:
+                stopped.wait(self.poll_interval)
+
+
+@bp.get("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id: int):
+    db = database.get()
+    job = db.jobs.get(job_id)
+    if not job or job["owner"] != session["user"]["login"]:
+        return f"Job {job_id} does not exist!", 404
+
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"] if job["status"] == "failed" else None,
+    }
+
+
+@worker_cli.command("run")
+@click.option("--poll-interval", type=float, default=1.0)
+def run_command(poll_interval: float):
+    """Process background jobs until interrupted"""
+    from .app import github_client, gitlearner
+
+    worker = Worker(
+        DBManager(current_app.config["DB_FILE"]),
+        github_client.forge,
+        current_app.config["GITHUB_ORGANIZATION"],
+        gitlearner.active_modules,
+        poll_interval=poll_interval,
+        budget=github_client.budget,
+        mirrors=github_client.mirrors,
+        names=gitlearner.names,
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        worker.run()
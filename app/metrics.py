@@ -0,0 +1,227 @@
+import json
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Blueprint, Flask, abort, current_app, g, request
+
+from db.create import DBManager
+from db.metrics import Sample
+
+bp = Blueprint("metrics", __name__)
+
+# upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# what the code running right now is doing, attached to GitHub calls and queries
+_scope: ContextVar[dict[str, str] | None] = ContextVar("metrics_scope", default=None)
+
+
+@contextmanager
+def labelled(**labels: str) -> Iterator[None]:
+    """Attribute GitHub calls and queries made inside the block to these labels"""
+    token = _scope.set({**scope(), **labels})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def scope() -> dict[str, str]:
+    return _scope.get() or {"route": "", "step": ""}
+
+
+def _bound(le: float) -> str:
+    return "+Inf" if math.isinf(le) else f"{le:g}"
+
+
+class Counter:
+    def __init__(self, registry: "Registry", name: str, help: str):
+        self.registry = registry
+        self.name = name
+        self.help = help
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        self.registry.add(self.name, labels, "total", amount)
+
+
+class Histogram:
+    def __init__(self, registry: "Registry", name: str, help: str):
+        self.registry = registry
+        self.name = name
+        self.help = help
+
+    def observe(self, value: float, **labels: str):
+        le = next((bound for bound in BUCKETS if value <= bound), math.inf)
+        self.registry.add(self.name, labels, _bound(le), 1)
+        self.registry.add(self.name, labels, "sum", value)
+        self.registry.add(self.name, labels, "count", 1)
+
+
+class Registry:
+    """Collects metrics in memory and adds them to the database now and then
+
+    Every worker flushes its own totals, so the database holds the sum across
+    workers and any of them can serve the combined numbers.
+    """
+
+    def __init__(self, db_file: str | None = None, flush_interval: float = 1.0):
+        self.db_file = db_file
+        self.flush_interval = flush_interval
+        self.metrics: dict[str, Counter | Histogram] = {}
+        self._pending: dict[tuple[str, str, str], float] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def counter(self, name: str, help: str) -> Counter:
+        counter = Counter(self, name, help)
+        self.metrics[name] = counter
+        return counter
+
+    def histogram(self, name: str, help: str) -> Histogram:
+        histogram = Histogram(self, name, help)
+        self.metrics[name] = histogram
+        return histogram
+
+    def add(self, name: str, labels: dict[str, str], series: str, amount: float):
+        key = (name, json.dumps(labels, sort_keys=True), series)
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + amount
+
+    def _db(self) -> DBManager:
+        assert self.db_file
+        if getattr(self._local, "db", None) is None:
+            self._local.db = DBManager(self.db_file)
+        return self._local.db
+
+    def flush(self, force: bool = False):
+        """Add pending metrics to the database if the flush interval has passed"""
+        if self.db_file is None:
+            return
+        if not force and time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if pending:
+            samples = [(*key, amount) for key, amount in pending.items()]
+            self._db().metrics.add(samples)
+
+    def render(self) -> str:
+        """Every worker's metrics in the Prometheus text format"""
+        self.flush(force=True)
+        return render(self.metrics, self._db().metrics.all())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def render(metrics: dict[str, Counter | Histogram], samples: list[Sample]) -> str:
+    series: dict[str, dict[str, dict[str, float]]] = {}
+    for name, labels, key, value in samples:
+        series.setdefault(name, {}).setdefault(labels, {})[key] = value
+
+    lines: list[str] = []
+    for name, metric in metrics.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        if isinstance(metric, Counter):
+            lines.append(f"# TYPE {name} counter")
+            for labels, values in sorted(series.get(name, {}).items()):
+                text = _labels_text(json.loads(labels))
+                lines.append(f"{name}{text} {values.get('total', 0):g}")
+            continue
+
+        lines.append(f"# TYPE {name} histogram")
+        for labels, values in sorted(series.get(name, {}).items()):
+            label_dict = json.loads(labels)
+            cumulative = 0.0
+            for le in (*BUCKETS, math.inf):
+                cumulative += values.get(_bound(le), 0)
+                text = _labels_text({**label_dict, "le": _bound(le)})
+                lines.append(f"{name}_bucket{text} {cumulative:g}")
+            text = _labels_text(label_dict)
+            lines.append(f"{name}_sum{text} {values.get('sum', 0):g}")
+            lines.append(f"{name}_count{text} {values.get('count', 0):g}")
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    "gitlearner_http_request_duration_seconds", "Time spent handling requests"
+)
+GITHUB_LATENCY = registry.histogram(
+    "gitlearner_github_request_duration_seconds",
+    "Time spent waiting on the GitHub API, by route and step",
+)
+QUERY_LATENCY = registry.histogram(
+    "gitlearner_sqlite_query_duration_seconds", "Time spent running SQLite statements"
+)
+TOKEN_REFRESHES = registry.counter(
+    "gitlearner_github_token_refreshes_total",
+    "Installation token loads, by whether the token was shared or newly minted",
+)
+
+
+def _observe_query(statement: str, seconds: float):
+    QUERY_LATENCY.observe(seconds, statement=statement, **scope())
+
+
+class FlaskMetrics:
+    """A Flask extension timing requests and the work done while serving them"""
+
+    def __init__(self, app: Flask | None = None):
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        registry.db_file = app.config["DB_FILE"]
+        DBManager.query_observer = _observe_query
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+
+    @staticmethod
+    def _start():
+        g.metrics_start = time.perf_counter()
+        g.metrics_scope = _scope.set(
+            {"route": request.endpoint or "unmatched", "step": ""}
+        )
+
+    @staticmethod
+    def _finish(response):
+        if "metrics_start" in g:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - g.metrics_start,
+                route=request.endpoint or "unmatched",
+                method=request.method,
+                status=str(response.status_code),
+            )
+        return response
+
+    @staticmethod
+    def _teardown(exception: BaseException | None):
+        token = g.pop("metrics_scope", None)
+        if token is not None:
+            _scope.reset(token)
+        registry.flush()
+
+
+@bp.get("/metrics")
+def metrics_page():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(401)
+    return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
@@ -0,0 +1,55 @@
+import click
+from flask.cli import AppGroup
+
+from module_core import RepoNotFound, TemplateDrift, sync_template, template_drift
+
+templates_cli = AppGroup(
+    "templates", help="Manage the template repositories modules start from"
+)
+
+
+def _describe(drift: TemplateDrift) -> str:
+    parts = [
+        f"{label}: {', '.join(paths)}"
+        for label, paths in (
+            ("missing", drift.missing),
+            ("changed", drift.changed),
+            ("extra", drift.extra),
+        )
+        if paths
+    ]
+    return "; ".join(parts) if parts else "up to date"
+
+
+@templates_cli.command("check")
+def check_command():
+    """Report templates that have drifted from their module's seed files"""
+    from .app import github_client, gitlearner
+
+    drifted = False
+    for module_name, module in gitlearner.active_modules.items():
+        if module.template is None:
+            continue
+        try:
+            drift = template_drift(github_client.forge, module)
+        except RepoNotFound:
+            click.echo(f"{module_name}: {module.template} does not exist")
+            drifted = True
+            continue
+        click.echo(f"{module_name}: {module.template} {_describe(drift)}")
+        drifted = drifted or bool(drift.missing or drift.changed)
+
+    if drifted:
+        raise SystemExit(1)
+
+
+@templates_cli.command("sync")
+def sync_command():
+    """Create missing templates and bring drifted ones back to the seed files"""
+    from .app import github_client, gitlearner
+
+    for module_name, module in gitlearner.active_modules.items():
+        if module.template is None:
+            continue
+        drift = sync_template(github_client.forge, module)
+        click.echo(f"{module_name}: {module.template} was {_describe(drift)}")
@@ -1,27 +1,72 @@
-import markdown
+import time
+import uuid
+
 from flask import (
     Blueprint,
+    Response,
     current_app,
+    g,
+    make_response,
     redirect,
     render_template,
+    request,
     session,
+    stream_with_context,
     url_for,
 )
 
-from db.create import DBManager
+from db.create import ModuleContext, SessionInfo
 from module_core import CheckResult, Session
 from module_core.steps import UnrecoverableRepoStateException
 from modules import active_modules as ACTIVE_MODULES
 
-from .app import github_client, gitlearner
+from .app import database, github_client, gitlearner
 from .auth import login_required
+from .checks import (
+    PREPARING_MESSAGE,
+    preparing,
+    run_check,
+    step_events,
+    step_session,
+)
+from .ratelimit import RateLimitExceeded
 
 bp = Blueprint("modules", __name__)
 
 
+@bp.errorhandler(RateLimitExceeded)
+def rate_limited(e: RateLimitExceeded):
+    response = make_response(
+        {"status": "RATE_LIMITED", "message": str(e), "toast": str(e)}, 503
+    )
+    response.retry_after = max(0, int(e.retry_at - time.time()))
+    return response
+
+
+def load_context(module_name: str) -> ModuleContext | None:
+    """Get the module, the user's session and its repo's latest push
+
+    Loaded by a single query the first time it is needed in a request.
+    """
+    if "module_context" not in g:
+        g.module_context = database.get().sessions.context(
+            session["user"]["login"], module_name
+        )
+    return g.module_context
+
+
+def session_key(session_info: SessionInfo) -> str:
+    """Names a session in job idempotency keys
+
+    Repository names are reused once freed, so the key includes when the
+    session was created to keep its jobs apart from an earlier session's.
+    """
+    return f"{session_info['repo']}:{session_info['created'].isoformat()}"
+
+
 @bp.route("/modules")
 def modules_home():
-    db = DBManager(current_app.config["DB_FILE"])
+    db = database.get()
     modules = db.modules.get()
     return render_template("modules_home.html", modules=modules)
 
@@ -29,86 +74,83 @@ def modules_home():
 @bp.route("/modules/<module_name>")
 @login_required
 def module_page(module_name: str):
-    db = DBManager(current_app.config["DB_FILE"])
-    module = db.modules.get(module_name)
-    if not module:
+    context = load_context(module_name)
+    if not context:
         return f"Module {module_name} does not exist!", 404
 
-    github = session["user"]["login"]
+    module = context["module"]
+    job_id = request.args.get("job", type=int)
+    new_session_key = uuid.uuid4().hex
 
-    session_info = db.sessions.get(github, module_name)
+    session_info = context["session"]
     if session_info:
         org_name = current_app.config["GITHUB_ORGANIZATION"]
         repo_url = f"https://github.com/{org_name}/" + session_info["repo"]
         return render_template(
-            "module.html", module=module, session_info=session_info, repo_url=repo_url
+            "module.html",
+            module=module,
+            session_info=session_info,
+            repo_url=repo_url,
+            job_id=job_id,
+            new_session_key=new_session_key,
         )
 
-    return render_template("module.html", module=module)
+    return render_template(
+        "module.html", module=module, job_id=job_id, new_session_key=new_session_key
+    )
 
 
 @bp.get("/modules/<module_name>/new")
 @login_required
 def new_session(module_name: str):
-    db = DBManager(current_app.config["DB_FILE"])
-    module_info = db.modules.get(module_name)
-    if not module_info or module_name not in ACTIVE_MODULES:
+    context = load_context(module_name)
+    if not context or module_name not in ACTIVE_MODULES:
         return f"Module {module_name} does not exist!", 404
 
-    github = github_client.get_client()
+    db = database.get()
     gh_user = session["user"]["login"]
-    org_name = current_app.config["GITHUB_ORGANIZATION"]
-    module = ACTIVE_MODULES[module_name]
+    request_key = request.args.get("key") or uuid.uuid4().hex
 
     # delete old session
-    session_info = db.sessions.get(gh_user, module_name)
+    session_info = context["session"]
     if session_info:
-        Session(
-            github, gh_user, org_name, module, repo_name=session_info["repo"]
-        ).cleanup()
-        db.sessions.delete(gh_user, module_name)
-
-    # create new session
-    session_ = Session(github, gh_user, org_name, module)
-    session_created = db.sessions.create_from_session(session_)
-    if session_created:
-        session_.module[0].action(session_.repo)
-        return redirect(
-            url_for("modules.module_step", module_name=module_name, module_step=1)
+        db.jobs.enqueue(
+            "delete_repo",
+            {"repo": session_info["repo"]},
+            idempotency_key=f"delete_repo:{session_key(session_info)}",
+            owner=gh_user,
         )
+        db.sessions.delete(gh_user, module_name)
 
-    return "An error occured while creating a session", 500
+    # create new session in the background
+    job_id = db.jobs.enqueue(
+        "create_session",
+        {"user": gh_user, "module": module_name},
+        idempotency_key=f"create_session:{gh_user}:{module_name}:{request_key}",
+        owner=gh_user,
+    )
+    return redirect(url_for("modules.module_page", module_name=module_name, job=job_id))
 
 
 @bp.post("/modules/<module_name>/step/<int:module_step>")
 @login_required
 def module_step_check(module_name: str, module_step: int):
-    db = DBManager(current_app.config["DB_FILE"])
-    module_info = db.modules.get(module_name)
-    assert not isinstance(module_info, list)
-
-    if not module_info:
+    context = load_context(module_name)
+    if not context:
         return f"Module {module_name} does not exist!", 404
-    if not 0 < module_step <= module_info["total_steps"]:
+    if not 0 < module_step <= context["module"]["total_steps"]:
         return f"Step {module_step} does not exist!", 404
 
     gh_user = session["user"]["login"]
-    session_info = db.sessions.get(gh_user, module_name)
+    session_info = context["session"]
     if not session_info:
         return f"No session found for {gh_user} in {module_name}", 404
 
     module = ACTIVE_MODULES[module_name]
-    session_ = Session(
-        github_client.get_client(),
-        gh_user,
-        current_app.config["GITHUB_ORGANIZATION"],
-        module,
-        session_info["repo"],
-        module_step,
-    )
-
     response: dict[str, int | str] = {"step": module_step}
-    result, response["message"] = module[module_step - 1].check(session_.repo, gh_user)
+    result, response["message"] = run_check(
+        database.get(), module, module_step, gh_user, context
+    )
     match result:
         case CheckResult.GOOD:
             response["status"] = "GOOD"
@@ -122,61 +164,113 @@ def module_step_check(module_name: str, module_step: int):
     return response
 
 
+@bp.get("/modules/<module_name>/step/<int:module_step>/events")
+@login_required
+def module_step_events(module_name: str, module_step: int):
+    context = load_context(module_name)
+    if not context or module_name not in ACTIVE_MODULES:
+        return f"Module {module_name} does not exist!", 404
+    if not 0 < module_step <= context["module"]["total_steps"]:
+        return f"Step {module_step} does not exist!", 404
+    if not context["session"]:
+        return f"No session found for {session['user']['login']} in {module_name}", 404
+
+    gh_user = session["user"]["login"]
+    if not gitlearner.streams.acquire(gh_user):
+        return "Too many step pages are following their status", 429
+
+    events = step_events(
+        current_app.config["DB_FILE"],
+        ACTIVE_MODULES[module_name],
+        module_name,
+        module_step,
+        gh_user,
+        current_app.config["STEP_CHECK_INTERVAL"],
+        timeout=current_app.config["STEP_STREAM_LIFETIME"],
+    )
+    response = Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(lambda: gitlearner.streams.release(gh_user))
+    return response
+
+
 @bp.get("/modules/<module_name>/step/<int:module_step>")
 @login_required
 def module_step(module_name: str, module_step: int):
-    db = DBManager(current_app.config["DB_FILE"])
-    module_info = db.modules.get(module_name)
-    assert not isinstance(module_info, list)
-
-    if not module_info:
+    context = load_context(module_name)
+    if not context:
         return f"Module {module_name} does not exist!", 404
+    module_info = context["module"]
     if not 0 < module_step <= module_info["total_steps"]:
         return f"Step {module_step} does not exist!", 404
 
     gh_user = session["user"]["login"]
-    session_info = db.sessions.get(gh_user, module_name)
-    assert session_info
+    session_info = context["session"]
+    if not session_info:
+        return redirect(url_for("modules.module_page", module_name=module_name))
 
     module = ACTIVE_MODULES[module_name]
 
     session_ = Session(
-        github_client.get_client(),
+        github_client.forge,
         gh_user,
         current_app.config["GITHUB_ORGANIZATION"],
         module,
         session_info["repo"],
         session_info["current_step"],
+        session_info["repo_info"],
+        state=database.get().state,
     )
-    instructions = module[module_step - 1].instructions(session_.repo)
-    parsed_instructions = markdown.markdown(
-        instructions, extensions=["fenced_code", "codehilite"]
+    job_id = request.args.get("job", type=int)
+    parsed_instructions, instructions_digest = gitlearner.renderer.render(
+        module, module_step - 1, session_.repo
     )
 
-    org_name = current_app.config["GITHUB_ORGANIZATION"]
-
-    return render_template(
-        "module_step.html",
-        module_info=module_info,
-        module_step=module_step,
-        repo_url=f"https://github.com/{org_name}/{session_info['repo']}",
-        session_info=session_info,
-        step_instructions=parsed_instructions,
+    etag = gitlearner.step_page_etag(
+        module_name,
+        module_step,
+        module_info["total_steps"],
+        session_info["repo"],
+        session_info["current_step"],
+        instructions_digest,
+        job_id,
     )
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        org_name = current_app.config["GITHUB_ORGANIZATION"]
+        response = make_response(
+            render_template(
+                "module_step.html",
+                module_info=module_info,
+                module_step=module_step,
+                repo_url=f"https://github.com/{org_name}/{session_info['repo']}",
+                session_info=session_info,
+                step_instructions=parsed_instructions,
+                job_id=job_id,
+            )
+        )
+
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 
 @bp.post("/modules/<module_name>/step/<int:module_step>/next")
 @login_required
 def module_step_next(module_name: str, module_step: int):
-    db = DBManager(current_app.config["DB_FILE"])
-    module_info = db.modules.get(module_name)
-    assert not isinstance(module_info, list)
-
-    if not 0 < module_step + 1 <= module_info["total_steps"]:
+    context = load_context(module_name)
+    if not context:
+        return f"Module {module_name} does not exist!", 404
+    if not 0 < module_step + 1 <= context["module"]["total_steps"]:
         return f"No next step {module_step + 1}!", 404
 
     gh_user = session["user"]["login"]
-    session_info = db.sessions.get(gh_user, module_name)
+    session_info = context["session"]
     if not session_info:
         return f"No session for {gh_user} in module {module_name}", 404
 
@@ -187,31 +281,41 @@ def module_step_next(module_name: str, module_step: int):
             400,
         )
 
-    module = gitlearner.active_modules[module_name]
+    db = database.get()
+    if preparing(db, context):
+        return {"toast": PREPARING_MESSAGE, "status": "Recoverable"}
 
-    session_ = Session(
-        github_client.get_client(),
-        gh_user,
-        current_app.config["GITHUB_ORGANIZATION"],
-        module,
-        session_info["repo"],
-        session_info["current_step"],
-    )
+    module = gitlearner.active_modules[module_name]
+    session_ = step_session(db, module, module_step, gh_user, context)
 
     try:
-        can_continue = session_.next()
+        can_continue = session_.next(run_action=False)
     except UnrecoverableRepoStateException as e:
         return {"toast": str(e), "status": "Unrecoverable"}
 
     if can_continue:
+        # the job moves the session on once the next step's action is done
         next_step = session_.current_step
-        db.sessions.update(gh_user, module_name, next_step)
+        job_id = db.jobs.enqueue(
+            "step_action",
+            {
+                "user": gh_user,
+                "module": module_name,
+                "repo": session_info["repo"],
+                "repo_info": session_info["repo_info"],
+                "step": next_step,
+            },
+            idempotency_key=f"step_action:{session_key(session_info)}:{next_step}",
+            owner=gh_user,
+        )
         return {
+            "job": job_id,
             "url": url_for(
                 "modules.module_step",
                 module_name=module_name,
                 module_step=next_step,
-            )
+                job=job_id,
+            ),
         }
 
     return {"toast": session_.toast, "status": "Recoverable"}
@@ -220,11 +324,11 @@ def module_step_next(module_name: str, module_step: int):
 @bp.get("/modules/<module_name>/progress")
 @login_required
 def module_progress(module_name: str):
-    db = DBManager(current_app.config["DB_FILE"])
-    gh_user = session["user"]["login"]
-    progress = db.sessions.progress(gh_user, module_name)
-
-    if progress is None:
+    context = load_context(module_name)
+    if not context or not context["session"]:
         return "Could not find user's progress on session", 404
 
-    return progress
+    return {
+        "current_step": context["session"]["current_step"],
+        "total_steps": context["module"]["total_steps"],
+    }
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections.abc import Mapping
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from db.create import DBManager
+from module_core import Forge, Module, NameAllocator
+from module_core.steps import repo_info_from
+
+from .ratelimit import Priority, RateBudget
+
+logger = logging.getLogger(__name__)
+
+pool_cli = AppGroup("pool", help="Manage the pool of pre-provisioned repositories")
+
+
+def refill_pool(
+    db: DBManager,
+    forge: Forge,
+    modules: Mapping[str, Module],
+    size: int,
+    budget: RateBudget | None = None,
+    names: NameAllocator | None = None,
+) -> int:
+    """Provision repositories until every module's pool holds `size` of them
+
+    Stops early when the rate limit budget can't spare provisioning work.
+
+    Returns:
+        the number of repositories added across all pools
+    """
+    added = 0
+    for module_name, module in modules.items():
+        missing = size - db.pool.count(module_name)
+        for _ in range(missing):
+            if budget is not None and not budget.allows(Priority.PROVISIONING):
+                return added
+            repo = module.provision(forge, names)
+            if db.pool.add(module_name, repo_info_from(repo)):
+                added += 1
+            else:
+                logger.warning("Could not pool %s, deleting it", repo.name)
+                repo.delete()
+    return added
+
+
+class PoolRefiller(threading.Thread):
+    """A background thread that keeps every module's pool topped up"""
+
+    def __init__(
+        self,
+        db_file: str,
+        forge: Forge,
+        modules: Mapping[str, Module],
+        size: int,
+        interval: float,
+        budget: RateBudget | None = None,
+        names: NameAllocator | None = None,
+    ):
+        super().__init__(daemon=True, name="pool-refiller")
+        self.db_file = db_file
+        self.forge = forge
+        self.modules = modules
+        self.size = size
+        self.interval = interval
+        self.budget = budget
+        self.names = names
+        self.stopped = threading.Event()
+
+    def run(self):
+        db = DBManager(self.db_file)
+        while not self.stopped.is_set():
+            try:
+                refill_pool(
+                    db, self.forge, self.modules, self.size, self.budget, self.names
+                )
+            except Exception:
+                logger.exception("Refilling the repository pool failed")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+@pool_cli.command("refill")
+@click.option("--size", type=int, help="Repositories to keep per module")
+@click.option("--loop", is_flag=True, help="Keep refilling until interrupted")
+def refill_command(size: int | None, loop: bool):
+    """Provision repositories for each module's pool"""
+    from .app import github_client, gitlearner
+
+    size = size if size is not None else current_app.config["POOL_SIZE"]
+    db = DBManager(current_app.config["DB_FILE"])
+    if not loop:
+        added = refill_pool(
+            db,
+            github_client.forge,
+            gitlearner.active_modules,
+            size,
+            github_client.budget,
+            gitlearner.names,
+        )
+        click.echo(f"Added {added} repositories")
+        return
+
+    refiller = PoolRefiller(
+        current_app.config["DB_FILE"],
+        github_client.forge,
+        gitlearner.active_modules,
+        size,
+        current_app.config["POOL_REFILL_INTERVAL"],
+        github_client.budget,
+        gitlearner.names,
+    )
+    refiller.start()
+    try:
+        while refiller.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        refiller.stop()
+
+
+@pool_cli.command("status")
+def status_command():
+    """Show how many repositories are ready for each module"""
+    from .app import gitlearner
+
+    db = DBManager(current_app.config["DB_FILE"])
+    for module_name in gitlearner.active_modules:
+        click.echo(f"{module_name}: {db.pool.count(module_name)}")
@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from enum import IntEnum
+
+from db.create import DBManager
+from db.ratelimits import RateLimitInfo
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """How important a piece of GitHub work is, most important first"""
+
+    INTERACTIVE = 0
+    PROVISIONING = 1
+    CLEANUP = 2
+
+
+# fraction of the hourly limit held back from each priority
+DEFAULT_RESERVES = {
+    Priority.INTERACTIVE: 0.0,
+    Priority.PROVISIONING: 0.1,
+    Priority.CLEANUP: 0.3,
+}
+
+
+class RateLimitExceeded(Exception):
+    """There is not enough rate limit left for work of this priority"""
+
+    def __init__(self, priority: Priority, retry_at: float):
+        self.priority = priority
+        self.retry_at = retry_at
+        super().__init__(
+            f"GitHub rate limit too low for {priority.name.lower()} work,"
+            + f" retry in {max(0, int(retry_at - time.time()))}s"
+        )
+
+
+class RateBudget:
+    """Tracks the GitHub App's rate limit across workers and rations it by priority
+
+    The X-RateLimit headers of every response are written to the database, so
+    every gunicorn worker and background process sees the same budget.
+    """
+
+    # write the shared budget when this many calls were used since the last write
+    WRITE_STEP = 50
+    # or when this many seconds passed since the last write
+    WRITE_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        db_file: str | None = None,
+        reserves: dict[Priority, float] | None = None,
+    ):
+        self.db_file = db_file
+        self.reserves = reserves or DEFAULT_RESERVES
+        self._local = threading.local()
+        # the last rate limit this process wrote, per resource
+        self._written: dict[str, tuple[int, float, float]] = {}
+        self._written_lock = threading.Lock()
+
+    def _db(self) -> DBManager:
+        assert self.db_file
+        if getattr(self._local, "db", None) is None:
+            self._local.db = DBManager(self.db_file)
+        return self._local.db
+
+    def on_response(self, status: int, headers: dict):
+        """Record the rate limit headers of a GitHub response
+
+        Called for every API response, so the shared budget is only written
+        when the remaining calls moved by WRITE_STEP, a new window started, or
+        WRITE_INTERVAL passed since this process last wrote it.
+        """
+        try:
+            resource = headers.get("x-ratelimit-resource", "core")
+            remaining = int(float(headers["x-ratelimit-remaining"]))
+            limit = int(float(headers["x-ratelimit-limit"]))
+            reset = float(headers["x-ratelimit-reset"])
+        except (KeyError, ValueError):
+            return
+
+        now = time.monotonic()
+        with self._written_lock:
+            last = self._written.get(resource)
+            if (
+                last is not None
+                and last[1] == reset
+                and abs(last[0] - remaining) < self.WRITE_STEP
+                and now - last[2] < self.WRITE_INTERVAL
+            ):
+                return
+            self._written[resource] = (remaining, reset, now)
+
+        try:
+            self._db().rate_limits.record(resource, remaining, limit, reset)
+        except Exception:
+            logger.exception("Could not record GitHub rate limit")
+
+    def snapshot(self, resource: str = "core") -> RateLimitInfo | None:
+        return self._db().rate_limits.get(resource)
+
+    def retry_at(self, priority: Priority) -> float | None:
+        """When work of a priority may run again
+
+        Returns:
+            None if it can run now, otherwise when the rate limit window resets
+        """
+        info = self.snapshot()
+        if info is None or info["reset"] <= time.time():
+            return None
+        if info["remaining"] > info["limit"] * self.reserves[priority]:
+            return None
+        return info["reset"]
+
+    def allows(self, priority: Priority) -> bool:
+        return self.retry_at(priority) is None
+
+    def acquire(self, priority: Priority):
+        """Make sure there is budget for work of a priority
+
+        Raises:
+            RateLimitExceeded: the remaining budget is held back for more important work
+        """
+        retry_at = self.retry_at(priority)
+        if retry_at is not None:
+            raise RateLimitExceeded(priority, retry_at)
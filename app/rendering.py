@@ -0,0 +1,98 @@
+import hashlib
+import html
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import markdown
+
+from module_core import Module
+
+MARKDOWN_EXTENSIONS = ["fenced_code", "codehilite"]
+
+
+def render_markdown(text: str) -> str:
+    """Render step instructions the same way for every caller"""
+    return markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+
+
+class _PlaceholderRepository:
+    """Stands in for a repository while compiling instructions
+
+    Every attribute read returns a token that survives markdown and pygments
+    untouched, so the real values can be swapped into the rendered HTML later.
+    """
+
+    def __init__(self):
+        self.slots: dict[str, str] = {}
+
+    def __getattr__(self, attr: str) -> str:
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if attr not in self.slots:
+            self.slots[attr] = f"GitLearnerSlot{len(self.slots)}x"
+        return self.slots[attr]
+
+
+@dataclass(frozen=True)
+class CompiledInstructions:
+    html: str
+    slots: dict[str, str]
+    digest: str
+
+    def render(self, repo: Any) -> str:
+        rendered = self.html
+        for attr, token in self.slots.items():
+            rendered = rendered.replace(token, html.escape(str(getattr(repo, attr))))
+        return rendered
+
+
+class InstructionRenderer:
+    """Compiles each step's instructions to HTML once per (module, step)
+
+    Steps whose instructions can't be compiled against a placeholder repository
+    (they need more than plain attribute values) are rendered on every request.
+    """
+
+    def __init__(self):
+        self._compiled: dict[tuple[str, int], CompiledInstructions | None] = {}
+
+    def compile(self, module: Module, index: int) -> CompiledInstructions | None:
+        key = (module.name, index)
+        if key not in self._compiled:
+            self._compiled[key] = self._compile(module, index)
+        return self._compiled[key]
+
+    @staticmethod
+    def _compile(module: Module, index: int) -> CompiledInstructions | None:
+        placeholder = _PlaceholderRepository()
+        try:
+            text = module[index].instructions(placeholder)  # type: ignore[arg-type]
+        except Exception:
+            return None
+
+        rendered = render_markdown(text)
+        if any(token not in rendered for token in placeholder.slots.values()):
+            return None
+
+        digest = hashlib.sha1(rendered.encode()).hexdigest()
+        return CompiledInstructions(rendered, dict(placeholder.slots), digest)
+
+    def warm(self, modules: Mapping[str, Module]):
+        """Compile the instructions for every step of every module"""
+        for module in modules.values():
+            for index in range(len(module)):
+                self.compile(module, index)
+
+    def render(self, module: Module, index: int, repo: Any) -> tuple[str, str]:
+        """Render a step's instructions for a repository
+
+        Returns:
+            the instruction HTML and a digest identifying it
+        """
+        compiled = self.compile(module, index)
+        if compiled is not None:
+            rendered = compiled.render(repo)
+        else:
+            rendered = render_markdown(module[index].instructions(repo))
+        return rendered, hashlib.sha1(rendered.encode()).hexdigest()
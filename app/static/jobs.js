@@ -0,0 +1,23 @@
+const waitForJob = async (jobId, onDone, onFailed, interval = 1000) => {
+    while (true) {
+        try {
+            const response = await fetch(`/jobs/${jobId}`, {
+                credentials: "include"
+            })
+            const job = await response.json()
+            if (job.status === "done") {
+                onDone(job)
+                return
+            }
+            if (job.status === "failed") {
+                onFailed(job.error)
+                return
+            }
+        }
+        catch (error) {
+            onFailed(error.message)
+            return
+        }
+        await new Promise(resolve => setTimeout(resolve, interval))
+    }
+}
@@ -39,3 +39,16 @@ const next = async (next_url) => {
         checkToast.value = "An error occured: " + error.message
     }
 }
+
+const watchStep = (eventsUrl) => {
+    const source = new EventSource(eventsUrl)
+    source.onmessage = (event) => {
+        const result = JSON.parse(event.data)
+        checkStatus.value = result.status
+        checkToast.value = result.message ?? ""
+        if (result.status === "GOOD" || result.status === "NO_SESSION") {
+            source.close()
+        }
+    }
+    return source
+}
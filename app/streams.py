@@ -0,0 +1,30 @@
+import threading
+from collections import Counter
+
+
+class StreamSlots:
+    """Caps the status streams a worker holds open, in total and per user
+
+    Each stream holds a worker thread, so the total cap leaves threads free for
+    pages and checks, and the per-user cap keeps one user's tabs from taking
+    them all. Turned away pages can still check with the Check button.
+    """
+
+    def __init__(self, total: int = 16, per_user: int = 2):
+        self.total = total
+        self.per_user = per_user
+        self._open: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def acquire(self, user: str) -> bool:
+        with self._lock:
+            if self._open.total() >= self.total or self._open[user] >= self.per_user:
+                return False
+            self._open[user] += 1
+            return True
+
+    def release(self, user: str):
+        with self._lock:
+            self._open[user] -= 1
+            if self._open[user] <= 0:
+                del self._open[user]
@@ -0,0 +1,275 @@
+import datetime
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from github import RateLimitExceededException
+
+from db.create import DBManager, SweepCandidate
+from module_core import Forge, MirrorStore
+
+from .ratelimit import Priority, RateBudget
+
+logger = logging.getLogger(__name__)
+
+sweep_cli = AppGroup(
+    "sweep", help="Delete the repositories of abandoned and finished sessions"
+)
+
+# repositories deleted at once; the GitHub client already spaces out writes
+DEFAULT_CONCURRENCY = 4
+
+# how long to back off after GitHub reports a secondary rate limit
+SECONDARY_LIMIT_PAUSE = 60.0
+
+
+@dataclass(frozen=True)
+class SweepCriteria:
+    """Which sessions a sweep removes, matching every filter that is set"""
+
+    older_than_days: float | None = None
+    completed: bool = False
+    module: str | None = None
+
+    def __bool__(self) -> bool:
+        return self.older_than_days is not None or self.completed or bool(self.module)
+
+    def candidates(
+        self, db: DBManager, after: int = 0, limit: int = 100
+    ) -> list[SweepCandidate]:
+        started_before = None
+        if self.older_than_days is not None:
+            started_before = datetime.datetime.now(datetime.UTC) - datetime.timedelta(
+                days=self.older_than_days
+            )
+        return db.sessions.sweepable(
+            started_before, self.completed, self.module, after, limit
+        )
+
+
+@dataclass
+class SweepProgress:
+    deleted: int = 0
+    failed: int = 0
+    # set when the sweep stopped early to spare the rate limit
+    retry_at: float | None = None
+
+
+def forget_repo(
+    db: DBManager, org_name: str, repo: str, mirrors: MirrorStore | None = None
+):
+    """Remove everything kept about a repository that was deleted"""
+    db.pushes.delete(repo)
+    db.checks.delete(repo)
+    db.names.release(repo)
+    db.state.clear(repo)
+    if mirrors is not None:
+        mirrors.remove(f"{org_name}/{repo}")
+
+
+class Sweeper:
+    """Deletes the repositories of sessions that match a sweep's criteria
+
+    Repositories are deleted `concurrency` at a time, and each session is
+    removed as soon as its repository is gone. The sessions table is the
+    sweep's progress, so an interrupted sweep resumes where it stopped, and
+    sessions whose repository could not be deleted are tried again next time.
+    """
+
+    def __init__(
+        self,
+        db: DBManager,
+        forge: Forge,
+        org_name: str,
+        budget: RateBudget | None = None,
+        mirrors: MirrorStore | None = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ):
+        self.db = db
+        self.forge = forge
+        self.org_name = org_name
+        self.budget = budget
+        self.mirrors = mirrors
+        self.concurrency = concurrency
+
+    def run(self, criteria: SweepCriteria, batch_size: int = 100) -> SweepProgress:
+        """Sweep every matching session, or until the rate limit runs low
+
+        Raises:
+            ValueError: no filter was given, which would sweep every session
+        """
+        if not criteria:
+            raise ValueError("A sweep needs at least one filter")
+
+        progress = SweepProgress()
+        after = 0
+        with ThreadPoolExecutor(self.concurrency, "sweep") as pool:
+            while progress.retry_at is None:
+                candidates = criteria.candidates(self.db, after, batch_size)
+                if not candidates:
+                    break
+
+                running: dict[Future, SweepCandidate] = {}
+                for candidate in candidates:
+                    if progress.retry_at is None and self.budget is not None:
+                        progress.retry_at = self.budget.retry_at(Priority.CLEANUP)
+                    if progress.retry_at is not None:
+                        break
+                    if len(running) >= self.concurrency:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._settle(future, running.pop(future), progress)
+                    full_name = f"{self.org_name}/{candidate['repo']}"
+                    running[pool.submit(self.forge.delete_repo, full_name)] = candidate
+                    after = candidate["id"]
+
+                for future in wait(running).done:
+                    self._settle(future, running[future], progress)
+        return progress
+
+    def _settle(
+        self, future: Future, candidate: SweepCandidate, progress: SweepProgress
+    ):
+        repo = candidate["repo"]
+        try:
+            future.result()
+        except RateLimitExceededException:
+            logger.warning("Secondary rate limit hit deleting %s, pausing sweep", repo)
+            progress.retry_at = time.time() + SECONDARY_LIMIT_PAUSE
+            return
+        except Exception:
+            logger.exception("Could not delete %s", repo)
+            progress.failed += 1
+            return
+
+        self.db.sessions.delete_repo(repo)
+        forget_repo(self.db, self.org_name, repo, self.mirrors)
+        progress.deleted += 1
+
+
+class SweepScheduler(threading.Thread):
+    """A background thread that sweeps sessions again every interval"""
+
+    def __init__(self, sweeper: Sweeper, criteria: SweepCriteria, interval: float):
+        super().__init__(daemon=True, name="sweep-scheduler")
+        self.sweeper = sweeper
+        self.criteria = criteria
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            delay = self.interval
+            try:
+                progress = self.sweeper.run(self.criteria)
+                logger.info(
+                    "Swept %d repositories, %d failed",
+                    progress.deleted,
+                    progress.failed,
+                )
+                if progress.retry_at is not None:
+                    delay = max(0.0, progress.retry_at - time.time())
+            except Exception:
+                logger.exception("Sweeping sessions failed")
+            self.stopped.wait(delay)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def _criteria_options(command):
+    command = click.option("--module", help="Sessions of this module")(command)
+    command = click.option(
+        "--completed", is_flag=True, help="Sessions on their module's last step"
+    )(command)
+    return click.option(
+        "--older-than-days",
+        type=float,
+        help="Sessions started more than this many days ago",
+    )(command)
+
+
+def _criteria(
+    older_than_days: float | None, completed: bool, module: str | None
+) -> SweepCriteria:
+    criteria = SweepCriteria(older_than_days, completed, module)
+    if not criteria:
+        raise click.UsageError(
+            "Pass --older-than-days, --completed or --module to choose sessions"
+        )
+    return criteria
+
+
+@sweep_cli.command("run")
+@_criteria_options
+@click.option("--concurrency", type=int, help="Repositories to delete at once")
+@click.option("--loop", is_flag=True, help="Sweep again every SWEEP_INTERVAL")
+def run_command(
+    older_than_days: float | None,
+    completed: bool,
+    module: str | None,
+    concurrency: int | None,
+    loop: bool,
+):
+    """Delete matching sessions and their repositories
+
+    Filters combine, so `--completed --module basic` sweeps only finished
+    sessions of that module. Swept users start the module from scratch.
+    """
+    from .app import github_client
+
+    criteria = _criteria(older_than_days, completed, module)
+    sweeper = Sweeper(
+        DBManager(current_app.config["DB_FILE"]),
+        github_client.forge,
+        current_app.config["GITHUB_ORGANIZATION"],
+        github_client.budget,
+        github_client.mirrors,
+        concurrency or current_app.config["SWEEP_CONCURRENCY"],
+    )
+    if loop:
+        scheduler = SweepScheduler(
+            sweeper, criteria, current_app.config["SWEEP_INTERVAL"]
+        )
+        scheduler.start()
+        try:
+            while scheduler.is_alive():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        return
+
+    deleted = failed = 0
+    while True:
+        progress = sweeper.run(criteria)
+        deleted += progress.deleted
+        failed += progress.failed
+        if progress.retry_at is None:
+            break
+        wait_for = max(0, int(progress.retry_at - time.time()))
+        click.echo(f"Deleted {deleted} so far, waiting {wait_for}s for the rate limit")
+        time.sleep(wait_for)
+    click.echo(f"Deleted {deleted} repositories, {failed} failed")
+
+
+@sweep_cli.command("status")
+@_criteria_options
+def status_command(older_than_days: float | None, completed: bool, module: str | None):
+    """Show how many sessions of each module a sweep would remove"""
+    criteria = _criteria(older_than_days, completed, module)
+    db = DBManager(current_app.config["DB_FILE"])
+
+    counts: Counter[str] = Counter()
+    after = 0
+    while candidates := criteria.candidates(db, after, 1000):
+        counts.update(candidate["module"] for candidate in candidates)
+        after = candidates[-1]["id"]
+    for module_name, count in sorted(counts.items()):
+        click.echo(f"{module_name}: {count}")
+    click.echo(f"total: {counts.total()}")
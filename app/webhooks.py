@@ -0,0 +1,83 @@
+import hashlib
+import hmac
+import logging
+
+from flask import Blueprint, abort, current_app, request
+
+from module_core import HeadCommit
+
+from .app import database, github_client, gitlearner
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("webhooks", __name__)
+
+
+def verify_signature(secret: str, body: bytes, signature: str | None) -> bool:
+    """Check a payload against GitHub's X-Hub-Signature-256 header"""
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.removeprefix("sha256="))
+
+
+def head_from_push(payload: dict) -> HeadCommit | None:
+    """Extract the new default branch head from a push event payload
+
+    Returns:
+        None for pushes to other branches and for branch deletions
+    """
+    repository = payload["repository"]
+    if payload.get("ref") != f"refs/heads/{repository['default_branch']}":
+        return None
+
+    head = payload.get("head_commit")
+    if payload.get("deleted") or not head:
+        return None
+
+    return HeadCommit(
+        sha=head["id"],
+        author_login=head["author"].get("username"),
+        committer_login=head["committer"].get("username"),
+        timestamp=head["timestamp"],
+    )
+
+
+@bp.post("/webhooks/github")
+def github_webhook():
+    if not verify_signature(
+        current_app.config["GITHUB_WEBHOOK_SECRET"],
+        request.get_data(),
+        request.headers.get("X-Hub-Signature-256"),
+    ):
+        abort(401)
+
+    event = request.headers.get("X-GitHub-Event")
+    if event == "ping":
+        return {"status": "pong"}
+    if event != "push":
+        return {"status": "ignored"}
+
+    payload = request.get_json()
+    head = head_from_push(payload)
+    if head is None:
+        return {"status": "ignored"}
+
+    db = database.get()
+    recorded = db.pushes.record(
+        payload["repository"]["name"],
+        head,
+        request.headers.get("X-GitHub-Delivery"),
+        payload["repository"].get("pushed_at"),
+    )
+    if not recorded:
+        return {"status": "stale"}
+    db.checks.invalidate(payload["repository"]["name"])
+    gitlearner.checks.invalidate(payload["repository"]["name"])
+    if github_client.mirrors is not None:
+        db.jobs.enqueue(
+            "sync_mirror",
+            {"repo": payload["repository"]["name"]},
+            idempotency_key=f"sync_mirror:{payload['repository']['name']}:{head.sha}",
+        )
+    return {"status": "recorded"}
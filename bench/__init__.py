@@ -0,0 +1,4 @@
+from . import cases
+from .runner import BENCHMARKS, benchmark, regressions, run
+
+__all__ = ["BENCHMARKS", "benchmark", "cases", "regressions", "run"]
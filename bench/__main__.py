@@ -0,0 +1,39 @@
+import argparse
+import sys
+
+from . import run
+from .runner import load_baseline, regressions, save_baseline
+
+parser = argparse.ArgumentParser(
+    prog="python -m bench",
+    description="Time the hot paths of git-learner against stored baselines",
+)
+parser.add_argument("names", nargs="*", help="only run benchmarks matching these")
+parser.add_argument(
+    "--update", action="store_true", help="store the results as the new baseline"
+)
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=2.0,
+    help="fail when a benchmark is this many times slower than its baseline",
+)
+args = parser.parse_args()
+
+results = run(args.names)
+baseline = load_baseline()
+slower = regressions(results, baseline, args.tolerance)
+
+for name, score in results.items():
+    line = f"{name:<40} {score:10.4g}"
+    if name in baseline:
+        line += f"  (baseline {baseline[name]:.4g}, x{score / baseline[name]:.2f})"
+    if name in slower:
+        line += "  REGRESSED"
+    print(line)
+
+if args.update:
+    save_baseline(results)
+    print("Saved baseline")
+elif slower:
+    sys.exit(f"{len(slower)} benchmark(s) regressed beyond x{args.tolerance}")
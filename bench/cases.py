@@ -0,0 +1,173 @@
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from app.rendering import InstructionRenderer, render_markdown
+from db import DBManager
+from module_core import FakeForge, Session, create_repo
+from modules import active_modules
+
+from .runner import benchmark
+
+MODULE = "push-after-update"
+ROWS = 100_000
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _info(i: int):
+    return {
+        "id": i,
+        "name": f"repo-{i}",
+        "ssh_url": f"git@github.com:org/repo-{i}.git",
+        "default_branch": "main",
+    }
+
+
+def _populated_db(path: str) -> DBManager:
+    """A database with ROWS users, each with a session in one module"""
+    db = DBManager(path)
+    db.modules.add({"name": MODULE, "base_repo": None, "total_steps": 4})
+    module_id = db.modules.id_of(MODULE)
+    with db.conn:
+        db.conn.executemany(
+            "INSERT INTO users(name, email, github) VALUES(?, ?, ?)",
+            ((f"User {i}", f"user{i}@example.com", f"user-{i}") for i in range(ROWS)),
+        )
+        db.conn.executemany(
+            """INSERT INTO sessions(user_id, module_id, repo, created, current_step,
+            repo_id, ssh_url, default_branch)
+            VALUES(?, ?, ?, '2024-10-01T00:00:00+00:00', 1, ?, ?, 'main')""",
+            (
+                (i + 1, module_id, f"repo-{i}", i, f"git@github.com:org/repo-{i}.git")
+                for i in range(ROWS)
+            ),
+        )
+    return db
+
+
+@contextmanager
+def _sessions_db():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _populated_db(os.path.join(tmp, "bench.sqlite3"))
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+@benchmark("db.DBManager()")
+def db_manager():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        DBManager(path).close()
+        yield lambda: DBManager(path).close()
+
+
+@benchmark("db.sessions.get")
+def sessions_get():
+    with _sessions_db() as db:
+        users = itertools.count(0, 7)
+        yield lambda: db.sessions.get(f"user-{next(users) % ROWS}", MODULE)
+
+
+@benchmark("db.sessions.update")
+def sessions_update():
+    with _sessions_db() as db:
+        users = itertools.count(0, 7)
+        yield lambda: db.sessions.update(f"user-{next(users) % ROWS}", MODULE, 2)
+
+
+@benchmark("db.sessions.create_from_session")
+def sessions_create_from_session():
+    with _sessions_db() as db:
+        users = itertools.count(0, 7)
+
+        def create():
+            i = next(users) % ROWS
+            session = SimpleNamespace(
+                user=f"user-{i}",
+                module=SimpleNamespace(name=MODULE),
+                repo_name=f"repo-{i}",
+                current_step=1,
+                repo_info=_info(i),
+            )
+            return db.sessions.create_from_session(session)  # type: ignore[arg-type]
+
+        yield create
+
+
+@benchmark("db.sessions.rollup")
+def sessions_rollup():
+    with _sessions_db() as db:
+        users = itertools.count(0, 7)
+        for _ in range(ROWS // 2):
+            db.sessions.update(f"user-{next(users) % ROWS}", MODULE, 2)
+        yield db.sessions.rollup
+
+
+@benchmark("module_core.Session()")
+def session_construction():
+    forge = FakeForge()
+    module = active_modules[MODULE]
+    info = _info(1)
+    yield lambda: Session(forge, "user", "org", module, "repo-1", 2, info)
+
+
+@benchmark("module_core.create_repo")
+def repo_creation():
+    forge = FakeForge()
+    yield lambda: create_repo(forge, "org")
+
+
+@benchmark("module_core.Module[]")
+def module_getitem():
+    module = active_modules[MODULE]
+    yield lambda: module[len(module) - 1]
+
+
+@benchmark("rendering.render_markdown")
+def markdown_render():
+    step = active_modules[MODULE][0]
+    repo = SimpleNamespace(name="repo-1", ssh_url="git@github.com:org/repo-1.git")
+    yield lambda: render_markdown(step.instructions(repo))  # type: ignore[arg-type]
+
+
+@benchmark("rendering.InstructionRenderer.render")
+def compiled_render():
+    renderer = InstructionRenderer()
+    module = active_modules[MODULE]
+    renderer.warm({MODULE: module})
+    repo = SimpleNamespace(name="repo-1", ssh_url="git@github.com:org/repo-1.git")
+    yield lambda: renderer.render(module, 0, repo)
+
+
+def _python(code: str, cwd: str):
+    """Run code in a new interpreter, as a freshly started worker would"""
+    key_path = os.path.join(cwd, "key.pem")
+    if not os.path.exists(key_path):
+        # only read at startup, the app signs nothing with it here
+        with open(key_path, "w") as f:
+            f.write("not a key")
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "GITHUB_APP_ID": "1",
+        "GITHUB_PRIVATE_KEY_PATH": key_path,
+    }
+    subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True)
+
+
+@benchmark("startup.import modules")
+def import_modules():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield lambda: _python("import modules", tmp)
+
+
+@benchmark("startup.create_app")
+def create_app():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield lambda: _python("from app import create_app; create_app()", tmp)
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# a benchmark is a context manager yielding the operation to time,
+# so its fixtures are built once and torn down after measuring
+Setup = Callable[[], AbstractContextManager[Callable[[], object]]]
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    setup: Setup
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str):
+    """Register a generator function that yields the operation to time"""
+
+    def register(func: Callable[[], Iterator[Callable[[], object]]]):
+        BENCHMARKS[name] = Benchmark(name, contextmanager(func))
+        return func
+
+    return register
+
+
+def best_time(op: Callable[[], object], min_time: float = 0.1, repeats: int = 5):
+    """Seconds per call of an operation, the best of several timed batches
+
+    The batch size grows until a batch takes `min_time`, so fast operations
+    aren't dominated by the cost of reading the clock.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+
+    best = elapsed / number
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _calibration_op():
+    total = 0
+    values: dict[int, int] = {}
+    for i in range(1000):
+        values[i] = i * i
+        total += values[i] % 7
+    return total
+
+
+def calibrate() -> float:
+    """Time a fixed pure Python workload to scale results by machine speed"""
+    return best_time(_calibration_op)
+
+
+def run(names: list[str] | None = None) -> dict[str, float]:
+    """Run benchmarks and return their times relative to the calibration workload"""
+    unit = calibrate()
+    results: dict[str, float] = {}
+    for bench in BENCHMARKS.values():
+        if names and not any(name in bench.name for name in names):
+            continue
+        with bench.setup() as op:
+            results[bench.name] = best_time(op) / unit
+    return results
+
+
+def load_baseline(path: str = BASELINE_FILE) -> dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results: dict[str, float], path: str = BASELINE_FILE):
+    baseline = load_baseline(path)
+    baseline.update({name: float(f"{score:.4g}") for name, score in results.items()})
+    with open(path, "w") as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=2)
+        f.write("\n")
+
+
+def regressions(
+    results: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> dict[str, float]:
+    """Benchmarks slower than their baseline by more than `tolerance` times
+
+    Returns:
+        the slowdown of each regressed benchmark
+    """
+    return {
+        name: score / baseline[name]
+        for name, score in results.items()
+        if name in baseline and score > baseline[name] * tolerance
+    }
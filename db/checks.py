@@ -0,0 +1,131 @@
+import sqlite3
+import time
+from typing import TypedDict
+
+
+class StepCheckInfo(TypedDict):
+    repo: str
+    step: int
+    status: str | None
+    message: str | None
+    checked_at: float | None
+    running_until: float
+
+
+class ChecksDB:
+    """Helper class to share step check results between workers
+
+    A worker claims a (repo, step) before checking it, and a claim only
+    succeeds once the previous one is older than the check interval. However
+    many pages watch a repo, it is checked at most once per interval.
+
+    A check that is running holds a lease on its (repo, step), so a worker
+    asked to check it meanwhile can wait for the result instead.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def claim(self, repo: str, step: int, interval: float) -> bool:
+        """Take the right to check a repo's step now
+
+        Returns:
+            whether the caller should run the check
+        """
+        now = time.time()
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO step_checks(repo, step, claimed_at) VALUES(?, ?, ?)
+            ON CONFLICT(repo, step) DO UPDATE SET claimed_at = excluded.claimed_at
+            WHERE step_checks.claimed_at <= ?""",
+            (repo, step, now, now - interval),
+        )
+        claimed = cur.rowcount == 1
+        cur.close()
+        self.conn.commit()
+        return claimed
+
+    def begin(self, repo: str, step: int, lease: float) -> bool:
+        """Take the lease to run a check of a repo's step now
+
+        The lease is free once the last check is recorded or released, or
+        `lease` seconds after it began if its worker died.
+
+        Returns:
+            whether the caller should run the check
+        """
+        now = time.time()
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO step_checks(repo, step, claimed_at, running_until)
+            VALUES(?, ?, ?, ?)
+            ON CONFLICT(repo, step) DO UPDATE SET
+              claimed_at = excluded.claimed_at,
+              running_until = excluded.running_until
+            WHERE step_checks.running_until <= ?""",
+            (repo, step, now, now + lease, now),
+        )
+        began = cur.rowcount == 1
+        cur.close()
+        self.conn.commit()
+        return began
+
+    def release(self, repo: str, step: int):
+        """Give up the lease of a check that ended without a result"""
+        cur = self.conn.cursor()
+        cur.execute(
+            "UPDATE step_checks SET running_until = 0 WHERE repo = ? AND step = ?",
+            (repo, step),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def record(self, repo: str, step: int, status: str, message: str):
+        """Store the result of a check, ending its lease"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO step_checks(repo, step, claimed_at, status, message,
+              checked_at)
+            VALUES(?, ?, ?, ?, ?, ?)
+            ON CONFLICT(repo, step) DO UPDATE SET
+              status=excluded.status,
+              message=excluded.message,
+              checked_at=excluded.checked_at,
+              running_until=0""",
+            (repo, step, time.time(), status, message, time.time()),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def get(self, repo: str, step: int) -> StepCheckInfo | None:
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT repo, step, status, message, checked_at, running_until
+            FROM step_checks WHERE repo = ? AND step = ?""",
+            (repo, step),
+        )
+        result = cur.fetchone()
+        cur.close()
+        if not result:
+            return None
+        return {
+            "repo": result["repo"],
+            "step": result["step"],
+            "status": result["status"],
+            "message": result["message"],
+            "checked_at": result["checked_at"],
+            "running_until": result["running_until"],
+        }
+
+    def invalidate(self, repo: str):
+        """Make every step of a repo due for a check, after a push to it"""
+        cur = self.conn.cursor()
+        cur.execute("UPDATE step_checks SET claimed_at = 0 WHERE repo = ?", (repo,))
+        cur.close()
+        self.conn.commit()
+
+    def delete(self, repo: str):
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM step_checks WHERE repo = ?", (repo,))
+        cur.close()
+        self.conn.commit()
@@ -1,14 +1,278 @@
 import datetime
 import sqlite3
+import threading
+import time
+from collections.abc import Callable
 from typing import TypedDict
 
-from module_core import Session
+from module_core import HeadCommit, RepoInfo, Session
+
+from .checks import ChecksDB
+from .jobs import JobsDB
+from .metrics import MetricsDB
+from .names import NamesDB
+from .pushes import PushesDB
+from .ratelimits import RateLimitsDB
+from .state import StateDB
+from .tokens import TokensDB
+
+# seconds a connection waits for another writer before giving up
+BUSY_TIMEOUT = 5.0
+
+# the tables as they were before migrations were versioned
+BASELINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    email TEXT,
+    github TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS modules(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    base_repo TEXT,
+    total_steps INTEGER NOT NULL,
+    CHECK (total_steps >-1)
+);
+CREATE TABLE IF NOT EXISTS sessions(
+    user_id INTEGER REFERENCES users(id),
+    module_id INTEGER REFERENCES modules(id),
+    repo TEXT,
+    created TEXT,
+    current_step INTEGER NOT NULL,
+    repo_id INTEGER,
+    ssh_url TEXT,
+    default_branch TEXT,
+    CHECK (current_step > -1)
+);
+CREATE TABLE IF NOT EXISTS repo_pool(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    module_id INTEGER NOT NULL REFERENCES modules(id),
+    repo TEXT UNIQUE NOT NULL,
+    repo_id INTEGER,
+    ssh_url TEXT NOT NULL,
+    default_branch TEXT NOT NULL,
+    created TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    owner TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    locked_by TEXT,
+    locked_until REAL,
+    result TEXT,
+    error TEXT,
+    created TEXT,
+    updated TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs(status, run_after);
+CREATE TABLE IF NOT EXISTS pushes(
+    repo TEXT PRIMARY KEY,
+    head_sha TEXT NOT NULL,
+    author_login TEXT,
+    committer_login TEXT,
+    pushed_at TEXT,
+    delivery TEXT,
+    received TEXT
+);
+CREATE TABLE IF NOT EXISTS rate_limits(
+    resource TEXT PRIMARY KEY,
+    remaining INTEGER NOT NULL,
+    "limit" INTEGER NOT NULL,
+    reset REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS installation_tokens(
+    org TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    refreshed REAL NOT NULL
+);
+"""
+
+
+def _add_session_repo_columns(cur: sqlite3.Cursor):
+    """Add the repo metadata columns to sessions tables created before them"""
+    columns = {"repo_id": "INTEGER", "ssh_url": "TEXT", "default_branch": "TEXT"}
+    cur.execute("PRAGMA table_info(sessions)")
+    existing = {row["name"] for row in cur.fetchall()}
+    for column, column_type in columns.items():
+        if column not in existing:
+            cur.execute(f"ALTER TABLE sessions ADD COLUMN {column} {column_type}")
+
+
+# give sessions a primary key and allow one session per user and module,
+# keeping the most recently inserted row of any duplicates
+SESSIONS_UNIQUE = """
+CREATE TABLE sessions_new(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    module_id INTEGER NOT NULL REFERENCES modules(id),
+    repo TEXT,
+    created TEXT,
+    current_step INTEGER NOT NULL,
+    repo_id INTEGER,
+    ssh_url TEXT,
+    default_branch TEXT,
+    CHECK (current_step > -1)
+);
+INSERT INTO sessions_new(user_id, module_id, repo, created, current_step,
+    repo_id, ssh_url, default_branch)
+SELECT user_id, module_id, repo, created, current_step,
+    repo_id, ssh_url, default_branch
+FROM sessions
+WHERE rowid IN (
+    SELECT MAX(rowid) FROM sessions
+    WHERE user_id IS NOT NULL AND module_id IS NOT NULL
+    GROUP BY user_id, module_id
+);
+DROP TABLE sessions;
+ALTER TABLE sessions_new RENAME TO sessions;
+CREATE UNIQUE INDEX sessions_user_module ON sessions(user_id, module_id);
+CREATE INDEX sessions_repo ON sessions(repo);
+"""
+
+METRICS_TABLE = """
+CREATE TABLE IF NOT EXISTS metrics(
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    series TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, series)
+);
+"""
+
+STEP_CHECKS_TABLE = """
+CREATE TABLE IF NOT EXISTS step_checks(
+    repo TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    claimed_at REAL NOT NULL,
+    status TEXT,
+    message TEXT,
+    checked_at REAL,
+    PRIMARY KEY (repo, step)
+);
+"""
+
+# a lease held while a check of the step runs, so other workers wait for it
+STEP_CHECKS_LEASE = """
+ALTER TABLE step_checks ADD COLUMN running_until REAL NOT NULL DEFAULT 0;
+"""
+
+# names of every repository created or being created, taken from existing ones
+REPO_NAMES_TABLE = """
+CREATE TABLE IF NOT EXISTS repo_names(
+    name TEXT PRIMARY KEY,
+    reserved_at REAL NOT NULL
+);
+INSERT OR IGNORE INTO repo_names(name, reserved_at)
+SELECT repo, 0 FROM sessions WHERE repo IS NOT NULL;
+INSERT OR IGNORE INTO repo_names(name, reserved_at)
+SELECT repo, 0 FROM repo_pool;
+"""
+
+# small values steps store about a repository, such as commit SHAs
+STEP_STATE_TABLE = """
+CREATE TABLE IF NOT EXISTS step_state(
+    repo TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (repo, key)
+) WITHOUT ROWID;
+"""
+
+# per module and step, how many sessions are on the step and how long finished
+# ones took, kept up to date by triggers on sessions so reading it scans nothing
+STEP_ROLLUP = """
+ALTER TABLE sessions ADD COLUMN step_started REAL;
+CREATE TABLE IF NOT EXISTS step_rollup(
+    module_id INTEGER NOT NULL REFERENCES modules(id),
+    step INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    PRIMARY KEY (module_id, step)
+) WITHOUT ROWID;
+INSERT INTO step_rollup(module_id, step, sessions)
+SELECT module_id, current_step, COUNT(*) FROM sessions GROUP BY module_id, current_step;
+
+-- upper bounds in seconds of the buckets step times are counted in
+CREATE TABLE IF NOT EXISTS step_time_buckets(le REAL PRIMARY KEY);
+INSERT INTO step_time_buckets(le) VALUES (30), (60), (120), (300), (600), (1200),
+    (1800), (3600), (7200), (14400), (28800), (86400), (172800), (604800), (9e999);
+CREATE TABLE IF NOT EXISTS step_times(
+    module_id INTEGER NOT NULL REFERENCES modules(id),
+    step INTEGER NOT NULL,
+    le REAL NOT NULL,
+    finished INTEGER NOT NULL,
+    PRIMARY KEY (module_id, step, le)
+) WITHOUT ROWID;
+
+CREATE TRIGGER sessions_rollup_insert AFTER INSERT ON sessions
+BEGIN
+    INSERT INTO step_rollup(module_id, step, sessions)
+    VALUES (NEW.module_id, NEW.current_step, 1)
+    ON CONFLICT(module_id, step) DO UPDATE SET sessions = sessions + 1;
+END;
+CREATE TRIGGER sessions_rollup_delete AFTER DELETE ON sessions
+BEGIN
+    UPDATE step_rollup SET sessions = sessions - 1
+    WHERE module_id = OLD.module_id AND step = OLD.current_step;
+END;
+-- a step only counts as finished when the same repository moves past it
+CREATE TRIGGER sessions_rollup_update AFTER UPDATE OF current_step ON sessions
+WHEN NEW.current_step != OLD.current_step
+BEGIN
+    UPDATE step_rollup SET sessions = sessions - 1
+    WHERE module_id = OLD.module_id AND step = OLD.current_step;
+    INSERT INTO step_rollup(module_id, step, sessions)
+    VALUES (NEW.module_id, NEW.current_step, 1)
+    ON CONFLICT(module_id, step) DO UPDATE SET sessions = sessions + 1;
+    INSERT INTO step_times(module_id, step, le, finished)
+    SELECT OLD.module_id, OLD.current_step, MIN(le), 1 FROM step_time_buckets
+    WHERE NEW.current_step > OLD.current_step AND NEW.repo IS OLD.repo
+      AND le >= NEW.step_started - OLD.step_started
+    HAVING MIN(le) IS NOT NULL
+    ON CONFLICT(module_id, step, le) DO UPDATE SET finished = finished + 1;
+END;
+"""
+
+# when GitHub received each push, so a late delivery of an older push is ignored
+PUSHES_ORDER = """
+ALTER TABLE pushes ADD COLUMN push_time REAL;
+"""
+
+# migration N brings a database from user_version N to N + 1
+MIGRATIONS: list[str | Callable[[sqlite3.Cursor], None]] = [
+    BASELINE_SCHEMA,
+    _add_session_repo_columns,
+    SESSIONS_UNIQUE,
+    METRICS_TABLE,
+    STEP_CHECKS_TABLE,
+    STEP_CHECKS_LEASE,
+    REPO_NAMES_TABLE,
+    STEP_STATE_TABLE,
+    STEP_ROLLUP,
+    PUSHES_ORDER,
+]
 
 
 class SessionInfo(TypedDict):
     repo: str
     created: datetime.datetime
     current_step: int
+    repo_info: RepoInfo | None
+
+
+class SweepCandidate(TypedDict):
+    id: int
+    user: str
+    module: str
+    repo: str
 
 
 class ModuleInfo(TypedDict):
@@ -17,156 +281,440 @@ class ModuleInfo(TypedDict):
     total_steps: int
 
 
-class SessionsDB:
-    def __init__(self, conn: sqlite3.Connection):
-        self.conn = conn
+class ModuleContext(TypedDict):
+    """Everything a module page needs about a user, loaded by one query"""
 
-    def _github_to_id(self, github_user: str) -> int | None:
-        cur = self.conn.cursor()
-        cur.execute(
-            "SELECT id FROM users WHERE github = ?",
-            (github_user,),
-        )
-        result = cur.fetchone()
-        if result:
-            return result["id"]
+    module: ModuleInfo
+    session: SessionInfo | None
+    head: HeadCommit | None
 
-    def _module_name_to_id(self, module_name: str) -> int | None:
-        cur = self.conn.cursor()
-        cur.execute(
-            "SELECT id FROM modules WHERE name = ?",
-            (module_name,),
-        )
-        result = cur.fetchone()
-        if result:
-            return result["id"]
+
+class StepRollup(TypedDict):
+    step: int
+    sessions: int
+    finished: int
+    # bounds of the step time bucket the median falls in, the upper one infinite
+    # for the last bucket; only bucket counts are kept, not exact times
+    median_range: tuple[float, float] | None
+
+
+class ModuleRollup(TypedDict):
+    name: str
+    total_steps: int
+    steps: list[StepRollup]
+
+
+def _median_bucket(
+    buckets: list[tuple[float, float, int]],
+) -> tuple[float, float] | None:
+    """The (lower, upper) bounds of the bucket holding the median of values
+    counted in (lower, upper, count) buckets"""
+    half = sum(count for _, _, count in buckets) / 2
+    seen = 0
+    for lower, upper, count in buckets:
+        if count and seen + count >= half:
+            return lower, upper
+        seen += count
+    return None
+
+
+def _session_from_row(row: sqlite3.Row) -> SessionInfo:
+    repo_info: RepoInfo | None = None
+    if row["ssh_url"] is not None:
+        repo_info = {
+            "id": row["repo_id"],
+            "name": row["repo"],
+            "ssh_url": row["ssh_url"],
+            "default_branch": row["default_branch"],
+        }
+
+    return {
+        "repo": row["repo"],
+        "created": datetime.datetime.fromisoformat(row["created"]),
+        "current_step": row["current_step"],
+        "repo_info": repo_info,
+    }
+
+
+class SessionsDB:
+    def __init__(self, conn: sqlite3.Connection, modules: "ModulesDB"):
+        self.conn = conn
+        self.modules = modules
 
     def progress(self, github_user: str, module_name: str) -> dict[str, int] | None:
         """Get the current progress for a user in a session"""
         cur = self.conn.cursor()
         cur.execute(
-            """"SELECT current_step, total_steps
+            """SELECT current_step, total_steps
         FROM sessions
         JOIN users on sessions.user_id = users.id
         JOIN modules on sessions.module_id = modules.id
         WHERE users.github = ? AND modules.name = ?""",
             (github_user, module_name),
         )
-        return cur.fetchone()
+        result = cur.fetchone()
+        if not result:
+            return None
+        return {
+            "current_step": result["current_step"],
+            "total_steps": result["total_steps"],
+        }
 
     def delete(self, github_user: str, module_name: str):
-        user_id = self._github_to_id(github_user)
-        module_id = self._module_name_to_id(module_name)
-        if user_id is not None and module_id is not None:
-            cur = self.conn.cursor()
-            cur.execute(
-                "DELETE FROM sessions WHERE user_id = ? AND module_id = ?",
-                (user_id, module_id),
-            )
-            self.conn.commit()
+        module_id = self.modules.id_of(module_name)
+        if module_id is None:
+            return
+        cur = self.conn.cursor()
+        cur.execute(
+            """DELETE FROM sessions
+            WHERE module_id = ?
+              AND user_id = (SELECT id FROM users WHERE github = ?)""",
+            (module_id, github_user),
+        )
+        self.conn.commit()
+
+    def delete_repo(self, repo_name: str):
+        """Delete the session using a repository, if it still uses it"""
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM sessions WHERE repo = ?", (repo_name,))
+        cur.close()
+        self.conn.commit()
+
+    def sweepable(
+        self,
+        started_before: datetime.datetime | None = None,
+        completed: bool = False,
+        module_name: str | None = None,
+        after: int = 0,
+        limit: int = 100,
+    ) -> list[SweepCandidate]:
+        """Sessions matching every given filter, in id order from `after`
+
+        Params:
+            started_before: only sessions started before this time
+            completed: only sessions on their module's last step
+            module_name: only sessions of this module
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT sessions.id, users.github, modules.name, sessions.repo
+            FROM sessions
+            JOIN users ON users.id = sessions.user_id
+            JOIN modules ON modules.id = sessions.module_id
+            WHERE sessions.id > :after AND sessions.repo IS NOT NULL
+              AND (:started_before IS NULL OR sessions.created < :started_before)
+              AND (NOT :completed OR sessions.current_step = modules.total_steps)
+              AND (:module IS NULL OR modules.name = :module)
+            ORDER BY sessions.id LIMIT :limit""",
+            {
+                "after": after,
+                "started_before": (
+                    started_before.isoformat() if started_before else None
+                ),
+                "completed": completed,
+                "module": module_name,
+                "limit": limit,
+            },
+        )
+        rows = cur.fetchall()
+        cur.close()
+        return [
+            {
+                "id": row["id"],
+                "user": row["github"],
+                "module": row["name"],
+                "repo": row["repo"],
+            }
+            for row in rows
+        ]
 
     def get(self, github_user: str, module_name: str) -> SessionInfo | None:
+        module_id = self.modules.id_of(module_name)
+        if module_id is None:
+            return
         cur = self.conn.cursor()
         cur.execute(
-            """SELECT repo, created, current_step
+            """SELECT repo, created, current_step, repo_id, ssh_url, default_branch
             FROM sessions
-            JOIN users on sessions.user_id = users.id
-            JOIN modules on sessions.module_id = modules.id
-            WHERE users.github = ? AND modules.name = ?""",
-            (github_user, module_name),
+            WHERE module_id = ?
+              AND user_id = (SELECT id FROM users WHERE github = ?)""",
+            (module_id, github_user),
         )
         result = cur.fetchone()
         if not result:
             return
 
+        return _session_from_row(result)
+
+    def context(self, github_user: str, module_name: str) -> ModuleContext | None:
+        """Get a module with the user's session in it and the repo's latest push
+
+        Returns:
+            None if the module does not exist
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT modules.name, modules.base_repo, modules.total_steps,
+              sessions.repo, sessions.created, sessions.current_step,
+              sessions.repo_id, sessions.ssh_url, sessions.default_branch,
+              pushes.head_sha, pushes.author_login, pushes.committer_login,
+              pushes.pushed_at
+            FROM modules
+            LEFT JOIN sessions ON sessions.module_id = modules.id
+              AND sessions.user_id = (SELECT id FROM users WHERE github = ?)
+            LEFT JOIN pushes ON pushes.repo = sessions.repo
+            WHERE modules.name = ?""",
+            (github_user, module_name),
+        )
+        result = cur.fetchone()
+        cur.close()
+        if not result:
+            return None
+
+        head = None
+        if result["head_sha"] is not None:
+            head = HeadCommit(
+                sha=result["head_sha"],
+                author_login=result["author_login"],
+                committer_login=result["committer_login"],
+                timestamp=result["pushed_at"],
+            )
+
         return {
-            "repo": result["repo"],
-            "created": datetime.datetime.fromisoformat(result["created"]),
-            "current_step": result["current_step"],
+            "module": {
+                "name": result["name"],
+                "base_repo": result["base_repo"],
+                "total_steps": result["total_steps"],
+            },
+            "session": (
+                _session_from_row(result)
+                if result["current_step"] is not None
+                else None
+            ),
+            "head": head,
         }
 
-    def create_from_session(self, session: Session):
-        user_id = self._github_to_id(session.user)
-        module_id = self._module_name_to_id(session.module.name)
-        if user_id is None or module_id is None:
+    def rollup(self) -> list[ModuleRollup]:
+        """How many sessions are on each step of each module and how long the
+        step takes, read from the rollup the session triggers maintain"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT modules.name, modules.total_steps, step_rollup.step,
+              step_rollup.sessions, step_times.le, step_times.finished,
+              (SELECT MAX(le) FROM step_time_buckets WHERE le < step_times.le) AS lower
+            FROM modules
+            LEFT JOIN step_rollup ON step_rollup.module_id = modules.id
+            LEFT JOIN step_times ON step_times.module_id = step_rollup.module_id
+              AND step_times.step = step_rollup.step
+            ORDER BY modules.name, step_rollup.step, step_times.le"""
+        )
+        rows = cur.fetchall()
+        cur.close()
+
+        sessions: dict[tuple[str, int], int] = {}
+        buckets: dict[tuple[str, int], list[tuple[float, float, int]]] = {}
+        totals: dict[str, int] = {}
+        for row in rows:
+            totals[row["name"]] = row["total_steps"]
+            key = (row["name"], row["step"])
+            sessions[key] = row["sessions"]
+            if row["le"] is not None:
+                buckets.setdefault(key, []).append(
+                    (row["lower"] or 0.0, row["le"], row["finished"])
+                )
+
+        return [
+            {
+                "name": name,
+                "total_steps": total_steps,
+                "steps": [
+                    {
+                        "step": step,
+                        "sessions": sessions.get((name, step), 0),
+                        "finished": sum(
+                            count for _, _, count in buckets.get((name, step), [])
+                        ),
+                        "median_range": _median_bucket(buckets.get((name, step), [])),
+                    }
+                    for step in range(1, total_steps + 1)
+                ],
+            }
+            for name, total_steps in totals.items()
+        ]
+
+    def _upsert(
+        self,
+        github_user: str,
+        module_name: str,
+        repo_name: str,
+        current_step: int,
+        info: RepoInfo | None = None,
+    ) -> bool:
+        """Create a user's session for a module, replacing any existing one"""
+        module_id = self.modules.id_of(module_name)
+        if module_id is None:
             return False
 
         cur = self.conn.cursor()
         try:
             timestamp = datetime.datetime.now(datetime.UTC).isoformat()
             cur.execute(
-                """INSERT INTO sessions(user_id, module_id, repo, created, current_step)
-            VALUES(?, ?, ?, ?, ?)""",
+                """INSERT INTO sessions(user_id, module_id, repo, created, current_step,
+                repo_id, ssh_url, default_branch, step_started)
+            SELECT id, ?, ?, ?, ?, ?, ?, ?, ? FROM users WHERE github = ?
+            ON CONFLICT(user_id, module_id) DO UPDATE SET
+              repo=excluded.repo,
+              created=excluded.created,
+              current_step=excluded.current_step,
+              repo_id=excluded.repo_id,
+              ssh_url=excluded.ssh_url,
+              default_branch=excluded.default_branch,
+              step_started=excluded.step_started""",
                 (
-                    user_id,
                     module_id,
-                    session.repo_name,
+                    repo_name,
                     timestamp,
-                    session.current_step,
+                    current_step,
+                    info["id"] if info else None,
+                    info["ssh_url"] if info else None,
+                    info["default_branch"] if info else None,
+                    time.time(),
+                    github_user,
                 ),
             )
+            created = cur.rowcount == 1
         except Exception:
             self.conn.rollback()
             return False
         finally:
             cur.close()
         self.conn.commit()
-        return True
+        return created
+
+    def create_from_session(self, session: Session):
+        return self._upsert(
+            session.user,
+            session.module.name,
+            session.repo_name,
+            session.current_step,
+            session.repo_info,
+        )
 
     def create(self, github_user: str, module_name: str, repo_name: str):
-        user_id = self._github_to_id(github_user)
-        module_id = self._module_name_to_id(module_name)
-        if user_id is None or module_id is None:
-            return False
+        return self._upsert(github_user, module_name, repo_name, 0)
+
+    def update(self, github_user: str, module_name: str, step: int):
+        """Update a user's progress on a module, timing the step they finished"""
+        module_id = self.modules.id_of(module_name)
+        if module_id is None:
+            return
+        cur = self.conn.cursor()
+        cur.execute(
+            """UPDATE sessions SET current_step = ?,
+              step_started = CASE WHEN current_step = ? THEN step_started ELSE ? END
+            WHERE module_id = ?
+              AND user_id = (SELECT id FROM users WHERE github = ?)""",
+            (step, step, time.time(), module_id, github_user),
+        )
+        self.conn.commit()
+
+
+class PoolDB:
+    """Helper class to interact with the pool of pre-provisioned repositories"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def add(self, module_name: str, info: RepoInfo) -> bool:
+        """Add a provisioned repository to a module's pool"""
         cur = self.conn.cursor()
         try:
             timestamp = datetime.datetime.now(datetime.UTC).isoformat()
             cur.execute(
-                """
-                INSERT INTO sessions(user_id, module_id, repo, created, current_step)
-                VALUES(?,?,?,?,?)
-                """,
-                (user_id, module_id, repo_name, timestamp, 0),
+                """INSERT INTO repo_pool(module_id, repo, repo_id, ssh_url,
+                default_branch, created)
+            SELECT id, ?, ?, ?, ?, ? FROM modules WHERE name = ?""",
+                (
+                    info["name"],
+                    info["id"],
+                    info["ssh_url"],
+                    info["default_branch"],
+                    timestamp,
+                    module_name,
+                ),
             )
-            self.conn.commit()
+            added = cur.rowcount == 1
         except Exception:
             self.conn.rollback()
             return False
         finally:
             cur.close()
-
         self.conn.commit()
-        return True
+        return added
 
-    def update(self, github_user: str, module_name: str, step: int):
-        """Update a user's progress on a module"""
-        user_id = self._github_to_id(github_user)
-        module_id = self._module_name_to_id(module_name)
-        if user_id is None or module_id is None:
-            return
+    def claim(self, module_name: str) -> RepoInfo | None:
+        """Atomically remove the oldest ready repository from a module's pool"""
         cur = self.conn.cursor()
         cur.execute(
-            "UPDATE sessions SET current_step = ? WHERE user_id = ? AND module_id = ?",
-            (step, user_id, module_id),
+            """DELETE FROM repo_pool WHERE id = (
+                SELECT repo_pool.id FROM repo_pool
+                JOIN modules ON repo_pool.module_id = modules.id
+                WHERE modules.name = ?
+                ORDER BY repo_pool.id LIMIT 1
+            )
+            RETURNING repo, repo_id, ssh_url, default_branch""",
+            (module_name,),
         )
+        result = cur.fetchone()
+        cur.close()
         self.conn.commit()
+        if not result:
+            return None
+
+        return {
+            "id": result["repo_id"],
+            "name": result["repo"],
+            "ssh_url": result["ssh_url"],
+            "default_branch": result["default_branch"],
+        }
+
+    def count(self, module_name: str) -> int:
+        """Get the number of ready repositories in a module's pool"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT COUNT(*) FROM repo_pool
+            JOIN modules ON repo_pool.module_id = modules.id
+            WHERE modules.name = ?""",
+            (module_name,),
+        )
+        return cur.fetchone()[0]
 
 
 class ModulesDB:
-    """Helper class to interact with modules in the database"""
+    """Helper class to interact with modules in the database
 
-    def __init__(self, conn: sqlite3.Connection):
+    Module ids never change once a module is added, so they are cached in the
+    mapping passed in, which DBManager shares between connections to one file.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, id_cache: dict[str, int]):
         self.conn = conn
+        self._ids = id_cache
 
-    def _name_to_id(self, name: str) -> int | None:
-        cur = self.conn.cursor()
-        cur.execute(
-            "SELECT id FROM modules WHERE name = ?",
-            (name,),
-        )
-        result = cur.fetchone()
-        if result:
-            return result["id"]
+    def id_of(self, name: str) -> int | None:
+        """Get a module's id, only querying the database the first time"""
+        if name not in self._ids:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT id FROM modules WHERE name = ?",
+                (name,),
+            )
+            result = cur.fetchone()
+            cur.close()
+            if not result:
+                return None
+            self._ids[name] = result["id"]
+        return self._ids[name]
 
     def get(self, name: str | None = None) -> list[ModuleInfo] | ModuleInfo:
         """Get info for a module or all modules if no name is provided"""
@@ -202,45 +750,134 @@ class ModulesDB:
             self.conn.rollback()
 
 
+def _observe(sql: str, start: float):
+    observer = DBManager.query_observer
+    if observer is not None:
+        statement = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        observer(statement, time.perf_counter() - start)
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """A cursor reporting how long each statement takes to DBManager.query_observer"""
+
+    def execute(self, sql, parameters=(), /):
+        if DBManager.query_observer is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _observe(sql, start)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        if DBManager.query_observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _observe(sql, start)
+
+    def executescript(self, sql_script, /):
+        if DBManager.query_observer is None:
+            return super().executescript(sql_script)
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _observe(sql_script, start)
+
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):  # type: ignore[override]
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=(), /):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script, /):
+        return self.cursor().executescript(sql_script)
+
+
 class DBManager:
+    """Wraps a connection to the database and the helpers that use it
+
+    The schema is migrated the first time a process connects to a database file,
+    later connections skip it. Connections use WAL journaling and a busy timeout,
+    so several workers can read and write at once without lock errors.
+    """
+
+    _initialized: set[str] = set()
+    _module_ids: dict[str, dict[str, int]] = {}
+    _init_lock = threading.Lock()
+
+    # called with the statement kind and duration of every query, when set
+    query_observer: Callable[[str, float], None] | None = None
+
     def __init__(self, uri: str):
         self.uri = uri
-        self.conn = sqlite3.connect(uri)
+        self.conn = sqlite3.connect(uri, timeout=BUSY_TIMEOUT, factory=_TimedConnection)
         self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+
+        # every in-memory connection is a new, empty database
+        if uri == ":memory:":
+            self.init_schema()
+        elif uri not in DBManager._initialized:
+            with DBManager._init_lock:
+                if uri not in DBManager._initialized:
+                    self.init_schema()
+                    DBManager._initialized.add(uri)
+
+        if uri == ":memory:":
+            module_ids: dict[str, int] = {}
+        else:
+            module_ids = DBManager._module_ids.setdefault(uri, {})
+        self._modules = ModulesDB(self.conn, module_ids)
+        self._sessions = SessionsDB(self.conn, self._modules)
+        self._pool = PoolDB(self.conn)
+        self._jobs = JobsDB(self.conn)
+        self._pushes = PushesDB(self.conn)
+        self._rate_limits = RateLimitsDB(self.conn)
+        self._tokens = TokensDB(self.conn)
+        self._metrics = MetricsDB(self.conn)
+        self._checks = ChecksDB(self.conn)
+        self._names = NamesDB(self.conn)
+        self._state = StateDB(self.conn)
+
+    def init_schema(self):
+        """Apply pending migrations and switch the database to WAL journaling
+
+        Each migration runs in its own transaction together with the bump of
+        the database's user_version, so an interrupted upgrade resumes cleanly.
+        """
         cur = self.conn.cursor()
-        cur.executescript("""
-        BEGIN;
-        PRAGMA foreign_keys = ON;
-        COMMIT;
-        """)
-        cur.executescript("""
-        BEGIN;
-        CREATE TABLE IF NOT EXISTS users(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            email TEXT,
-            github TEXT UNIQUE NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS modules(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            base_repo TEXT,
-            total_steps INTEGER NOT NULL,
-            CHECK (total_steps >-1)
-        );
-        CREATE TABLE IF NOT EXISTS sessions(
-            user_id INTEGER REFERENCES users(id),
-            module_id INTEGER REFERENCES modules(id),
-            repo TEXT,
-            created TEXT,
-            current_step INTEGER NOT NULL,
-            CHECK (current_step > -1)
-        );
-        COMMIT;
-        """)
+        cur.execute("PRAGMA journal_mode = WAL").fetchone()
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            if isinstance(migration, str):
+                cur.executescript(
+                    f"BEGIN;\n{migration}\nPRAGMA user_version = {target};\nCOMMIT;"
+                )
+            else:
+                cur.execute("BEGIN")
+                migration(cur)
+                cur.execute(f"PRAGMA user_version = {target}")
+                cur.execute("COMMIT")
         cur.close()
-        self._sessions = SessionsDB(self.conn)
-        self._modules = ModulesDB(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> "DBManager":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def add_user(self, name: str, email: str, github: str):
         with self.conn:
@@ -261,3 +898,48 @@ class DBManager:
     def modules(self):
         """Helper class to ineract with modules"""
         return self._modules
+
+    @property
+    def pool(self):
+        """Helper class to interact with the repository pool"""
+        return self._pool
+
+    @property
+    def jobs(self):
+        """Helper class to interact with the background job queue"""
+        return self._jobs
+
+    @property
+    def pushes(self):
+        """Helper class to interact with push events received from GitHub"""
+        return self._pushes
+
+    @property
+    def rate_limits(self):
+        """Helper class to interact with GitHub's reported rate limits"""
+        return self._rate_limits
+
+    @property
+    def tokens(self):
+        """Helper class to interact with cached installation tokens"""
+        return self._tokens
+
+    @property
+    def checks(self):
+        """Helper class to interact with step check results shared by workers"""
+        return self._checks
+
+    @property
+    def names(self):
+        """Helper class to reserve repository names"""
+        return self._names
+
+    @property
+    def state(self):
+        """Helper class to interact with the values steps store about repositories"""
+        return self._state
+
+    @property
+    def metrics(self):
+        """Helper class to interact with metrics aggregated across workers"""
+        return self._metrics
@@ -0,0 +1,186 @@
+import datetime
+import json
+import sqlite3
+import time
+from typing import Any, TypedDict
+
+
+class JobInfo(TypedDict):
+    id: int
+    kind: str
+    payload: dict[str, Any]
+    owner: str | None
+    status: str
+    attempts: int
+    max_attempts: int
+    result: dict[str, Any] | None
+    error: str | None
+
+
+def _row_to_job(row: sqlite3.Row) -> JobInfo:
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "payload": json.loads(row["payload"]),
+        "owner": row["owner"],
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+    }
+
+
+class JobsDB:
+    """Helper class to interact with the background job queue
+
+    Jobs move from queued to running when a worker claims them, then to done,
+    back to queued with a delay for a retry, or to failed once out of attempts.
+    A running job whose lease expires is picked up again by another worker.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.datetime.now(datetime.UTC).isoformat()
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        idempotency_key: str | None = None,
+        owner: str | None = None,
+        max_attempts: int = 5,
+    ) -> int:
+        """Add a job to the queue
+
+        A job with the same idempotency key is reused, and queued again with
+        fresh attempts if it had failed for good.
+
+        Returns:
+            the id of the new job, or of the existing job with the same idempotency key
+        """
+        cur = self.conn.cursor()
+        timestamp = self._now()
+        cur.execute(
+            """INSERT INTO jobs(kind, payload, idempotency_key, owner, status,
+            attempts, max_attempts, run_after, created, updated)
+            VALUES(?, ?, ?, ?, 'queued', 0, ?, ?, ?, ?)
+            ON CONFLICT(idempotency_key) DO UPDATE SET
+              status = CASE WHEN status = 'failed' THEN 'queued' ELSE status END,
+              attempts = CASE WHEN status = 'failed' THEN 0 ELSE attempts END,
+              run_after = CASE WHEN status = 'failed'
+                THEN excluded.run_after ELSE run_after END
+            RETURNING id""",
+            (
+                kind,
+                json.dumps(payload),
+                idempotency_key,
+                owner,
+                max_attempts,
+                time.time(),
+                timestamp,
+                timestamp,
+            ),
+        )
+        job_id = cur.fetchone()["id"]
+        cur.close()
+        self.conn.commit()
+        return job_id
+
+    def claim(self, worker: str, lease: float = 300) -> JobInfo | None:
+        """Atomically take the oldest runnable job for a worker"""
+        now = time.time()
+        cur = self.conn.cursor()
+        cur.execute(
+            """UPDATE jobs SET status = 'running', attempts = attempts + 1,
+              locked_by = ?, locked_until = ?, updated = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'queued' AND run_after <= ?)
+                   OR (status = 'running' AND locked_until < ?)
+                ORDER BY id LIMIT 1
+            )
+            RETURNING *""",
+            (worker, now + lease, self._now(), now, now),
+        )
+        result = cur.fetchone()
+        cur.close()
+        self.conn.commit()
+        if not result:
+            return None
+        return _row_to_job(result)
+
+    def checkpoint(self, job_id: int, payload: dict[str, Any]):
+        """Save a running job's progress so a retry can resume from it"""
+        cur = self.conn.cursor()
+        cur.execute(
+            "UPDATE jobs SET payload = ?, updated = ? WHERE id = ?",
+            (json.dumps(payload), self._now(), job_id),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def complete(self, job_id: int, result: dict[str, Any] | None = None):
+        cur = self.conn.cursor()
+        cur.execute(
+            """UPDATE jobs SET status = 'done', result = ?, error = NULL,
+              locked_by = NULL, updated = ?
+            WHERE id = ?""",
+            (json.dumps(result) if result is not None else None, self._now(), job_id),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def fail(self, job_id: int, error: str, retry_delay: float):
+        """Record a failed attempt, requeueing the job if it has attempts left"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """UPDATE jobs SET
+              status = CASE WHEN attempts < max_attempts
+                THEN 'queued' ELSE 'failed' END,
+              run_after = ?, error = ?, locked_by = NULL, updated = ?
+            WHERE id = ?""",
+            (time.time() + retry_delay, error, self._now(), job_id),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def defer(self, job_id: int, until: float):
+        """Put a claimed job back in the queue without using up an attempt"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """UPDATE jobs SET status = 'queued', attempts = attempts - 1,
+              run_after = ?, locked_by = NULL, updated = ?
+            WHERE id = ?""",
+            (until, self._now(), job_id),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def pending(self, kind: str, repo: str) -> JobInfo | None:
+        """The queued or running job of a kind for a repository, if there is one"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT * FROM jobs
+            WHERE kind = ? AND status IN ('queued', 'running')
+              AND json_extract(payload, '$.repo') = ?
+            ORDER BY id LIMIT 1""",
+            (kind, repo),
+        )
+        result = cur.fetchone()
+        cur.close()
+        if not result:
+            return None
+        return _row_to_job(result)
+
+    def get(self, job_id: int) -> JobInfo | None:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        result = cur.fetchone()
+        cur.close()
+        if not result:
+            return None
+        return _row_to_job(result)
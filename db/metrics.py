@@ -0,0 +1,37 @@
+import sqlite3
+from collections.abc import Iterable
+
+# (metric name, labels as JSON, series, amount)
+Sample = tuple[str, str, str, float]
+
+
+class MetricsDB:
+    """Helper class to accumulate the metrics every worker reports
+
+    Each series is a running total, so flushing adds to what other workers
+    have already stored and reading returns the sum across all of them.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def add(self, samples: Iterable[Sample]):
+        cur = self.conn.cursor()
+        cur.executemany(
+            """INSERT INTO metrics(name, labels, series, value) VALUES(?, ?, ?, ?)
+            ON CONFLICT(name, labels, series) DO UPDATE SET
+              value = value + excluded.value""",
+            samples,
+        )
+        cur.close()
+        self.conn.commit()
+
+    def all(self) -> list[Sample]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT name, labels, series, value FROM metrics")
+        result = [
+            (row["name"], row["labels"], row["series"], row["value"])
+            for row in cur.fetchall()
+        ]
+        cur.close()
+        return result
@@ -0,0 +1,37 @@
+import sqlite3
+import time
+
+
+class NamesDB:
+    """Helper class to reserve repository names before the repositories exist
+
+    Each name is reserved at most once and never while a session uses it, so
+    two workers can't pick the same name at the same time.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def reserve(self, name: str) -> bool:
+        """
+        Returns:
+            whether the name was free and is now reserved
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO repo_names(name, reserved_at)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sessions WHERE repo = ?)
+            ON CONFLICT(name) DO NOTHING""",
+            (name, time.time(), name),
+        )
+        reserved = cur.rowcount == 1
+        cur.close()
+        self.conn.commit()
+        return reserved
+
+    def release(self, name: str):
+        """Free the name of a deleted repository"""
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM repo_names WHERE name = ?", (name,))
+        cur.close()
+        self.conn.commit()
@@ -0,0 +1,86 @@
+import datetime
+import sqlite3
+
+from module_core import HeadCommit
+
+
+class PushesDB:
+    """Helper class to interact with the latest push received for each repository"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def record(
+        self,
+        repo_name: str,
+        head: HeadCommit,
+        delivery: str | None = None,
+        push_time: float | None = None,
+    ) -> bool:
+        """Store a repository's new head commit, replacing the previous one
+
+        Webhooks may arrive out of order, so a push GitHub received before the
+        stored one is ignored.
+
+        Params:
+            push_time: when GitHub received the push, as a Unix timestamp
+
+        Returns:
+            whether the head was stored
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO pushes(repo, head_sha, author_login, committer_login,
+            pushed_at, delivery, received, push_time)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(repo) DO UPDATE SET
+              head_sha=excluded.head_sha,
+              author_login=excluded.author_login,
+              committer_login=excluded.committer_login,
+              pushed_at=excluded.pushed_at,
+              delivery=excluded.delivery,
+              received=excluded.received,
+              push_time=excluded.push_time
+            WHERE excluded.push_time IS NULL OR pushes.push_time IS NULL
+              OR excluded.push_time >= pushes.push_time""",
+            (
+                repo_name,
+                head.sha,
+                head.author_login,
+                head.committer_login,
+                head.timestamp,
+                delivery,
+                datetime.datetime.now(datetime.UTC).isoformat(),
+                push_time,
+            ),
+        )
+        stored = cur.rowcount == 1
+        cur.close()
+        self.conn.commit()
+        return stored
+
+    def get(self, repo_name: str) -> HeadCommit | None:
+        """Get the head commit from the latest push to a repository, if any arrived"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT head_sha, author_login, committer_login, pushed_at
+            FROM pushes WHERE repo = ?""",
+            (repo_name,),
+        )
+        result = cur.fetchone()
+        cur.close()
+        if not result:
+            return None
+
+        return HeadCommit(
+            sha=result["head_sha"],
+            author_login=result["author_login"],
+            committer_login=result["committer_login"],
+            timestamp=result["pushed_at"],
+        )
+
+    def delete(self, repo_name: str):
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM pushes WHERE repo = ?", (repo_name,))
+        cur.close()
+        self.conn.commit()
@@ -0,0 +1,57 @@
+import sqlite3
+import time
+from typing import TypedDict
+
+
+class RateLimitInfo(TypedDict):
+    resource: str
+    remaining: int
+    limit: int
+    reset: float
+    updated: float
+
+
+class RateLimitsDB:
+    """Helper class to interact with the last rate limit GitHub reported"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def record(self, resource: str, remaining: int, limit: int, reset: float):
+        """Store the rate limit headers from a GitHub response
+
+        A response from an older window never overwrites a newer one.
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO rate_limits(resource, remaining, "limit", reset, updated)
+            VALUES(?, ?, ?, ?, ?)
+            ON CONFLICT(resource) DO UPDATE SET
+              remaining=excluded.remaining,
+              "limit"=excluded."limit",
+              reset=excluded.reset,
+              updated=excluded.updated
+            WHERE excluded.reset >= rate_limits.reset""",
+            (resource, remaining, limit, reset, time.time()),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def get(self, resource: str = "core") -> RateLimitInfo | None:
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT resource, remaining, "limit", reset, updated
+            FROM rate_limits WHERE resource = ?""",
+            (resource,),
+        )
+        result = cur.fetchone()
+        cur.close()
+        if not result:
+            return None
+        return {
+            "resource": result["resource"],
+            "remaining": result["remaining"],
+            "limit": result["limit"],
+            "reset": result["reset"],
+            "updated": result["updated"],
+        }
@@ -0,0 +1,38 @@
+import sqlite3
+
+from module_core import StateStore
+
+
+class StateDB(StateStore):
+    """Helper class to keep the values steps store about each repository
+
+    Actions run in the job worker while checks run in web workers, so the
+    values live here rather than in any one process.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def get(self, repo: str, key: str) -> str | None:
+        cur = self.conn.cursor()
+        row = cur.execute(
+            "SELECT value FROM step_state WHERE repo = ? AND key = ?", (repo, key)
+        ).fetchone()
+        cur.close()
+        return row["value"] if row else None
+
+    def put(self, repo: str, key: str, value: str):
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO step_state(repo, key, value) VALUES(?, ?, ?)
+            ON CONFLICT(repo, key) DO UPDATE SET value = excluded.value""",
+            (repo, key, value),
+        )
+        cur.close()
+        self.conn.commit()
+
+    def clear(self, repo: str):
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM step_state WHERE repo = ?", (repo,))
+        cur.close()
+        self.conn.commit()
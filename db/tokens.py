@@ -0,0 +1,41 @@
+import sqlite3
+import time
+from typing import TypedDict
+
+
+class TokenInfo(TypedDict):
+    token: str
+    expires_at: float
+
+
+class TokensDB:
+    """Helper class to interact with cached GitHub App installation tokens"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def get(self, org_name: str) -> TokenInfo | None:
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT token, expires_at FROM installation_tokens WHERE org = ?",
+            (org_name,),
+        )
+        result = cur.fetchone()
+        cur.close()
+        if not result:
+            return None
+        return {"token": result["token"], "expires_at": result["expires_at"]}
+
+    def store(self, org_name: str, token: str, expires_at: float):
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO installation_tokens(org, token, expires_at, refreshed)
+            VALUES(?, ?, ?, ?)
+            ON CONFLICT(org) DO UPDATE SET
+              token=excluded.token,
+              expires_at=excluded.expires_at,
+              refreshed=excluded.refreshed""",
+            (org_name, token, expires_at, time.time()),
+        )
+        cur.close()
+        self.conn.commit()
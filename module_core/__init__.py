@@ -1,17 +1,62 @@
+from .cache import CheckCache
+from .fake import FakeForge
+from .forge import (
+    Forge,
+    GithubForge,
+    HeadCommit,
+    RepoInfo,
+    RepoNameTaken,
+    RepoNotFound,
+    blob_sha,
+    fetch_head,
+)
+from .mirror import MirrorStore, MirrorSyncError, has_merge_of, local_history
+from .names import NameAllocator, NoFreeName, random_nouns
+from .state import MemoryStateStore, StateStore, StepState
 from .steps import (
     CheckResult,
+    CommitBuilder,
+    LazyRepository,
     Module,
     Session,
     Step,
     create_repo,
     create_repo_from_template,
+    head_commit,
 )
+from .templates import TemplateDrift, sync_template, template_drift
 
 __all__ = [
+    "CheckCache",
     "CheckResult",
+    "CommitBuilder",
+    "FakeForge",
+    "Forge",
+    "GithubForge",
+    "HeadCommit",
+    "LazyRepository",
+    "MemoryStateStore",
+    "MirrorStore",
+    "MirrorSyncError",
+    "NameAllocator",
+    "NoFreeName",
+    "RepoInfo",
+    "RepoNameTaken",
+    "RepoNotFound",
+    "StateStore",
     "Step",
+    "StepState",
+    "TemplateDrift",
     "create_repo",
     "create_repo_from_template",
+    "blob_sha",
+    "fetch_head",
+    "has_merge_of",
+    "head_commit",
+    "local_history",
+    "random_nouns",
+    "sync_template",
+    "template_drift",
     "Module",
     "Session",
 ]
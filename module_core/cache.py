@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .steps import CheckResult
+
+
+class CheckCache:
+    """Remembers recent step check results for each repository
+
+    Entries are keyed by the head commit the check saw as well as the repository
+    and step, so a push misses the cache in every worker whose session knows the
+    new head. Entries expire after `ttl` seconds, and the least recently used
+    ones are dropped beyond `size`.
+    """
+
+    def __init__(self, ttl: float = 10.0, size: int = 4096):
+        self.ttl = ttl
+        self.size = size
+        self._entries: OrderedDict[
+            tuple[str, int, str | None], tuple[float, tuple[CheckResult, str]]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self, repo: str, step: int, head_sha: str | None
+    ) -> tuple[CheckResult, str] | None:
+        key = (repo, step, head_sha)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, result = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def put(
+        self,
+        repo: str,
+        step: int,
+        head_sha: str | None,
+        result: tuple[CheckResult, str],
+    ):
+        if self.ttl <= 0:
+            return
+        key = (repo, step, head_sha)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, repo: str):
+        """Forget every result for a repository, after a push to it"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == repo]:
+                del self._entries[key]
@@ -0,0 +1,133 @@
+import datetime
+import hashlib
+import itertools
+import threading
+from dataclasses import dataclass, field
+
+from .forge import (
+    Forge,
+    HeadCommit,
+    RepoInfo,
+    RepoNameTaken,
+    RepoNotFound,
+    blob_sha,
+)
+
+
+@dataclass
+class FakeRepo:
+    info: RepoInfo
+    files: dict[str, str] = field(default_factory=dict)
+    commits: list[HeadCommit] = field(default_factory=list)
+    collaborators: dict[str, str] = field(default_factory=dict)
+    is_template: bool = False
+
+
+class FakeForge(Forge):
+    """An in-memory forge for running modules without GitHub
+
+    Commits made through the forge are attributed to `login`, like those made by
+    the GitHub App. Use `push` to stand in for a student pushing to a repository.
+    """
+
+    def __init__(self, login: str = "git-learner[bot]"):
+        self.login = login
+        self.repos: dict[str, FakeRepo] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _get(self, full_name: str) -> FakeRepo:
+        try:
+            return self.repos[full_name]
+        except KeyError:
+            raise RepoNotFound(full_name) from None
+
+    def _commit(self, repo: FakeRepo, login: str) -> HeadCommit:
+        sha = hashlib.sha1(
+            f"{repo.info['id']}:{len(repo.commits)}".encode()
+        ).hexdigest()
+        timestamp = datetime.datetime.now(datetime.UTC).isoformat()
+        head = HeadCommit(sha, login, login, timestamp)
+        repo.commits.append(head)
+        return head
+
+    def create_repo(self, org_name: str, name: str) -> RepoInfo:
+        full_name = f"{org_name}/{name}"
+        with self._lock:
+            if full_name in self.repos:
+                raise RepoNameTaken(name)
+            info: RepoInfo = {
+                "id": next(self._ids),
+                "name": name,
+                "ssh_url": f"git@fake-forge:{full_name}.git",
+                "default_branch": "main",
+            }
+            self.repos[full_name] = FakeRepo(info)
+        return info
+
+    def create_repo_from_template(
+        self, org_name: str, name: str, template: str
+    ) -> RepoInfo:
+        files = dict(self._get(template).files)
+        info = self.create_repo(org_name, name)
+        repo = self.repos[f"{org_name}/{name}"]
+        with self._lock:
+            repo.files.update(files)
+            if files:
+                self._commit(repo, self.login)
+        return info
+
+    def repo_info(self, full_name: str) -> RepoInfo:
+        return self._get(full_name).info
+
+    def create_file(
+        self,
+        full_name: str,
+        path: str,
+        message: str,
+        content: str,
+        branch: str | None = None,
+    ):
+        repo = self._get(full_name)
+        with self._lock:
+            if path in repo.files:
+                raise FileExistsError(path)
+            repo.files[path] = content
+            self._commit(repo, self.login)
+
+    def commit_files(
+        self, full_name: str, branch: str, files: dict[str, str], message: str
+    ) -> str:
+        repo = self._get(full_name)
+        with self._lock:
+            repo.files.update(files)
+            return self._commit(repo, self.login).sha
+
+    def file_shas(self, full_name: str, branch: str) -> dict[str, str]:
+        repo = self._get(full_name)
+        return {path: blob_sha(content) for path, content in repo.files.items()}
+
+    def mark_template(self, full_name: str):
+        self._get(full_name).is_template = True
+
+    def head_commit(self, full_name: str, branch: str) -> HeadCommit:
+        repo = self._get(full_name)
+        if not repo.commits:
+            raise LookupError(f"{full_name} has no commits")
+        return repo.commits[-1]
+
+    def add_collaborator(self, full_name: str, user: str, permission: str):
+        self._get(full_name).collaborators[user] = permission
+
+    def delete_repo(self, full_name: str):
+        with self._lock:
+            self.repos.pop(full_name, None)
+
+    def push(
+        self, full_name: str, user: str, files: dict[str, str] | None = None
+    ) -> HeadCommit:
+        """Record a push of one new commit by a user"""
+        repo = self._get(full_name)
+        with self._lock:
+            repo.files.update(files or {})
+            return self._commit(repo, user)
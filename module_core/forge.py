@@ -0,0 +1,406 @@
+import base64
+import contextlib
+import hashlib
+import json
+import threading
+import urllib.parse
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, TypedDict
+
+from github import Github, GithubException, UnknownObjectException
+from github.GithubObject import NotSet
+from github.Repository import Repository
+
+
+class RepoNameTaken(Exception):
+    """A repository with the requested name already exists"""
+
+
+class RepoNotFound(Exception):
+    """The requested repository does not exist"""
+
+
+class RepoInfo(TypedDict):
+    """Repository metadata recorded when a session's repository is created"""
+
+    id: int | None
+    name: str
+    ssh_url: str
+    default_branch: str
+
+
+def repo_info_from(repo: Any) -> RepoInfo:
+    """Extract the metadata worth storing from a fully loaded repository"""
+    return {
+        "id": repo.id,
+        "name": repo.name,
+        "ssh_url": repo.ssh_url,
+        "default_branch": repo.default_branch,
+    }
+
+
+def blob_sha(content: str) -> str:
+    """The SHA git gives a file with this content"""
+    data = content.encode()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+@dataclass(frozen=True)
+class HeadCommit:
+    """The commit at the tip of a repository's default branch"""
+
+    sha: str
+    author_login: str | None
+    committer_login: str | None
+    timestamp: str | None = None
+
+
+class Forge(ABC):
+    """The service hosting session repositories
+
+    Repositories are addressed by their full name (owner/name). Everything a
+    module does to a repository goes through these methods, so modules can run
+    against GitHub or against an in-memory fake.
+    """
+
+    @abstractmethod
+    def create_repo(self, org_name: str, name: str) -> RepoInfo:
+        """
+        Raises:
+            RepoNameTaken: the organization already has a repository with that name
+        """
+
+    @abstractmethod
+    def create_repo_from_template(
+        self, org_name: str, name: str, template: str
+    ) -> RepoInfo:
+        """Copy the template repository's files into a new repository
+
+        Raises:
+            RepoNameTaken: the organization already has a repository with that name
+            RepoNotFound: the template does not exist
+        """
+
+    @abstractmethod
+    def repo_info(self, full_name: str) -> RepoInfo:
+        pass
+
+    @abstractmethod
+    def create_file(
+        self,
+        full_name: str,
+        path: str,
+        message: str,
+        content: str,
+        branch: str | None = None,
+    ):
+        """Commit a new file, to the default branch unless one is given"""
+
+    @abstractmethod
+    def commit_files(
+        self, full_name: str, branch: str, files: dict[str, str], message: str
+    ) -> str:
+        """Write any number of files to a branch as a single commit
+
+        Files that already exist are overwritten, and an empty repository gets
+        its first commit.
+
+        Returns:
+            the SHA of the new commit
+        """
+
+    @abstractmethod
+    def file_shas(self, full_name: str, branch: str) -> dict[str, str]:
+        """The blob SHA of every file on a branch, by path
+
+        Raises:
+            RepoNotFound: the repository does not exist
+        """
+
+    @abstractmethod
+    def mark_template(self, full_name: str):
+        """Let other repositories be created from this one"""
+
+    @abstractmethod
+    def head_commit(self, full_name: str, branch: str) -> HeadCommit:
+        pass
+
+    @abstractmethod
+    def add_collaborator(self, full_name: str, user: str, permission: str):
+        pass
+
+    @abstractmethod
+    def delete_repo(self, full_name: str):
+        """Delete a repository, treating one that is already gone as deleted"""
+
+
+class HeadCache:
+    """Remembers the last head seen for each repository branch
+
+    Entries hold the ETag of the branch ref, so a check can ask GitHub whether
+    the branch moved with a conditional request. Unchanged refs (304 responses)
+    don't count against the rate limit.
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self._entries: OrderedDict[str, tuple[str | None, HeadCommit]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[str | None, HeadCommit] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, etag: str | None, head: HeadCommit):
+        with self._lock:
+            self._entries[key] = (etag, head)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+_heads = HeadCache()
+
+
+def fetch_head(
+    requester: Any, full_name: str, branch: str, cache: HeadCache | None = None
+) -> HeadCommit:
+    """Ask GitHub for the head commit of a repository branch
+
+    Only the branch ref is requested, conditionally on the last ETag seen.
+    The commit itself is fetched only when the ref points somewhere new.
+
+    Params:
+        requester: the PyGithub requester of an authenticated Github object
+    """
+    cache = cache if cache is not None else _heads
+    key = f"{full_name}:{branch}"
+    cached = cache.get(key)
+
+    headers = {"If-None-Match": cached[0]} if cached and cached[0] else {}
+    status, response_headers, body = requester.requestJson(
+        "GET", f"/repos/{full_name}/git/ref/heads/{branch}", headers=headers
+    )
+    if status == 304 and cached is not None:
+        return cached[1]
+    data = json.loads(body) if body else {}
+    if status >= 400:
+        raise requester.createException(status, response_headers, data)
+
+    etag = response_headers.get("etag")
+    sha = data["object"]["sha"]
+    if cached is not None and cached[1].sha == sha:
+        cache.put(key, etag, cached[1])
+        return cached[1]
+
+    _, commit = requester.requestJsonAndCheck(
+        "GET", f"/repos/{full_name}/commits/{sha}"
+    )
+    head = HeadCommit(
+        sha=sha,
+        author_login=(commit.get("author") or {}).get("login"),
+        committer_login=(commit.get("committer") or {}).get("login"),
+        timestamp=commit["commit"]["committer"]["date"],
+    )
+    cache.put(key, etag, head)
+    return head
+
+
+class GithubForge(Forge):
+    """Repositories hosted on GitHub, managed through PyGithub"""
+
+    def __init__(
+        self, github: Github | Callable[[], Github], heads: HeadCache | None = None
+    ):
+        """
+        Params:
+            github: a Github object, or a callable returning one for each call
+            heads: where to cache branch heads, shared by every forge by default
+        """
+        self._github = github
+        self.heads = heads
+
+    @property
+    def github(self) -> Github:
+        github = self._github() if callable(self._github) else self._github
+        # lazy, so calls like create_file don't fetch the repository first
+        if not github.requester.is_lazy:
+            github = github.withLazy(True)
+        return github
+
+    def _repo(self, full_name: str) -> Repository:
+        return self.github.get_repo(full_name)
+
+    def create_repo(self, org_name: str, name: str) -> RepoInfo:
+        try:
+            repo = self.github.get_organization(org_name).create_repo(name)
+        except GithubException as e:
+            if e.status == 422:
+                raise RepoNameTaken(name) from e
+            raise
+        return repo_info_from(repo)
+
+    def create_repo_from_template(
+        self, org_name: str, name: str, template: str
+    ) -> RepoInfo:
+        try:
+            _, data = self.github.requester.requestJsonAndCheck(
+                "POST",
+                f"/repos/{template}/generate",
+                input={"name": name, "owner": org_name},
+            )
+        except UnknownObjectException as e:
+            raise RepoNotFound(template) from e
+        except GithubException as e:
+            if e.status == 422:
+                raise RepoNameTaken(name) from e
+            raise
+        return {
+            "id": data["id"],
+            "name": data["name"],
+            "ssh_url": data["ssh_url"],
+            "default_branch": data["default_branch"],
+        }
+
+    def repo_info(self, full_name: str) -> RepoInfo:
+        try:
+            return repo_info_from(self._repo(full_name))
+        except UnknownObjectException as e:
+            raise RepoNotFound(full_name) from e
+
+    def create_file(
+        self,
+        full_name: str,
+        path: str,
+        message: str,
+        content: str,
+        branch: str | None = None,
+    ):
+        self._repo(full_name).create_file(
+            path, message, content, branch=branch if branch else NotSet
+        )
+
+    def commit_files(
+        self, full_name: str, branch: str, files: dict[str, str], message: str
+    ) -> str:
+        """Write files through the Git Data API in a fixed number of requests
+
+        File contents go inline in the new tree rather than as separate blobs.
+        The Git Data API refuses to write to empty repositories, so their first
+        file is written through the contents API. The batch then replaces that
+        commit as the repository's root commit.
+        """
+        requester = self.github.requester
+        git = f"/repos/{full_name}/git"
+        try:
+            _, ref = requester.requestJsonAndCheck("GET", f"{git}/ref/heads/{branch}")
+        except GithubException as e:
+            # 409: the repository is empty, 404: it has no such branch yet
+            if e.status not in (404, 409):
+                raise
+            return self._first_commit(full_name, branch, files, message)
+
+        parent = ref["object"]["sha"]
+        _, commit = requester.requestJsonAndCheck("GET", f"{git}/commits/{parent}")
+        return self._commit_tree(
+            full_name, branch, files, message, commit["tree"]["sha"], [parent]
+        )
+
+    def _first_commit(
+        self, full_name: str, branch: str, files: dict[str, str], message: str
+    ) -> str:
+        path, content = next(iter(files.items()))
+        _, created = self.github.requester.requestJsonAndCheck(
+            "PUT",
+            f"/repos/{full_name}/contents/{urllib.parse.quote(path)}",
+            input={
+                "message": message,
+                "content": base64.b64encode(content.encode()).decode(),
+                "branch": branch,
+            },
+        )
+        if len(files) == 1:
+            return created["commit"]["sha"]
+        return self._commit_tree(
+            full_name,
+            branch,
+            files,
+            message,
+            created["commit"]["tree"]["sha"],
+            [],
+            force=True,
+        )
+
+    def _commit_tree(
+        self,
+        full_name: str,
+        branch: str,
+        files: dict[str, str],
+        message: str,
+        base_tree: str,
+        parents: list[str],
+        force: bool = False,
+    ) -> str:
+        requester = self.github.requester
+        git = f"/repos/{full_name}/git"
+        _, tree = requester.requestJsonAndCheck(
+            "POST",
+            f"{git}/trees",
+            input={
+                "base_tree": base_tree,
+                "tree": [
+                    {"path": path, "mode": "100644", "type": "blob", "content": content}
+                    for path, content in files.items()
+                ],
+            },
+        )
+        _, commit = requester.requestJsonAndCheck(
+            "POST",
+            f"{git}/commits",
+            input={"message": message, "tree": tree["sha"], "parents": parents},
+        )
+        requester.requestJsonAndCheck(
+            "PATCH",
+            f"{git}/refs/heads/{branch}",
+            input={"sha": commit["sha"], "force": force},
+        )
+        return commit["sha"]
+
+    def file_shas(self, full_name: str, branch: str) -> dict[str, str]:
+        try:
+            _, tree = self.github.requester.requestJsonAndCheck(
+                "GET",
+                f"/repos/{full_name}/git/trees/{branch}",
+                parameters={"recursive": "1"},
+            )
+        except UnknownObjectException as e:
+            raise RepoNotFound(full_name) from e
+        except GithubException as e:
+            # the repository is empty
+            if e.status == 409:
+                return {}
+            raise
+        return {
+            entry["path"]: entry["sha"]
+            for entry in tree["tree"]
+            if entry["type"] == "blob"
+        }
+
+    def mark_template(self, full_name: str):
+        self._repo(full_name).edit(is_template=True)
+
+    def head_commit(self, full_name: str, branch: str) -> HeadCommit:
+        return fetch_head(self.github.requester, full_name, branch, self.heads)
+
+    def add_collaborator(self, full_name: str, user: str, permission: str):
+        self._repo(full_name).add_to_collaborators(user, permission)
+
+    def delete_repo(self, full_name: str):
+        with contextlib.suppress(UnknownObjectException):
+            self._repo(full_name).delete()
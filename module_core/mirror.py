@@ -0,0 +1,150 @@
+import fcntl
+import os
+import shutil
+from collections.abc import Callable
+from contextlib import contextmanager
+
+import git
+
+from .steps import LazyRepository
+
+# answers git's credential requests from the environment, so tokens never
+# appear in a command line other processes can read
+CREDENTIAL_HELPER = (
+    '!f() { echo username=x-access-token; echo "password=$GIT_LEARNER_TOKEN"; }; f'
+)
+
+
+class MirrorSyncError(Exception):
+    """A mirror could not be fetched from its remote"""
+
+
+class MirrorStore:
+    """Bare local mirrors of session repositories
+
+    Mirrors are created on first use and brought up to date with an incremental
+    `git fetch`, so checks can walk a repository's history without using any
+    GitHub API quota. The access token is read on every fetch and handed to git
+    through a credential helper, never stored in the mirror or passed as an
+    argument.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        remote_url: Callable[[str], str],
+        token: Callable[[], str] | None = None,
+    ):
+        """
+        Params:
+            root: the directory holding the mirrors
+            remote_url: maps a repository's full name to a URL git can fetch from
+            token: returns the token to fetch with, when the remote needs one
+        """
+        self.root = root
+        self.remote_url = remote_url
+        self.token = token
+
+    def path(self, full_name: str) -> str:
+        return os.path.join(self.root, f"{full_name}.git")
+
+    @contextmanager
+    def _locked(self, full_name: str):
+        path = self.path(full_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield path
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def sync(self, full_name: str) -> git.Repo:
+        """Fetch a repository's branches into its mirror, creating it if needed
+
+        Raises:
+            MirrorSyncError: the fetch failed
+        """
+        with self._locked(full_name) as path:
+            if os.path.isdir(path):
+                mirror = git.Repo(path)
+            else:
+                mirror = git.Repo.init(path, bare=True, mkdir=True)
+            try:
+                with mirror.git.custom_environment(**self._credentials()):
+                    mirror.git.fetch(
+                        "--prune",
+                        "--quiet",
+                        self.remote_url(full_name),
+                        "+refs/heads/*:refs/heads/*",
+                    )
+            except git.GitCommandError as e:
+                raise MirrorSyncError(
+                    f"Could not fetch {full_name}: exit status {e.status}"
+                ) from None
+            return mirror
+
+    def _credentials(self) -> dict[str, str]:
+        """Environment variables that let git authenticate with the token"""
+        if self.token is None:
+            return {}
+        return {
+            # an empty helper first drops any helpers configured on the machine
+            "GIT_CONFIG_COUNT": "2",
+            "GIT_CONFIG_KEY_0": "credential.helper",
+            "GIT_CONFIG_VALUE_0": "",
+            "GIT_CONFIG_KEY_1": "credential.helper",
+            "GIT_CONFIG_VALUE_1": CREDENTIAL_HELPER,
+            "GIT_LEARNER_TOKEN": self.token(),
+            "GIT_TERMINAL_PROMPT": "0",
+        }
+
+    def current(self, full_name: str, head_sha: str | None = None) -> git.Repo:
+        """A repository's mirror, fetched only when it is behind
+
+        A mirror is behind when it doesn't exist yet or lacks the latest pushed
+        commit. Without a known head there's no telling, so it is fetched.
+
+        Raises:
+            MirrorSyncError: the fetch failed
+        """
+        path = self.path(full_name)
+        if head_sha is not None and os.path.isdir(path):
+            mirror = git.Repo(path)
+            try:
+                mirror.git.cat_file("-e", f"{head_sha}^{{commit}}")
+                return mirror
+            except git.GitCommandError:
+                pass
+        return self.sync(full_name)
+
+    def remove(self, full_name: str):
+        """Delete a repository's mirror, if there is one"""
+        with self._locked(full_name) as path:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+
+def local_history(repo) -> git.Repo | None:
+    """Get a local mirror of a session's repository holding its latest push
+
+    The mirror is read as it is when the webhook's sync already fetched the
+    recorded head, so most checks don't wait on git.
+
+    Returns:
+        None when the repository is not backed by a mirror store
+    """
+    if isinstance(repo, LazyRepository) and repo.mirrors is not None:
+        head_sha = repo.head.sha if repo.head else None
+        return repo.mirrors.current(repo.full_name, head_sha)
+    return None
+
+
+def has_merge_of(history: git.Repo, branch: str, sha: str) -> bool:
+    """Whether a branch contains a merge commit with the given commit as a parent"""
+    if branch not in history.heads:
+        return False
+    for commit in history.iter_commits(branch, merges=True):
+        if any(parent.hexsha == sha for parent in commit.parents):
+            return True
+    return False
@@ -0,0 +1,71 @@
+import functools
+import importlib.resources
+import random
+import re
+from collections.abc import Callable
+
+ADJECTIVES = "adjectivelist.txt"
+NOUNS = "nounlist.txt"
+
+_PLAIN_WORD = re.compile("[a-z]+")
+
+
+class NoFreeName(Exception):
+    """Every candidate name was already taken"""
+
+
+@functools.cache
+def _words(asset: str) -> tuple[str, ...]:
+    """One of wonderwords' word lists, kept to plain lowercase words"""
+    text = importlib.resources.files("wonderwords.assets").joinpath(asset).read_text()
+    return tuple(word for word in text.splitlines() if _PLAIN_WORD.fullmatch(word))
+
+
+def random_nouns(count: int, rng: random.Random | None = None) -> list[str]:
+    """Distinct random nouns, for filling files with throwaway content"""
+    return (rng or random).sample(_words(NOUNS), count)
+
+
+class NameAllocator:
+    """Picks adjective-noun repository names
+
+    The word lists are loaded once per process. When `reserve` is set, each
+    candidate is reserved with it before use, so names that other sessions or
+    workers hold are skipped without asking the forge.
+    """
+
+    def __init__(
+        self,
+        reserve: Callable[[str], bool] | None = None,
+        rng: random.Random | None = None,
+        release: Callable[[str], None] | None = None,
+    ):
+        """
+        Params:
+            reserve: takes a name for the caller, returning False if it was taken
+            release: gives back a reserved name whose repository was never created
+        """
+        self.reserve = reserve
+        self.release = release
+        self.rng = rng or random.Random()
+
+    def candidate(self) -> str:
+        adjective = self.rng.choice(_words(ADJECTIVES))
+        noun = self.rng.choice(_words(NOUNS))
+        return f"{adjective}-{noun}"
+
+    def allocate(self, attempts: int = 20) -> str:
+        """Pick a name and reserve it
+
+        Raises:
+            NoFreeName: every name tried was taken
+        """
+        for _ in range(attempts):
+            name = self.candidate()
+            if self.reserve is None or self.reserve(name):
+                return name
+        raise NoFreeName(f"No free repository name after {attempts} attempts")
+
+
+# used when no allocator is passed in; it reserves nothing, the app passes its own
+allocator = NameAllocator()
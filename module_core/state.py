@@ -0,0 +1,68 @@
+import threading
+from abc import ABC, abstractmethod
+
+# state holds references such as commit SHAs, never file contents or objects
+MAX_VALUE_LENGTH = 256
+
+
+class StateStore(ABC):
+    """Where steps keep small values about a repository between requests"""
+
+    @abstractmethod
+    def get(self, repo: str, key: str) -> str | None: ...
+
+    @abstractmethod
+    def put(self, repo: str, key: str, value: str): ...
+
+    @abstractmethod
+    def clear(self, repo: str):
+        """Forget everything stored for a repository, when its session ends"""
+
+
+class MemoryStateStore(StateStore):
+    """A state store for a single process, used when no database is given"""
+
+    def __init__(self):
+        self._values: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, repo: str, key: str) -> str | None:
+        return self._values.get((repo, key))
+
+    def put(self, repo: str, key: str, value: str):
+        with self._lock:
+            self._values[(repo, key)] = value
+
+    def clear(self, repo: str):
+        with self._lock:
+            for key in [key for key in self._values if key[0] == repo]:
+                del self._values[key]
+
+
+class StepState:
+    """The values steps have stored about one repository
+
+    Steps keep no per-user data themselves. An action stores what a later check
+    needs here, so the check can run in any worker.
+    """
+
+    def __init__(self, store: StateStore, repo: str):
+        self.store = store
+        self.repo = repo
+
+    def get(self, key: str) -> str | None:
+        return self.store.get(self.repo, key)
+
+    def set(self, key: str, value: str):
+        """
+        Raises:
+            ValueError: the value is longer than MAX_VALUE_LENGTH
+        """
+        if len(value) > MAX_VALUE_LENGTH:
+            raise ValueError(
+                f"State values are limited to {MAX_VALUE_LENGTH} characters"
+            )
+        self.store.put(self.repo, key, value)
+
+    def clear(self):
+        self.store.clear(self.repo)
@@ -1,15 +1,156 @@
+import logging
 from abc import ABC, abstractmethod
 from collections.abc import Callable
 from enum import Enum
+from typing import TYPE_CHECKING
 
-import wonderwords
-from github import Github
-from github.Repository import Repository
+from .forge import (
+    Forge,
+    HeadCommit,
+    RepoInfo,
+    RepoNameTaken,
+    RepoNotFound,
+    repo_info_from,
+)
+from .names import NameAllocator, allocator
+from .state import MemoryStateStore, StateStore, StepState
+
+if TYPE_CHECKING:
+    from .cache import CheckCache
+    from .mirror import MirrorStore
+
+logger = logging.getLogger(__name__)
 
 
 class UnrecoverableRepoStateException(Exception): ...
 
 
+class LazyRepository:
+    """A handle to a repository on a forge
+
+    The stored metadata (id, name, ssh_url, default_branch) is served locally,
+    and fetched from the forge the first time it is needed if none was stored.
+    """
+
+    def __init__(
+        self,
+        forge: Forge | Callable[[], Forge],
+        full_name: str,
+        info: RepoInfo | None = None,
+        head: HeadCommit | None = None,
+        mirrors: "MirrorStore | None" = None,
+        state: StepState | None = None,
+    ):
+        self.full_name = full_name
+        self.info = info
+        self.head = head
+        self.mirrors = mirrors
+        self._state = state
+        self._forge = forge
+
+    @property
+    def forge(self) -> Forge:
+        """The forge hosting the repository, resolved on first use if a callable"""
+        if callable(self._forge):
+            self._forge = self._forge()
+        return self._forge
+
+    @property
+    def state(self) -> StepState:
+        """Values steps stored about the repository, in memory if no store was given"""
+        if self._state is None:
+            self._state = StepState(MemoryStateStore(), self.name)
+        return self._state
+
+    @state.setter
+    def state(self, state: StepState):
+        self._state = state
+
+    def _stored(self, key: str):
+        if self.info is None or self.info.get(key) is None:
+            self.info = self.forge.repo_info(self.full_name)
+        return self.info[key]
+
+    @property
+    def id(self) -> int:
+        return self._stored("id")
+
+    @property
+    def name(self) -> str:
+        if self.info is not None:
+            return self.info["name"]
+        return self.full_name.split("/", 1)[1]
+
+    @property
+    def ssh_url(self) -> str:
+        return self._stored("ssh_url")
+
+    @property
+    def default_branch(self) -> str:
+        return self._stored("default_branch")
+
+    def create_file(
+        self, path: str, message: str, content: str, branch: str | None = None
+    ):
+        self.forge.create_file(self.full_name, path, message, content, branch)
+
+    def commit_files(
+        self, files: dict[str, str], message: str, branch: str | None = None
+    ) -> str:
+        """Write files as one commit, to the default branch unless one is given
+
+        Returns:
+            the SHA of the new commit
+        """
+        return self.forge.commit_files(
+            self.full_name, branch or self.default_branch, files, message
+        )
+
+    def add_to_collaborators(self, user: str, permission: str = "push"):
+        self.forge.add_collaborator(self.full_name, user, permission)
+
+    def delete(self):
+        self.forge.delete_repo(self.full_name)
+
+
+class CommitBuilder:
+    """Collects files for a step action to write to a repository as one commit
+
+    However many files are added, the commit takes a fixed number of requests.
+    """
+
+    def __init__(self, repo: LazyRepository, message: str, branch: str | None = None):
+        self.repo = repo
+        self.message = message
+        self.branch = branch
+        self.files: dict[str, str] = {}
+
+    def add(self, path: str, content: str) -> "CommitBuilder":
+        self.files[path] = content
+        return self
+
+    def commit(self) -> str:
+        """Write the collected files
+
+        Returns:
+            the SHA of the new commit
+        """
+        if not self.files:
+            raise ValueError("No files to commit")
+        return self.repo.commit_files(self.files, self.message, self.branch)
+
+
+def head_commit(repo: LazyRepository) -> HeadCommit:
+    """Get the head commit of a repository's default branch
+
+    Uses the head recorded from push webhooks when there is one,
+    otherwise asks the forge.
+    """
+    if repo.head is not None:
+        return repo.head
+    return repo.forge.head_commit(repo.full_name, repo.default_branch)
+
+
 class CheckResult(Enum):
     """The result of a Step's check"""
 
@@ -21,64 +162,134 @@ class CheckResult(Enum):
 
 class Step(ABC):
     @abstractmethod
-    def instructions(self, repo: Repository) -> str:
+    def instructions(self, repo: LazyRepository) -> str:
         pass
 
     @abstractmethod
-    def action(self, repo: Repository):
+    def action(self, repo: LazyRepository):
         pass
 
     @abstractmethod
-    def check(self, repo: Repository, user: str) -> tuple[CheckResult, str]:
+    def check(self, repo: LazyRepository, user: str) -> tuple[CheckResult, str]:
         pass
 
 
-def create_repo(github: Github, org_name: str) -> Repository:
+def _create_with_free_name(
+    create: Callable[[str], RepoInfo], names: NameAllocator | None, attempts: int
+) -> RepoInfo:
+    """Create a repository under names from the allocator until one is free
+
+    A name the forge already has stays reserved, any other failure releases it.
+    """
+    names = names or allocator
+    for attempt in range(attempts):
+        name = names.allocate()
+        try:
+            return create(name)
+        except RepoNameTaken:
+            if attempt == attempts - 1:
+                raise
+        except Exception:
+            if names.release is not None:
+                names.release(name)
+            raise
+    raise ValueError("attempts must be positive")
+
+
+def create_repo(
+    forge: Forge,
+    org_name: str,
+    attempts: int = 5,
+    names: NameAllocator | None = None,
+) -> LazyRepository:
     """Create a repository under an organization with a random adjective-noun name
 
     Params:
-        github: an authenticated Github object to interact with the GitHub API
+        forge: the forge to create the repository on
         org_name: the organization which the repo should be created under
+        attempts: how many names to try before giving up when names are taken
+        names: where names come from, the process-wide allocator by default
     """
-    r = wonderwords.RandomWord()
-    adjective: str = r.word(include_parts_of_speech=["adjective"])
-    noun: str = r.word(include_parts_of_speech=["noun"])
-    repo_name = adjective + "-" + noun
-
-    org = github.get_organization(org_name)
-    return org.create_repo(f"{repo_name}")
-
-
-def create_repo_from_template(github: Github, template: Repository, org_name: str):
+    info = _create_with_free_name(
+        lambda name: forge.create_repo(org_name, name), names, attempts
+    )
+    return LazyRepository(forge, f"{org_name}/{info['name']}", info)
+
+
+def create_repo_from_template(
+    forge: Forge,
+    template: str,
+    org_name: str,
+    seed: dict[str, str] | None = None,
+    attempts: int = 5,
+    names: NameAllocator | None = None,
+) -> LazyRepository:
     """Copies a template repository into a new repository under an organization
 
     Params:
-        github: an authenticated Github object to interact with the GitHub API
-        template: a repository object for the reposity to use as a template
+        forge: the forge to create the repository on
+        template: the full name (owner/name) of the repository to use as a template
         org_name: the organization which the repo should be created under
+        seed: the template's files, committed to an empty repository instead
+            when the template does not exist
+        attempts: how many names to try before giving up when names are taken
+        names: where names come from, the process-wide allocator by default
+
+    Raises:
+        RepoNotFound: the template does not exist and there is no seed
     """
-    r = wonderwords.RandomWord()
-    adjective: str = r.word(include_parts_of_speech=["adjective"])
-    noun: str = r.word(include_parts_of_speech=["noun"])
-    repo_name = adjective + "-" + noun
 
-    org = github.get_organization(org_name)
-    return org.create_repo_from_template(repo_name, template)
+    def create(name: str) -> RepoInfo:
+        try:
+            return forge.create_repo_from_template(org_name, name, template)
+        except RepoNotFound:
+            if seed is None:
+                raise
+        logger.warning("Template %s is missing, seeding a new repository", template)
+        info = forge.create_repo(org_name, name)
+        forge.commit_files(
+            f"{org_name}/{name}", info["default_branch"], seed, "Add starting files"
+        )
+        return info
+
+    info = _create_with_free_name(create, names, attempts)
+    return LazyRepository(forge, f"{org_name}/{info['name']}", info)
 
 
 class Module:
     def __init__(
         self,
         name: str,
-        initializer: Callable[[Github], Repository],
+        initializer: Callable[[Forge, NameAllocator | None], LazyRepository],
         steps: list[Step],
+        template: str | None = None,
+        seed: dict[str, str] | None = None,
     ):
+        """
+        Params:
+            initializer: creates a repository for a new session, taking names from
+                the given allocator
+            template: the full name of the template repository sessions start from
+            seed: the files the template is expected to hold
+        """
         self.name = name
         self.steps = steps
         self.initializer = initializer
-
-    def create(self, github: Github) -> Repository:
-        return self.initializer(github)
+        self.template = template
+        self.seed = seed
+
+    def create(
+        self, forge: Forge, names: NameAllocator | None = None
+    ) -> LazyRepository:
+        return self.initializer(forge, names)
+
+    def provision(
+        self, forge: Forge, names: NameAllocator | None = None
+    ) -> LazyRepository:
+        """Create a repository with the first step's action already applied"""
+        repo = self.create(forge, names)
+        self.steps[0].action(repo)
+        return repo
 
     def __len__(self):
         return len(self.steps)
@@ -90,17 +301,39 @@ class Module:
         return self.steps[index]
 
 
+# runs the check of a session's step, so callers can share or reuse results
+Checker = Callable[["Session", int], tuple[CheckResult, str]]
+
+
 class Session:
     def __init__(
         self,
-        github: Github,
+        forge: Forge | Callable[[], Forge],
         user: str,
         org_name: str,
         module: Module,
         repo_name: str | None = None,
         current_step: int = 1,
+        repo_info: RepoInfo | None = None,
+        head: HeadCommit | None = None,
+        mirrors: "MirrorStore | None" = None,
+        checker: Checker | None = None,
+        check_cache: "CheckCache | None" = None,
+        state: StateStore | None = None,
+        names: NameAllocator | None = None,
     ):
         """
+        Params:
+            forge: the forge hosting the repo, or a callable returning it on first use
+            repo_info: stored metadata for an existing repo, served without API calls
+            head: the latest head commit of an existing repo, if known from a push event
+            mirrors: local mirrors that checks of an existing repo can read history from
+            checker: runs step checks in place of calling the step directly
+            check_cache: recent check results to reuse while the repo is unchanged
+            state: where steps keep values between requests, in memory by default
+            names: reserves the name of a new repo, the process-wide allocator
+                (which reserves nothing) by default
+
         Raises:
             ValueError: current_step is not a valid value (too large or too small
         """
@@ -110,41 +343,95 @@ class Session:
         self.user = user
         self.current_step = current_step
         self.module = module
-        self.github = github
+        self._forge = forge
+        self.checker = checker
+        self.check_cache = check_cache
 
         # create repo if no repo_name is passed
+        self.repo: LazyRepository
         if not repo_name:
-            self.repo = module.create(self.github)
+            self.repo = module.create(self.forge, names)
             self.repo_name = self.repo.name
-            self.repo.add_to_collaborators(user, "admin")
+            self.repo_info: RepoInfo | None = repo_info_from(self.repo)
+            if state is not None:
+                self.repo.state = StepState(state, self.repo_name)
+            self.add_collaborator()
         else:
             self.repo_name = repo_name
-            self.repo = self.github.get_repo(f"{org_name}/{repo_name}")
+            self.repo_info = repo_info
+            self.repo = LazyRepository(
+                lambda: self.forge,
+                f"{org_name}/{repo_name}",
+                repo_info,
+                head,
+                mirrors,
+                StepState(state, repo_name) if state is not None else None,
+            )
+
+    @property
+    def forge(self) -> Forge:
+        """The forge, resolved on first use if a callable was passed"""
+        if callable(self._forge):
+            self._forge = self._forge()
+        return self._forge
+
+    @property
+    def state(self) -> StepState:
+        """Values the module's steps stored about the session's repository"""
+        return self.repo.state
+
+    def add_collaborator(self):
+        """Give the session's user admin access to the repository"""
+        self.repo.add_to_collaborators(self.user, "admin")
 
     def instructions(self) -> str:
         """Return the instructions for the current step"""
         return self.module[self.current_step - 1].instructions(self.repo)
 
+    def check_step(self, step: int | None = None) -> tuple[CheckResult, str]:
+        """Run the check of a step, the current one by default
+
+        A result cached for the same head commit is returned without checking.
+        Results are only cached when the head is known, since without it a
+        push would not be noticed until the cached result expired.
+        """
+        step = step or self.current_step
+        head_sha = self.repo.head.sha if self.repo.head else None
+        cache = self.check_cache if head_sha is not None else None
+        if cache is not None:
+            cached = cache.get(self.repo_name, step, head_sha)
+            if cached:
+                return cached
+
+        if self.checker:
+            result = self.checker(self, step)
+        else:
+            result = self.module[step - 1].check(self.repo, self.user)
+
+        if cache is not None:
+            cache.put(self.repo_name, step, head_sha, result)
+        return result
+
     def check(self) -> bool:
         """Return if the current step passes it's check"""
-        return (
-            self.module[self.current_step - 1].check(self.repo, self.user)
-            == CheckResult.GOOD
-        )
+        return self.check_step()[0] == CheckResult.GOOD
 
-    def next(self) -> bool:
+    def next(self, run_action: bool = True) -> bool:
         """Check the current step and attempt to perform the next steps action
 
+        Params:
+            run_action: perform the next step's action now, False when it is queued
+
         Raises:
             UnrecoverableRepoStateException: the result of the check is unrecoverable
         """
-        step = self.module[self.current_step - 1]
-        check_result, self.toast = step.check(self.repo, self.user)
+        check_result, self.toast = self.check_step()
         match check_result:
             case CheckResult.GOOD:
                 self.current_step += 1
                 step = self.module[self.current_step - 1]
-                step.action(self.repo)
+                if run_action:
+                    step.action(self.repo)
                 self.text = step.instructions(self.repo)
                 return True
             case CheckResult.USER_ERROR:
@@ -159,5 +446,6 @@ class Session:
                 )
 
     def cleanup(self):
-        """Delete the repository associated with this module"""
+        """Delete the repository associated with this module and its step state"""
         self.repo.delete()
+        self.state.clear()
@@ -0,0 +1,75 @@
+from dataclasses import dataclass, field
+
+from .forge import Forge, RepoNotFound, blob_sha
+from .steps import Module
+
+
+@dataclass(frozen=True)
+class TemplateDrift:
+    """How a module's template repository differs from the module's seed files"""
+
+    missing: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    extra: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.missing or self.changed or self.extra)
+
+
+def template_drift(forge: Forge, module: Module) -> TemplateDrift:
+    """Compare a module's template against its seed files
+
+    Only blob SHAs are compared, so the check takes two requests however many
+    files the template holds.
+
+    Raises:
+        RepoNotFound: the template does not exist
+    """
+    if module.template is None or module.seed is None:
+        raise ValueError(f"Module {module.name} has no template")
+
+    info = forge.repo_info(module.template)
+    shas = forge.file_shas(module.template, info["default_branch"])
+    return TemplateDrift(
+        missing=sorted(path for path in module.seed if path not in shas),
+        changed=sorted(
+            path
+            for path, content in module.seed.items()
+            if path in shas and shas[path] != blob_sha(content)
+        ),
+        extra=sorted(path for path in shas if path not in module.seed),
+    )
+
+
+def sync_template(forge: Forge, module: Module) -> TemplateDrift:
+    """Create or update a module's template so it holds the seed files
+
+    Files the template holds beyond the seed are left alone.
+
+    Returns:
+        the drift found before syncing
+    """
+    if module.template is None or module.seed is None:
+        raise ValueError(f"Module {module.name} has no template")
+
+    try:
+        drift = template_drift(forge, module)
+    except RepoNotFound:
+        owner, name = module.template.split("/", 1)
+        info = forge.create_repo(owner, name)
+        forge.commit_files(
+            module.template, info["default_branch"], module.seed, "Add starting files"
+        )
+        forge.mark_template(module.template)
+        return TemplateDrift(missing=sorted(module.seed))
+
+    outdated = drift.missing + drift.changed
+    if outdated:
+        branch = forge.repo_info(module.template)["default_branch"]
+        forge.commit_files(
+            module.template,
+            branch,
+            {path: module.seed[path] for path in outdated},
+            "Update starting files",
+        )
+    return drift
@@ -1,11 +1,95 @@
-from module_core.steps import Module
+import importlib
+import threading
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
-from .basic import module as basic_module
-from .clone_commit_update_push import module as push_after_update_module
+if TYPE_CHECKING:
+    from module_core.steps import Module
 
-active_modules: dict[str, Module] = {
-    "basic module": basic_module,
-    "push-after-update": push_after_update_module,
-}
+# the templates sessions start from, shared with the modules that seed them
+BASIC_TEMPLATE = "cs334f24/basic-module-template"
+PUSH_AFTER_UPDATE_TEMPLATE = "cs334f24/push-after-update-template"
 
-__all__ = ["basic_module", "active_modules"]
+
+@dataclass(frozen=True)
+class ModuleEntry:
+    """What the app needs to know about a module before its steps are loaded"""
+
+    name: str
+    import_path: str
+    total_steps: int
+    template: str | None = None
+
+
+class ModuleRegistry(Mapping[str, "Module"]):
+    """The active modules, each imported the first time it is looked up
+
+    Names, step counts and templates are served from the entries, so routing
+    and registering modules doesn't import any step implementations. Each
+    module is checked against its entry when it is loaded.
+    """
+
+    def __init__(self, entries: list[ModuleEntry]):
+        self.entries = {entry.name: entry for entry in entries}
+        self._loaded: dict[str, Module] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> "Module":
+        module = self._loaded.get(name)
+        if module is not None:
+            return module
+
+        entry = self.entries[name]
+        with self._lock:
+            if name not in self._loaded:
+                module = importlib.import_module(entry.import_path).module
+                self._check(entry, module)
+                self._loaded[name] = module
+            return self._loaded[name]
+
+    @staticmethod
+    def _check(entry: ModuleEntry, module: "Module"):
+        """
+        Raises:
+            ValueError: the module doesn't match what its entry advertises
+        """
+        loaded = (module.name, len(module), module.template)
+        if loaded != (entry.name, entry.total_steps, entry.template):
+            raise ValueError(
+                f"{entry.import_path} defines {loaded}, but the registry lists "
+                f"{(entry.name, entry.total_steps, entry.template)}"
+            )
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+
+active_modules = ModuleRegistry(
+    [
+        ModuleEntry("basic module", "modules.basic", 6, BASIC_TEMPLATE),
+        ModuleEntry(
+            "push-after-update",
+            "modules.clone_commit_update_push",
+            4,
+            PUSH_AFTER_UPDATE_TEMPLATE,
+        ),
+    ]
+)
+
+__all__ = [
+    "BASIC_TEMPLATE",
+    "PUSH_AFTER_UPDATE_TEMPLATE",
+    "ModuleEntry",
+    "ModuleRegistry",
+    "active_modules",
+]
@@ -1,24 +1,31 @@
-from github import Github, GithubException
-from github.Repository import Repository
+from module_core import (
+    CheckResult,
+    Forge,
+    LazyRepository,
+    Module,
+    NameAllocator,
+    Step,
+    create_repo_from_template,
+)
+from modules import BASIC_TEMPLATE as TEMPLATE
+
+SEED = {
+    "README.md": """# README
 
-from module_core import CheckResult, Module, Step, create_repo
+Welcome to git-learner!""",
+}
 
 
 class AddReadme(Step):
     def __init__(self): ...
-    def action(self, repo: Repository):
-        repo.create_file(
-            "README.md",
-            "Initialize repository",
-            """# README
-
-Welcome to git-learner!""",
-        )
+    def action(self, repo: LazyRepository):
+        # the README comes from the module's template
+        pass
 
-    def check(self, repo: Repository) -> tuple[CheckResult, str]:
+    def check(self, repo: LazyRepository, user: str) -> tuple[CheckResult, str]:
         return CheckResult.GOOD, ""
 
-    def instructions(self, repo: Repository) -> str:
+    def instructions(self, repo: LazyRepository) -> str:
         return """
 ## Welcome to Git Learner!
 
@@ -48,18 +55,18 @@ class DummyStep(Step):
     def __init__(self, text: str):
         self.text = text
 
-    def action(self, repo: Repository):
+    def action(self, repo: LazyRepository):
         return
 
-    def check(self, repo: Repository) -> tuple[CheckResult, str]:
+    def check(self, repo: LazyRepository, user: str) -> tuple[CheckResult, str]:
         return CheckResult.GOOD, ""
 
-    def instructions(self, repo: Repository) -> str:
+    def instructions(self, repo: LazyRepository) -> str:
         return f"Instructions: {self.text}"
 
 
-def initialzier(github: Github):
-    return create_repo(github, "cs334f24")
+def initialzier(forge: Forge, names: NameAllocator | None = None):
+    return create_repo_from_template(forge, TEMPLATE, "cs334f24", SEED, names=names)
 
 
 steps: list[Step] = []
@@ -68,4 +75,4 @@ steps.append(AddReadme())
 steps.extend(DummyStep(f"this step does nothing: {i}") for i in range(5))
 
 
-module = Module("basic module", initialzier, steps)
+module = Module("basic module", initialzier, steps, TEMPLATE, SEED)
@@ -1,18 +1,21 @@
-import wonderwords
-from github import Github
-from github.Commit import Commit
-from github.Repository import Repository
-
-from module_core import CheckResult, Module, Step, create_repo
-
-
-class CloneStep(Step):
-    def __init__(self): ...
-    def action(self, repo: Repository):
-        repo.create_file(
-            "README.md",
-            "Add README",
-            """# README
+from module_core import (
+    CheckResult,
+    CommitBuilder,
+    Forge,
+    LazyRepository,
+    Module,
+    NameAllocator,
+    Step,
+    create_repo_from_template,
+    has_merge_of,
+    head_commit,
+    local_history,
+    random_nouns,
+)
+from modules import PUSH_AFTER_UPDATE_TEMPLATE as TEMPLATE
+
+SEED = {
+    "README.md": """# README
 
 It is good practice to include a README.md file within your repository.
 
@@ -20,13 +23,20 @@ It is good practice to include a README.md file within your repository.
 
 - Contributor1
 """,
-        )
-        repo.create_file("favorite_colors.txt", "Create favorite colors file", "red")
+    "favorite_colors.txt": "red",
+}
+
+
+class CloneStep(Step):
+    def __init__(self): ...
+    def action(self, repo: LazyRepository):
+        # the starting files come from the module's template
+        pass
 
-    def check(self, repo: Repository, user: str) -> tuple[CheckResult, str]:
+    def check(self, repo: LazyRepository, user: str) -> tuple[CheckResult, str]:
         return CheckResult.GOOD, ""
 
-    def instructions(self, repo: Repository) -> str:
+    def instructions(self, repo: LazyRepository) -> str:
         name = repo.name
         url = repo.ssh_url
         return f"""
@@ -35,7 +45,8 @@ It is good practice to include a README.md file within your repository.
 The first step to working with a git repo is creating a local copy.
 This is done by using `clone` on repo. The repo you clone is called `origin`.
 
-To get started, open a terminal and navigate to where you would like to store your copy of the repo.
+To get started, open a terminal and navigate to where you would like to store
+your copy of the repo.
 
 ```bash
 git clone {url}
@@ -43,7 +54,8 @@ cd {name}
 ```
 
 You have now created a local copy of {name}.
-When you have work (commits) you want to someone else to have, you `push` them to `origin`.
+When you have work (commits) you want to someone else to have,
+you `push` them to `origin`.
 
 To check the url of `origin`, you can run the following command:
 
@@ -55,24 +67,18 @@ In the next step you will create local changes and push them to `origin`.
 
 
 class PushNoConflict(Step):
-    def __init__(self):
-        self.previous_commit: dict[str, Commit] = {}
-
-    def action(self, repo: Repository):
-        self.previous_commit[repo.name] = repo.get_commits()[0]
-
-    def check(self, repo: Repository, user: str):
-        commits = repo.get_commits()
+    def action(self, repo: LazyRepository):
+        pass
 
-        commit: Commit = commits[0]
-        has_new_commit = commit.author.login == user
+    def check(self, repo: LazyRepository, user: str):
+        has_new_commit = head_commit(repo).author_login == user
 
         if not has_new_commit:
             return CheckResult.USER_ERROR, "No new commit pushed"
 
         return CheckResult.GOOD, "All Good"
 
-    def instructions(self, repo: Repository) -> str:
+    def instructions(self, repo: LazyRepository) -> str:
         return """
 ## Adding Changes Locally
 
@@ -129,27 +135,31 @@ git push origin
 
 
 class PushAfterUpdate(Step):
-    def __init__(self):
-        self.previous_commit: dict[str, Commit] = {}
-
-    def action(self, repo: Repository):
-        r = wonderwords.RandomWord()
-        words = r.random_words(10, include_parts_of_speech=["nouns"])
-        repo.create_file("random_words.txt", "Add random words", "\n".join(words))
-        self.previous_commit[repo.name] = repo.get_commits()[0]
+    def action(self, repo: LazyRepository):
+        words = random_nouns(10)
+        pushed = (
+            CommitBuilder(repo, "Add random words")
+            .add("random_words.txt", "\n".join(words))
+            .commit()
+        )
+        repo.state.set("pushed_commit", pushed)
 
-    def check(self, repo: Repository, user: str) -> tuple[CheckResult, str]:
-        commits = repo.get_commits()
+    def check(self, repo: LazyRepository, user: str) -> tuple[CheckResult, str]:
+        pushed = repo.state.get("pushed_commit")
+        history = local_history(repo) if pushed else None
+        if pushed and history is not None:
+            if not has_merge_of(history, repo.default_branch, pushed):
+                return CheckResult.USER_ERROR, "No merge of the remote changes pushed"
+            return CheckResult.GOOD, "All good!"
 
-        commit: Commit = commits[0]
-        has_new_commit = commit.committer.login == user
+        has_new_commit = head_commit(repo).committer_login == user
 
         if not has_new_commit:
             return CheckResult.USER_ERROR, "No new commit pushed"
 
         return CheckResult.GOOD, "All good!"
 
-    def instructions(self, repo: Repository) -> str:
+    def instructions(self, repo: LazyRepository) -> str:
         return """
 This step goes over how to handle the remote repository having non-conflicting changes.
 
@@ -191,18 +201,18 @@ To push your updated repository to, use `git push origin`.
 
 
 class EndStep(Step):
-    def instructions(self, repo: Repository) -> str:
+    def instructions(self, repo: LazyRepository) -> str:
         return "You have completed this module!"
 
-    def action(self, repo: Repository):
+    def action(self, repo: LazyRepository):
         pass
 
-    def check(self, repo: Repository, user: str) -> tuple[CheckResult, str]:
+    def check(self, repo: LazyRepository, user: str) -> tuple[CheckResult, str]:
         return CheckResult.GOOD, ""
 
 
-def initializer(github: Github):
-    return create_repo(github, "cs334f24")
+def initializer(forge: Forge, names: NameAllocator | None = None):
+    return create_repo_from_template(forge, TEMPLATE, "cs334f24", SEED, names=names)
 
 
 steps: list[Step] = []
@@ -212,4 +222,4 @@ steps.append(PushNoConflict())
 steps.append(PushAfterUpdate())
 steps.append(EndStep())
 
-module = Module("push-after-update", initializer, steps)
+module = Module("push-after-update", initializer, steps, TEMPLATE, SEED)
@@ -0,0 +1,20 @@
+from bench import BENCHMARKS, regressions
+from bench.runner import best_time
+
+
+def test_benchmarks_are_registered():
+    assert "db.sessions.get" in BENCHMARKS
+    assert "rendering.render_markdown" in BENCHMARKS
+    assert "startup.create_app" in BENCHMARKS
+
+
+def test_best_time_is_per_call():
+    calls = []
+    assert best_time(lambda: calls.append(1), min_time=0.001, repeats=2) > 0
+    assert len(calls) > 2
+
+
+def test_regressions_outside_tolerance():
+    baseline = {"fast": 1.0, "slow": 1.0}
+    results = {"fast": 1.2, "slow": 3.0, "new": 5.0}
+    assert regressions(results, baseline, 2.0) == {"slow": 3.0}
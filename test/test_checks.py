@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from flask import Flask
+
+from app.app import github_client, gitlearner
+from app.checks import STREAM_RETRY, run_check, single_flight, step_events
+from app.streams import StreamSlots
+from db import DBManager
+from module_core import CheckCache, CheckResult, FakeForge, Module, Step
+
+
+class CountingStep(Step):
+    def __init__(self):
+        self.calls = 0
+        self.passing = False
+
+    def instructions(self, repo) -> str:
+        return ""
+
+    def action(self, repo):
+        pass
+
+    def check(self, repo, user: str) -> tuple[CheckResult, str]:
+        self.calls += 1
+        if self.passing:
+            return CheckResult.GOOD, ""
+        return CheckResult.USER_ERROR, "No new commit pushed"
+
+
+def test_streams_share_one_check(tmp_path: Path, monkeypatch):
+    db_file = str(tmp_path / "test.sqlite3")
+    monkeypatch.setattr(github_client, "forge", FakeForge())
+    monkeypatch.setattr(github_client, "mirrors", None)
+    monkeypatch.setattr(github_client.budget, "db_file", db_file)
+    monkeypatch.setattr(gitlearner, "checks", CheckCache())
+    app = Flask(__name__)
+    app.config.update(DB_FILE=db_file, GITHUB_ORGANIZATION="org")
+
+    step = CountingStep()
+    module = Module("counted", lambda forge: None, [step])  # type: ignore[arg-type, return-value]
+    db = DBManager(db_file)
+    db.add_user("Student", "student@example.com", "student")
+    db.modules.add({"name": "counted", "base_repo": None, "total_steps": 1})
+    db.sessions.create("student", "counted", "brave-otter")
+
+    with app.app_context():
+        streams = [
+            step_events(db_file, module, "counted", 1, "student", 60, 0)
+            for _ in range(3)
+        ]
+
+        events = [json.loads(next(stream)[len("data: ") :]) for stream in streams]
+        assert {event["status"] for event in events} == {"USER_ERROR"}
+        assert step.calls == 1
+
+        step.passing = True
+        db.checks.invalidate("brave-otter")
+        gitlearner.checks.invalidate("brave-otter")
+        events = [json.loads(next(stream)[len("data: ") :]) for stream in streams]
+        assert {event["status"] for event in events} == {"GOOD"}
+        assert step.calls == 2
+
+
+def test_streams_end_by_asking_the_browser_to_reconnect(tmp_path: Path):
+    db_file = str(tmp_path / "test.sqlite3")
+    module = Module("counted", lambda forge: None, [CountingStep()])  # type: ignore[arg-type, return-value]
+
+    events = list(step_events(db_file, module, "counted", 1, "student", 60, 0, 0))
+    assert events == [f"retry: {STREAM_RETRY}\n\n"]
+
+
+def test_stream_slots_are_capped_per_user_and_in_total():
+    slots = StreamSlots(total=3, per_user=2)
+    assert slots.acquire("a") and slots.acquire("a")
+    assert not slots.acquire("a")
+    assert slots.acquire("b")
+    assert not slots.acquire("c")
+
+    slots.release("a")
+    assert slots.acquire("c")
+    assert not slots.acquire("a")
+
+
+def test_steps_being_prepared_are_not_checked(tmp_path: Path):
+    step = CountingStep()
+    module = Module("counted", lambda forge: None, [step])  # type: ignore[arg-type, return-value]
+    db = DBManager(str(tmp_path / "test.sqlite3"))
+    db.add_user("Student", "student@example.com", "student")
+    db.modules.add({"name": "counted", "base_repo": None, "total_steps": 1})
+    db.sessions.create("student", "counted", "brave-otter")
+    db.jobs.enqueue("step_action", {"repo": "brave-otter", "step": 1})
+
+    context = db.sessions.context("student", "counted")
+    assert context
+    result, _ = run_check(db, module, 1, "student", context)
+    assert result == CheckResult.RECOVERABLE
+    assert step.calls == 0
+
+
+def test_concurrent_checks_share_one_call(tmp_path: Path):
+    db_file = str(tmp_path / "test.sqlite3")
+    DBManager(db_file).close()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def check() -> tuple[CheckResult, str]:
+        calls.append(1)
+        started.set()
+        release.wait()
+        return CheckResult.GOOD, ""
+
+    def click():
+        return single_flight(DBManager(db_file), "brave-otter", 2, check)
+
+    with ThreadPoolExecutor(4) as pool:
+        first = pool.submit(click)
+        started.wait()
+        others = [pool.submit(click) for _ in range(3)]
+        time.sleep(0.2)
+        release.set()
+        results = [first.result()] + [other.result() for other in others]
+
+    assert results == [(CheckResult.GOOD, "")] * 4
+    assert len(calls) == 1
+
+
+def test_waits_on_a_stuck_check_are_bounded(tmp_path: Path):
+    db_file = str(tmp_path / "test.sqlite3")
+    DBManager(db_file).close()
+    started, release = threading.Event(), threading.Event()
+
+    def stuck() -> tuple[CheckResult, str]:
+        started.set()
+        release.wait(5)
+        return CheckResult.USER_ERROR, ""
+
+    def click(check):
+        return single_flight(DBManager(db_file), "brave-otter", 2, check, 0.2, 0.01)
+
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(click, stuck)
+        assert started.wait(5)
+        assert click(lambda: (CheckResult.GOOD, "")) == (CheckResult.GOOD, "")
+        release.set()
+        assert leader.result(timeout=5) == (CheckResult.USER_ERROR, "")
+
+
+def test_checks_wait_for_other_workers(tmp_path: Path):
+    db_file = str(tmp_path / "test.sqlite3")
+    other_worker = DBManager(db_file)
+    assert other_worker.checks.begin("brave-otter", 2, lease=60)
+
+    def check() -> tuple[CheckResult, str]:
+        raise AssertionError("checked while another worker was checking")
+
+    def click():
+        return single_flight(DBManager(db_file), "brave-otter", 2, check, 60, 0.01)
+
+    with ThreadPoolExecutor(1) as pool:
+        waiting = pool.submit(click)
+        time.sleep(0.05)
+        other_worker.checks.record("brave-otter", 2, "USER_ERROR", "Push first")
+        assert waiting.result(timeout=5) == (CheckResult.USER_ERROR, "Push first")
+
+
+def test_checks_take_over_expired_leases(tmp_path: Path):
+    db = DBManager(str(tmp_path / "test.sqlite3"))
+    assert db.checks.begin("brave-otter", 2, lease=0)
+
+    result = single_flight(
+        db, "brave-otter", 2, lambda: (CheckResult.GOOD, ""), poll_interval=0.01
+    )
+
+    assert result == (CheckResult.GOOD, "")
+    check = db.checks.get("brave-otter", 2)
+    assert check and check["status"] == "GOOD" and check["running_until"] == 0
@@ -1,6 +1,10 @@
+import sqlite3
+from types import SimpleNamespace
+
 import pytest
 
 from db import DBManager
+from module_core import HeadCommit, StepState
 
 
 @pytest.fixture
@@ -8,13 +12,226 @@ def db() -> DBManager:
     return DBManager(":memory:")
 
 
+@pytest.fixture
+def user_and_module(db: DBManager) -> tuple[str, str]:
+    db.add_user("Test User", "test@example.com", "test-user")
+    db.modules.add({"name": "test module", "base_repo": None, "total_steps": 3})
+    return "test-user", "test module"
+
+
 def test_add_user(db: DBManager):
     pass
 
 
-def test_create_session(db: DBManager):
-    pass
+def test_create_session(db: DBManager, user_and_module: tuple[str, str]):
+    user, module_name = user_and_module
+    info = {
+        "id": 42,
+        "name": "brave-otter",
+        "ssh_url": "git@github.com:org/brave-otter.git",
+        "default_branch": "main",
+    }
+    session = SimpleNamespace(
+        user=user,
+        module=SimpleNamespace(name=module_name),
+        repo_name="brave-otter",
+        current_step=1,
+        repo_info=info,
+    )
+
+    assert db.sessions.create_from_session(session)
+
+    session_info = db.sessions.get(user, module_name)
+    assert session_info
+    assert session_info["current_step"] == 1
+    assert session_info["repo_info"] == info
 
 
 def test_get_progress(db: DBManager):
     pass
+
+
+def test_pool_claims_oldest_once(db: DBManager, user_and_module: tuple[str, str]):
+    _, module_name = user_and_module
+    for name in ("first-repo", "second-repo"):
+        db.pool.add(
+            module_name,
+            {
+                "id": None,
+                "name": name,
+                "ssh_url": f"git@github.com:org/{name}.git",
+                "default_branch": "main",
+            },
+        )
+
+    assert db.pool.count(module_name) == 2
+    claimed = db.pool.claim(module_name)
+    assert claimed and claimed["name"] == "first-repo"
+    assert db.pool.count(module_name) == 1
+    assert db.pool.claim("missing module") is None
+
+
+def test_job_idempotency_and_retries(db: DBManager):
+    job_id = db.jobs.enqueue("delete_repo", {"repo": "a"}, "delete_repo:a")
+    assert db.jobs.enqueue("delete_repo", {"repo": "a"}, "delete_repo:a") == job_id
+
+    job = db.jobs.claim("worker")
+    assert job and job["id"] == job_id and job["attempts"] == 1
+    assert db.jobs.claim("worker") is None
+
+    db.jobs.fail(job_id, "boom", retry_delay=0)
+    job = db.jobs.claim("worker")
+    assert job and job["attempts"] == 2
+
+    db.jobs.complete(job_id, {"ok": True})
+    job = db.jobs.get(job_id)
+    assert job and job["status"] == "done" and job["result"] == {"ok": True}
+
+
+def test_failed_jobs_are_queued_again(db: DBManager):
+    job_id = db.jobs.enqueue("step_action", {"repo": "a"}, "step_action:a:2", None, 1)
+    assert db.jobs.pending("step_action", "a")
+    assert db.jobs.claim("worker")
+    db.jobs.fail(job_id, "boom", retry_delay=0)
+    assert not db.jobs.pending("step_action", "a")
+
+    assert db.jobs.enqueue("step_action", {"repo": "a"}, "step_action:a:2") == job_id
+    job = db.jobs.get(job_id)
+    assert job and job["status"] == "queued" and job["attempts"] == 0
+
+
+def test_file_database_uses_wal(tmp_path):
+    db = DBManager(str(tmp_path / "test.sqlite3"))
+
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.close()
+
+
+def test_one_session_per_user_and_module(
+    db: DBManager, user_and_module: tuple[str, str]
+):
+    user, module_name = user_and_module
+
+    assert db.sessions.create(user, module_name, "first-repo")
+    assert db.sessions.create(user, module_name, "second-repo")
+    db.sessions.update(user, module_name, 2)
+
+    session_info = db.sessions.get(user, module_name)
+    assert session_info and session_info["repo"] == "second-repo"
+    assert db.sessions.progress(user, module_name) == {
+        "current_step": 2,
+        "total_steps": 3,
+    }
+    assert db.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+
+
+def test_unknown_user_or_module(db: DBManager, user_and_module: tuple[str, str]):
+    user, module_name = user_and_module
+
+    assert not db.sessions.create("nobody", module_name, "repo")
+    assert not db.sessions.create(user, "no module", "repo")
+
+
+def test_context_joins_module_session_and_push(
+    db: DBManager, user_and_module: tuple[str, str]
+):
+    user, module_name = user_and_module
+
+    context = db.sessions.context(user, module_name)
+    assert context and context["session"] is None and context["head"] is None
+    assert context["module"]["total_steps"] == 3
+
+    db.sessions.create(user, module_name, "brave-otter")
+    db.pushes.record("brave-otter", HeadCommit("abc123", user, user))
+
+    context = db.sessions.context(user, module_name)
+    assert context and context["session"] and context["head"]
+    assert context["session"]["repo"] == "brave-otter"
+    assert context["head"].sha == "abc123"
+    assert db.sessions.context(user, "missing module") is None
+
+
+def test_step_check_claims_once_per_interval(db: DBManager):
+    assert db.checks.claim("brave-otter", 2, interval=60)
+    assert not db.checks.claim("brave-otter", 2, interval=60)
+    assert db.checks.claim("brave-otter", 3, interval=60)
+
+    db.checks.record("brave-otter", 2, "USER_ERROR", "No new commit pushed")
+    db.checks.invalidate("brave-otter")
+    assert db.checks.claim("brave-otter", 2, interval=60)
+    check = db.checks.get("brave-otter", 2)
+    assert check and check["status"] == "USER_ERROR"
+
+
+def test_names_in_use_cannot_be_reserved(
+    db: DBManager, user_and_module: tuple[str, str]
+):
+    user, module_name = user_and_module
+    db.sessions.create(user, module_name, "brave-otter")
+
+    assert not db.names.reserve("brave-otter")
+    assert db.names.reserve("calm-heron")
+    assert not db.names.reserve("calm-heron")
+
+
+def test_step_state_is_kept_per_repo(db: DBManager):
+    state = StepState(db.state, "brave-otter")
+    state.set("pushed_commit", "a" * 40)
+    state.set("pushed_commit", "b" * 40)
+    db.state.put("calm-heron", "pushed_commit", "c" * 40)
+    assert state.get("pushed_commit") == "b" * 40
+
+    with pytest.raises(ValueError):
+        state.set("notes", "x" * 1000)
+
+    state.clear()
+    assert state.get("pushed_commit") is None
+    assert db.state.get("calm-heron", "pushed_commit") == "c" * 40
+
+
+def started(user: str, module_name: str, repo: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        user=user,
+        module=SimpleNamespace(name=module_name),
+        repo_name=repo,
+        current_step=1,
+        repo_info=None,
+    )
+
+
+def test_rollup_follows_sessions(
+    db: DBManager, user_and_module: tuple[str, str], monkeypatch: pytest.MonkeyPatch
+):
+    user, module_name = user_and_module
+    db.add_user("Other", "other@example.com", "other")
+    clock = iter([1000.0, 1000.0, 1090.0, 1100.0, 1200.0, 1300.0])
+    monkeypatch.setattr("db.create.time.time", lambda: next(clock))
+
+    db.sessions.create_from_session(started(user, module_name, "brave-otter"))
+    db.sessions.create_from_session(started("other", module_name, "calm-heron"))
+    db.sessions.update(user, module_name, 2)
+    db.sessions.update("other", module_name, 2)
+    db.sessions.update("other", module_name, 3)
+
+    (module,) = db.sessions.rollup()
+    assert [step["sessions"] for step in module["steps"]] == [0, 1, 1]
+    assert [step["finished"] for step in module["steps"]] == [2, 1, 0]
+    first, second, last = module["steps"]
+    # 90s and 100s, then 100s, all counted in the 1 to 2 minute bucket
+    assert first["median_range"] == (60, 120)
+    assert second["median_range"] == (60, 120)
+    assert last["median_range"] is None
+
+    # restarting from scratch moves the session without timing a step
+    assert db.sessions.create_from_session(started("other", module_name, "eager-fox"))
+    db.sessions.delete(user, module_name)
+    (module,) = db.sessions.rollup()
+    assert [step["sessions"] for step in module["steps"]] == [1, 0, 0]
+    assert [step["finished"] for step in module["steps"]] == [2, 1, 0]
+
+
+def test_connection_closes_with_its_block():
+    with DBManager(":memory:") as db:
+        db.add_user("Test User", "test@example.com", "test-user")
+    with pytest.raises(sqlite3.ProgrammingError):
+        db.conn.execute("SELECT 1")
@@ -0,0 +1,340 @@
+import os
+import random
+import subprocess
+import sys
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+from github import GithubException
+
+from app.jobs import Worker
+from db import DBManager
+from module_core import (
+    CheckResult,
+    FakeForge,
+    GithubForge,
+    Module,
+    NameAllocator,
+    NoFreeName,
+    RepoNameTaken,
+    Session,
+    TemplateDrift,
+    blob_sha,
+    create_repo,
+    sync_template,
+    template_drift,
+)
+from modules import ModuleRegistry, active_modules
+
+
+def complete(forge: FakeForge, module: Module, user: str) -> Session:
+    """Walk a new session through every step, pushing before each check"""
+    session = Session(forge, user, "org", module)
+    module[0].action(session.repo)
+    while session.current_step < len(module):
+        forge.push(session.repo.full_name, user)
+        assert session.next(), session.toast
+    return session
+
+
+@pytest.mark.parametrize("module_name", list(active_modules))
+def test_modules_run_offline(module_name: str):
+    forge = FakeForge()
+    module = active_modules[module_name]
+
+    sessions = [complete(forge, module, f"student-{i}") for i in range(100)]
+
+    assert len(forge.repos) == len(sessions)
+    for i, session in enumerate(sessions):
+        repo = forge.repos[session.repo.full_name]
+        assert repo.collaborators == {f"student-{i}": "admin"}
+        assert session.current_step == len(module)
+
+
+def test_checks_need_a_student_push():
+    forge = FakeForge()
+    module = active_modules["push-after-update"]
+    session = Session(forge, "student", "org", module)
+    module[0].action(session.repo)
+    assert session.next()
+
+    result, _ = module[1].check(session.repo, "student")
+    assert result == CheckResult.USER_ERROR
+
+
+def test_taken_names_are_reported():
+    forge = FakeForge()
+    forge.create_repo("org", "brave-otter")
+    with pytest.raises(RepoNameTaken):
+        forge.create_repo("org", "brave-otter")
+
+
+def test_reserved_names_are_never_reused():
+    db = DBManager(":memory:")
+    names = NameAllocator(db.names.reserve, random.Random(0))
+    forge = FakeForge()
+
+    repos = {create_repo(forge, "org", names=names).name for _ in range(200)}
+    assert len(repos) == 200
+
+    taken = next(iter(repos))
+    assert not db.names.reserve(taken)
+    db.names.release(taken)
+    assert db.names.reserve(taken)
+
+
+def test_sessions_reserve_their_repository_name():
+    db = DBManager(":memory:")
+    names = NameAllocator(db.names.reserve, random.Random(0))
+    module = active_modules["basic module"]
+
+    session = Session(FakeForge(), "student", "cs334f24", module, names=names)
+    assert not db.names.reserve(session.repo_name)
+
+
+def test_failed_creates_release_their_name():
+    db = DBManager(":memory:")
+    names = NameAllocator(db.names.reserve, random.Random(0), db.names.release)
+    forge = FakeForge()
+    tried: list[str] = []
+
+    def failing_create(org_name: str, name: str):
+        tried.append(name)
+        if len(tried) == 1:
+            raise RepoNameTaken(name)
+        raise ConnectionError("reset by peer")
+
+    forge.create_repo = failing_create  # type: ignore[method-assign]
+    with pytest.raises(ConnectionError):
+        create_repo(forge, "org", names=names)
+
+    assert not db.names.reserve(tried[0])
+    assert db.names.reserve(tried[1])
+
+
+def test_allocator_gives_up_when_names_run_out():
+    names = NameAllocator(lambda name: False)
+    with pytest.raises(NoFreeName):
+        names.allocate(attempts=3)
+
+
+def test_worker_creates_and_deletes_sessions():
+    forge = FakeForge()
+    db = DBManager(":memory:")
+    db.add_user("Student", "student@example.com", "student")
+    for name, module in active_modules.items():
+        db.modules.add({"name": name, "total_steps": len(module), "base_repo": None})
+    worker = Worker(db, forge, "cs334f24", active_modules)
+
+    job_id = db.jobs.enqueue(
+        "create_session", {"user": "student", "module": "push-after-update"}
+    )
+    assert worker.run_once()
+    job = db.jobs.get(job_id)
+    assert job and job["status"] == "done", job
+    repo = job["result"]["repo"]
+    assert forge.repos[f"cs334f24/{repo}"].files.keys() == {
+        "README.md",
+        "favorite_colors.txt",
+    }
+
+    db.jobs.enqueue("delete_repo", {"repo": repo})
+    assert worker.run_once()
+    assert f"cs334f24/{repo}" not in forge.repos
+
+
+def test_sessions_move_on_once_the_step_action_is_done():
+    forge = FakeForge()
+    db = DBManager(":memory:")
+    db.add_user("Student", "student@example.com", "student")
+    module = active_modules["push-after-update"]
+    db.modules.add({"name": module.name, "total_steps": len(module), "base_repo": None})
+    session = Session(forge, "student", "cs334f24", module)
+    assert db.sessions.create_from_session(session)
+    worker = Worker(db, forge, "cs334f24", active_modules)
+
+    payload = {"user": "student", "module": module.name, "step": 3}
+    db.jobs.enqueue("step_action", {**payload, "repo": session.repo_name})
+    assert db.jobs.pending("step_action", session.repo_name)
+    assert db.sessions.get("student", module.name)["current_step"] == 1  # type: ignore[index]
+
+    assert worker.run_once()
+    assert not db.jobs.pending("step_action", session.repo_name)
+    assert db.sessions.get("student", module.name)["current_step"] == 3  # type: ignore[index]
+
+    # an action for a repository the session no longer uses doesn't move it
+    db.jobs.enqueue("step_action", {**payload, "repo": "old-repo", "step": 4})
+    assert worker.run_once()
+    assert db.sessions.get("student", module.name)["current_step"] == 3  # type: ignore[index]
+
+
+def test_step_state_outlives_the_worker_session():
+    forge = FakeForge()
+    db = DBManager(":memory:")
+    module = active_modules["push-after-update"]
+    worker = Worker(db, forge, "cs334f24", active_modules)
+    repo = Session(forge, "student", "cs334f24", module).repo_name
+
+    db.jobs.enqueue(
+        "step_action",
+        {"user": "student", "module": "push-after-update", "repo": repo, "step": 3},
+    )
+    assert worker.run_once()
+
+    session = Session(forge, "student", "cs334f24", module, repo, 3, state=db.state)
+    pushed = session.state.get("pushed_commit")
+    assert pushed == forge.head_commit(f"cs334f24/{repo}", "main").sha
+
+    db.jobs.enqueue("delete_repo", {"repo": repo})
+    assert worker.run_once()
+    assert session.state.get("pushed_commit") is None
+
+
+class GitDataRequester:
+    """Answers the Git Data API requests of GithubForge.commit_files"""
+
+    is_lazy = True
+
+    def __init__(self, empty: bool):
+        self.empty = empty
+        self.verbs: list[str] = []
+        self.inputs: dict[str, dict] = {}
+
+    def requestJsonAndCheck(self, verb: str, url: str, input: dict | None = None):
+        self.verbs.append(verb)
+        self.inputs[verb + " " + url.split("/")[-1]] = input or {}
+        if verb == "GET" and "/git/ref/" in url:
+            if self.empty:
+                raise GithubException(409, {"message": "Git Repository is empty."})
+            return {}, {"object": {"sha": "parent"}}
+        if verb == "GET":
+            return {}, {"tree": {"sha": "parent-tree"}}
+        if verb == "PUT":
+            return {}, {"commit": {"sha": "first", "tree": {"sha": "first-tree"}}}
+        if url.endswith("/trees"):
+            return {}, {"sha": "tree"}
+        if url.endswith("/commits"):
+            return {}, {"sha": "commit"}
+        return {}, {}
+
+
+FILES = {"README.md": "# README", "a.txt": "a", "b.txt": "b"}
+
+
+def test_commit_files_takes_fixed_requests():
+    requester = GitDataRequester(empty=False)
+    forge = GithubForge(SimpleNamespace(requester=requester))  # type: ignore[arg-type]
+
+    assert forge.commit_files("org/x", "main", FILES, "Add files") == "commit"
+
+    assert requester.verbs == [
+        "GET",
+        "GET",
+        "POST",
+        "POST",
+        "PATCH",
+    ]
+    assert requester.inputs["POST trees"]["base_tree"] == "parent-tree"
+    assert len(requester.inputs["POST trees"]["tree"]) == len(FILES)
+    assert requester.inputs["POST commits"]["parents"] == ["parent"]
+    assert not requester.inputs["PATCH main"]["force"]
+
+
+def test_commit_files_starts_empty_repos():
+    requester = GitDataRequester(empty=True)
+    forge = GithubForge(SimpleNamespace(requester=requester))  # type: ignore[arg-type]
+
+    assert forge.commit_files("org/x", "main", FILES, "Add files") == "commit"
+
+    assert requester.verbs == [
+        "GET",
+        "PUT",
+        "POST",
+        "POST",
+        "PATCH",
+    ]
+    assert requester.inputs["POST trees"]["base_tree"] == "first-tree"
+    assert requester.inputs["POST commits"]["parents"] == []
+    assert requester.inputs["PATCH main"]["force"]
+
+
+def test_sessions_start_from_the_template():
+    forge = FakeForge()
+    module = active_modules["push-after-update"]
+    assert module.template and module.seed
+
+    assert sync_template(forge, module).missing == sorted(module.seed)
+    assert forge.repos[module.template].is_template
+    assert not template_drift(forge, module)
+
+    session = Session(forge, "student", "org", module)
+
+    repo = forge.repos[session.repo.full_name]
+    assert repo.files == module.seed
+    assert len(repo.commits) == 1
+
+
+def test_blob_sha_matches_git():
+    assert blob_sha("hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_template_drift_is_detected_and_synced():
+    forge = FakeForge()
+    module = active_modules["push-after-update"]
+    assert module.template
+    sync_template(forge, module)
+    template = forge.repos[module.template]
+    del template.files["favorite_colors.txt"]
+    template.files["README.md"] = "# Outdated"
+    template.files["notes.txt"] = "kept"
+
+    drift = template_drift(forge, module)
+    assert drift == TemplateDrift(
+        missing=["favorite_colors.txt"], changed=["README.md"], extra=["notes.txt"]
+    )
+
+    assert sync_template(forge, module) == drift
+    assert template_drift(forge, module) == TemplateDrift(extra=["notes.txt"])
+
+
+def test_registry_entries_match_modules():
+    for name, entry in active_modules.entries.items():
+        module = active_modules[name]
+        assert module.name == name
+        assert len(module) == entry.total_steps
+        assert module.template == entry.template
+
+
+def test_registry_rejects_entries_that_drift_from_their_module():
+    entry = active_modules.entries["basic module"]
+    registry = ModuleRegistry([replace(entry, total_steps=entry.total_steps + 1)])
+
+    with pytest.raises(ValueError):
+        registry["basic module"]
+    assert not registry.is_loaded("basic module")
+
+
+def test_registry_loads_modules_on_first_use():
+    registry = ModuleRegistry(list(active_modules.entries.values()))
+
+    assert "push-after-update" in registry
+    assert list(registry) == list(active_modules)
+    assert not registry.is_loaded("push-after-update")
+
+    assert registry["push-after-update"] is active_modules["push-after-update"]
+    assert registry.is_loaded("push-after-update")
+    assert not registry.is_loaded("basic module")
+
+
+def test_importing_the_registry_loads_no_modules():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, modules; assert 'module_core' not in sys.modules",
+        ],
+        cwd=root,
+        check=True,
+    )
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+from app.extensions import _timed
+from app.metrics import FlaskMetrics, Registry, bp, labelled, registry, render
+from db import DBManager
+
+
+@pytest.fixture
+def app(tmp_path: Path):
+    app = Flask(__name__)
+    app.config.update(DB_FILE=str(tmp_path / "test.sqlite3"))
+    FlaskMetrics(app)
+    app.register_blueprint(bp)
+
+    @app.get("/work")
+    def work():
+        DBManager(app.config["DB_FILE"]).modules.get()
+        return "done"
+
+    yield app
+    registry.db_file = None
+    DBManager.query_observer = None
+
+
+def test_requests_and_queries_are_reported(app: Flask):
+    client = app.test_client()
+    assert client.get("/work").status_code == 200
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert (
+        "gitlearner_http_request_duration_seconds_count{"
+        'method="GET",route="work",status="200"} 1'
+    ) in text
+    assert (
+        "gitlearner_sqlite_query_duration_seconds_count{"
+        'route="work",statement="SELECT",step=""} 1'
+    ) in text
+
+
+def test_workers_add_up(tmp_path: Path):
+    workers = [Registry(str(tmp_path / "test.sqlite3")) for _ in range(2)]
+    histograms = [worker.histogram("latency", "Latency") for worker in workers]
+    for histogram in histograms:
+        histogram.observe(0.02, step="CloneStep")
+    histograms[1].observe(20, step="CloneStep")
+    for worker in workers:
+        worker.flush(force=True)
+
+    text = render(
+        workers[0].metrics, DBManager(str(tmp_path / "test.sqlite3")).metrics.all()
+    )
+    assert 'latency_bucket{step="CloneStep",le="0.01"} 0' in text
+    assert 'latency_bucket{step="CloneStep",le="0.025"} 2' in text
+    assert 'latency_bucket{step="CloneStep",le="+Inf"} 3' in text
+    assert 'latency_count{step="CloneStep"} 3' in text
+
+
+def test_github_calls_are_labelled_by_step():
+    request_json = _timed(lambda verb, url, headers=None: (304, {}, ""))
+    with labelled(route="modules.module_step_check", step="PushNoConflict"):
+        request_json("GET", "/repos/org/x/git/ref/heads/main")
+
+    pending = [(*key, value) for key, value in registry._pending.items()]
+    text = render(registry.metrics, pending)
+    assert (
+        "gitlearner_github_request_duration_seconds_count{"
+        'route="modules.module_step_check",status="304",'
+        'step="PushNoConflict",verb="GET"} 1'
+    ) in text
@@ -0,0 +1,120 @@
+import os
+import subprocess
+
+import git
+import pytest
+
+from module_core import (
+    CheckResult,
+    LazyRepository,
+    MirrorStore,
+    MirrorSyncError,
+    has_merge_of,
+    local_history,
+)
+from modules.clone_commit_update_push import PushAfterUpdate
+
+STUDENT = git.Actor("student", "student@example.com")
+
+
+def unreachable_forge():
+    pytest.fail("The forge was contacted")
+
+
+def commit(origin: git.Repo, name: str, parents=None) -> git.Commit:
+    path = f"{origin.working_tree_dir}/{name}"
+    with open(path, "w") as f:
+        f.write(name)
+    origin.index.add([path])
+    return origin.index.commit(
+        f"Add {name}", parent_commits=parents, author=STUDENT, committer=STUDENT
+    )
+
+
+@pytest.fixture
+def origin(tmp_path) -> git.Repo:
+    repo = git.Repo.init(tmp_path / "origins" / "org" / "repo", initial_branch="main")
+    commit(repo, "README.md")
+    return repo
+
+
+@pytest.fixture
+def mirrors(tmp_path) -> MirrorStore:
+    return MirrorStore(
+        str(tmp_path / "mirrors"),
+        lambda full_name: f"file://{tmp_path}/origins/{full_name}",
+    )
+
+
+def lazy_repo(mirrors: MirrorStore) -> LazyRepository:
+    info = {
+        "id": 1,
+        "name": "repo",
+        "ssh_url": "git@github.com:org/repo.git",
+        "default_branch": "main",
+    }
+    return LazyRepository(unreachable_forge, "org/repo", info, mirrors=mirrors)
+
+
+def test_sync_creates_then_fetches(origin: git.Repo, mirrors: MirrorStore):
+    mirror = mirrors.sync("org/repo")
+    assert mirror.bare
+    assert mirror.heads.main.commit.hexsha == origin.head.commit.hexsha
+
+    new = commit(origin, "colors.txt")
+    assert mirrors.sync("org/repo").heads.main.commit.hexsha == new.hexsha
+
+    mirrors.remove("org/repo")
+    with pytest.raises(MirrorSyncError):
+        MirrorStore(mirrors.root, lambda name: "file:///nowhere").sync("org/repo")
+
+
+def test_mirrors_holding_the_pushed_head_are_not_fetched(
+    origin: git.Repo, mirrors: MirrorStore
+):
+    mirrors.sync("org/repo")
+    offline = MirrorStore(mirrors.root, lambda name: "file:///nowhere")
+
+    head = origin.head.commit.hexsha
+    assert offline.current("org/repo", head).heads.main.commit.hexsha == head
+
+    newer = commit(origin, "colors.txt").hexsha
+    with pytest.raises(MirrorSyncError):
+        offline.current("org/repo", newer)
+    assert mirrors.current("org/repo", newer).heads.main.commit.hexsha == newer
+
+
+def test_tokens_reach_git_through_the_environment(mirrors: MirrorStore):
+    store = MirrorStore(mirrors.root, mirrors.remote_url, lambda: "s3cret")
+
+    filled = subprocess.run(
+        ["git", "credential", "fill"],
+        input="protocol=https\nhost=github.com\n\n",
+        env={**os.environ, **store._credentials()},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert "password=s3cret" in filled.stdout.splitlines()
+
+
+def test_merge_check_uses_local_history(origin: git.Repo, mirrors: MirrorStore):
+    base = origin.head.commit
+    pushed = commit(origin, "random_words.txt")
+    step = PushAfterUpdate()
+    repo = lazy_repo(mirrors)
+    repo.state.set("pushed_commit", pushed.hexsha)
+
+    assert step.check(repo, "student")[0] == CheckResult.USER_ERROR
+
+    origin.head.reference = origin.create_head("local", base)
+    origin.head.reset(index=True, working_tree=True)
+    local = commit(origin, "favorite_colors.txt")
+    origin.heads.main.checkout()
+    commit(origin, "merged.txt", parents=[pushed, local])
+
+    assert step.check(repo, "student")[0] == CheckResult.GOOD
+    history = local_history(repo)
+    assert history is not None
+    assert has_merge_of(history, "main", pushed.hexsha)
+    assert not has_merge_of(history, "main", base.hexsha)
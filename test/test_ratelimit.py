@@ -0,0 +1,77 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from app.extensions import _timed
+from app.ratelimit import Priority, RateBudget, RateLimitExceeded
+
+
+@pytest.fixture
+def budget(tmp_path: Path) -> RateBudget:
+    return RateBudget(str(tmp_path / "test.sqlite3"))
+
+
+def respond(budget: RateBudget, remaining: int, reset: float):
+    budget.on_response(
+        200,
+        {
+            "x-ratelimit-remaining": str(remaining),
+            "x-ratelimit-limit": "5000",
+            "x-ratelimit-reset": str(reset),
+            "x-ratelimit-resource": "core",
+        },
+    )
+
+
+def test_unknown_budget_allows_everything(budget: RateBudget):
+    assert all(budget.allows(priority) for priority in Priority)
+
+
+def test_low_budget_defers_low_priority(budget: RateBudget):
+    reset = time.time() + 600
+    respond(budget, 1000, reset)
+
+    assert budget.allows(Priority.INTERACTIVE)
+    assert budget.allows(Priority.PROVISIONING)
+    assert not budget.allows(Priority.CLEANUP)
+    with pytest.raises(RateLimitExceeded):
+        budget.acquire(Priority.CLEANUP)
+
+
+def test_older_window_does_not_overwrite(budget: RateBudget):
+    respond(budget, 4000, time.time() + 600)
+    respond(budget, 10, time.time() - 600)
+
+    info = budget.snapshot()
+    assert info and info["remaining"] == 4000
+
+
+def test_small_changes_are_written_at_most_once_a_second(budget: RateBudget):
+    reset = time.time() + 600
+    respond(budget, 4000, reset)
+    respond(budget, 3990, reset)
+    info = budget.snapshot()
+    assert info and info["remaining"] == 4000
+
+    respond(budget, 3900, reset)
+    info = budget.snapshot()
+    assert info and info["remaining"] == 3900
+
+    budget._written["core"] = (3900, reset, time.monotonic() - budget.WRITE_INTERVAL)
+    respond(budget, 3899, reset)
+    info = budget.snapshot()
+    assert info and info["remaining"] == 3899
+
+
+def test_github_responses_update_the_budget(budget: RateBudget):
+    headers = {
+        "x-ratelimit-remaining": "42",
+        "x-ratelimit-limit": "5000",
+        "x-ratelimit-reset": str(time.time() + 600),
+    }
+    request_json = _timed(lambda verb, url: (200, headers, "{}"), budget.on_response)
+    request_json("GET", "/rate_limit")
+
+    info = budget.snapshot()
+    assert info and info["remaining"] == 42
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from app.rendering import InstructionRenderer, render_markdown
+from module_core import CheckResult, Module, Step
+
+
+class RepoStep(Step):
+    def instructions(self, repo) -> str:
+        return f"""
+## Clone {repo.name}
+
+```bash
+git clone {repo.ssh_url}
+cd {repo.name}
+```
+"""
+
+    def action(self, repo):
+        pass
+
+    def check(self, repo, user: str) -> tuple[CheckResult, str]:
+        return CheckResult.GOOD, ""
+
+
+class LiveStep(RepoStep):
+    def instructions(self, repo) -> str:
+        return f"There are {len(repo.get_commits())} commits"
+
+
+def test_compiled_matches_direct_render():
+    module = Module("test module", lambda github: None, [RepoStep()])
+    repo = SimpleNamespace(name="brave-otter", ssh_url="git@github.com:o/b.git")
+    renderer = InstructionRenderer()
+
+    rendered, _ = renderer.render(module, 0, repo)
+
+    assert renderer.compile(module, 0) is not None
+    assert rendered == render_markdown(module[0].instructions(repo))
+
+
+def test_uncompilable_steps_render_per_request():
+    module = Module("test module", lambda github: None, [LiveStep()])
+    repo = SimpleNamespace(get_commits=lambda: [1, 2, 3])
+    renderer = InstructionRenderer()
+
+    rendered, _ = renderer.render(module, 0, repo)
+
+    assert renderer.compile(module, 0) is None
+    assert "There are 3 commits" in rendered
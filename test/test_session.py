@@ -0,0 +1,164 @@
+import json
+
+import pytest
+
+from module_core import (
+    CheckCache,
+    CheckResult,
+    FakeForge,
+    HeadCommit,
+    LazyRepository,
+    Module,
+    Session,
+    Step,
+    fetch_head,
+)
+from module_core.forge import HeadCache
+
+
+class NoopStep(Step):
+    def instructions(self, repo) -> str:
+        return f"clone {repo.ssh_url} into {repo.name}"
+
+    def action(self, repo):
+        pass
+
+    def check(self, repo, user: str) -> tuple[CheckResult, str]:
+        return CheckResult.GOOD, ""
+
+
+def unreachable_forge():
+    pytest.fail("The forge was contacted")
+
+
+@pytest.fixture
+def module() -> Module:
+    return Module("test module", lambda github: None, [NoopStep(), NoopStep()])
+
+
+def test_stored_metadata_needs_no_github(module: Module):
+    info = {
+        "id": 1,
+        "name": "brave-otter",
+        "ssh_url": "git@github.com:org/brave-otter.git",
+        "default_branch": "main",
+    }
+    session = Session(unreachable_forge, "user", "org", module, "brave-otter", 1, info)
+
+    assert session.instructions() == (
+        "clone git@github.com:org/brave-otter.git into brave-otter"
+    )
+    assert isinstance(session.repo, LazyRepository)
+
+
+def test_missing_metadata_fetched_once(module: Module):
+    forge = FakeForge()
+    forge.create_repo("org", "x")
+    calls = []
+    repo_info = forge.repo_info
+
+    def counted_repo_info(full_name):
+        calls.append(full_name)
+        return repo_info(full_name)
+
+    forge.repo_info = counted_repo_info  # type: ignore[method-assign]
+    session = Session(lambda: forge, "user", "org", module, "x")
+
+    assert session.repo.name == "x"
+    assert calls == []
+    assert session.repo.ssh_url == "git@fake-forge:org/x.git"
+    assert session.repo.default_branch == "main"
+    assert calls == ["org/x"]
+
+
+class FakeRequester:
+    """Answers ref and commit requests the way the GitHub API would"""
+
+    def __init__(self, sha: str):
+        self.sha = sha
+        self.calls: list[str] = []
+
+    def requestJson(self, verb, url, headers=None):
+        self.calls.append(url)
+        etag = f'"{self.sha}"'
+        if (headers or {}).get("If-None-Match") == etag:
+            return 304, {}, ""
+        return 200, {"etag": etag}, json.dumps({"object": {"sha": self.sha}})
+
+    def requestJsonAndCheck(self, verb, url):
+        self.calls.append(url)
+        return {}, {
+            "author": {"login": "author"},
+            "committer": None,
+            "commit": {"committer": {"date": "2024-10-01T12:00:00Z"}},
+        }
+
+
+def test_fetch_head_reuses_unchanged_ref():
+    requester = FakeRequester("abc")
+    cache = HeadCache()
+
+    head = fetch_head(requester, "org/x", "main", cache)
+    assert head == HeadCommit("abc", "author", None, "2024-10-01T12:00:00Z")
+    assert len(requester.calls) == 2
+
+    assert fetch_head(requester, "org/x", "main", cache) is head
+    assert requester.calls[2:] == ["/repos/org/x/git/ref/heads/main"]
+
+    requester.sha = "def"
+    assert fetch_head(requester, "org/x", "main", cache).sha == "def"
+    assert requester.calls[-1] == "/repos/org/x/commits/def"
+
+
+def test_checks_cached_until_the_head_moves(module: Module):
+    calls = []
+
+    def checker(session: Session, step: int) -> tuple[CheckResult, str]:
+        calls.append(session.repo.head)
+        return CheckResult.USER_ERROR, "No new commit pushed"
+
+    cache = CheckCache()
+    info = {"id": 1, "name": "x", "ssh_url": "", "default_branch": "main"}
+
+    def session(head: HeadCommit | None) -> Session:
+        return Session(
+            unreachable_forge,
+            "user",
+            "org",
+            module,
+            "x",
+            1,
+            info,
+            head,
+            checker=checker,
+            check_cache=cache,
+        )
+
+    old = HeadCommit("abc", "bot", "bot")
+    assert not session(old).check()
+    assert not session(old).next()
+    assert len(calls) == 1
+
+    assert not session(HeadCommit("def", "user", "user")).check()
+    assert len(calls) == 2
+
+    cache.invalidate("x")
+    assert not session(old).check()
+    assert len(calls) == 3
+
+    # without a known head a push can't be told apart, so nothing is cached
+    assert not session(None).check()
+    assert not session(None).check()
+    assert len(calls) == 5
+
+
+def test_check_cache_expires_and_evicts():
+    cache = CheckCache(ttl=0)
+    cache.put("x", 1, None, (CheckResult.GOOD, ""))
+    assert cache.get("x", 1, None) is None
+
+    cache = CheckCache(size=1)
+    cache.put("x", 1, "abc", (CheckResult.GOOD, ""))
+    cache.put("y", 1, "abc", (CheckResult.GOOD, ""))
+    assert cache.get("x", 1, "abc") is None
+    assert cache.get("y", 1, "abc") == (CheckResult.GOOD, "")
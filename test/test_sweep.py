@@ -0,0 +1,94 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from app.ratelimit import RateBudget
+from app.sweep import SweepCriteria, Sweeper
+from db import DBManager
+from module_core import FakeForge, Session
+from modules import active_modules
+
+ORG = "cs334f24"
+
+
+@pytest.fixture
+def db() -> DBManager:
+    db = DBManager(":memory:")
+    for name, module in active_modules.items():
+        db.modules.add({"name": name, "total_steps": len(module), "base_repo": None})
+    return db
+
+
+def start(db: DBManager, forge: FakeForge, user: str, module_name: str, step: int):
+    db.add_user(user, f"{user}@example.com", user)
+    session = Session(forge, user, ORG, active_modules[module_name])
+    session.current_step = step
+    assert db.sessions.create_from_session(session)
+    return session.repo_name
+
+
+def test_sweep_removes_matching_sessions(db: DBManager):
+    forge = FakeForge()
+    finished = [
+        start(db, forge, f"done-{i}", "push-after-update", 4) for i in range(10)
+    ]
+    working = start(db, forge, "working", "push-after-update", 2)
+    other = start(db, forge, "other", "basic module", 6)
+
+    criteria = SweepCriteria(completed=True, module="push-after-update")
+    progress = Sweeper(db, forge, ORG, concurrency=3).run(criteria, batch_size=4)
+
+    assert (progress.deleted, progress.failed, progress.retry_at) == (10, 0, None)
+    assert set(forge.repos) == {f"{ORG}/{working}", f"{ORG}/{other}"}
+    assert db.sessions.get("done-0", "push-after-update") is None
+    assert db.sessions.get("working", "push-after-update")
+    assert db.names.reserve(finished[0])
+    assert not criteria.candidates(db)
+
+
+def test_sweep_needs_a_filter(db: DBManager):
+    with pytest.raises(ValueError):
+        Sweeper(db, FakeForge(), ORG).run(SweepCriteria())
+
+
+def test_sweep_keeps_failed_sessions_for_next_time(db: DBManager):
+    forge = FakeForge()
+    repos = [start(db, forge, f"student-{i}", "basic module", 1) for i in range(3)]
+    broken = f"{ORG}/{repos[1]}"
+    delete_repo = forge.delete_repo
+
+    def flaky_delete(full_name: str):
+        if full_name == broken:
+            raise ConnectionError("reset by peer")
+        delete_repo(full_name)
+
+    forge.delete_repo = flaky_delete  # type: ignore[method-assign]
+    progress = Sweeper(db, forge, ORG).run(SweepCriteria(older_than_days=0))
+    assert (progress.deleted, progress.failed) == (2, 1)
+
+    forge.delete_repo = delete_repo  # type: ignore[method-assign]
+    progress = Sweeper(db, forge, ORG).run(SweepCriteria(older_than_days=0))
+    assert (progress.deleted, progress.failed) == (1, 0)
+    assert not forge.repos
+
+
+def test_sweep_stops_when_cleanup_budget_runs_out(db: DBManager, tmp_path: Path):
+    forge = FakeForge()
+    for i in range(3):
+        start(db, forge, f"student-{i}", "basic module", 6)
+    budget = RateBudget(str(tmp_path / "budget.sqlite3"))
+    reset = time.time() + 600
+    budget.on_response(
+        200,
+        {
+            "x-ratelimit-remaining": "100",
+            "x-ratelimit-limit": "5000",
+            "x-ratelimit-reset": str(reset),
+        },
+    )
+
+    progress = Sweeper(db, forge, ORG, budget).run(SweepCriteria(completed=True))
+    assert progress.deleted == 0
+    assert progress.retry_at == reset
+    assert len(forge.repos) == 3
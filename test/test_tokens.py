@@ -0,0 +1,55 @@
+import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from app import extensions
+from app.extensions import FlaskGithub
+
+
+class CountingIntegration:
+    minted = 0
+
+    def __init__(self, auth):
+        pass
+
+    def get_org_installation(self, org_name: str):
+        return SimpleNamespace(id=1)
+
+    def get_access_token(self, installation_id: int):
+        CountingIntegration.minted += 1
+        expires = datetime.datetime.now(datetime.UTC) + datetime.timedelta(hours=1)
+        return SimpleNamespace(token=f"token-{self.minted}", expires_at=expires)
+
+
+@pytest.fixture
+def app(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Flask:
+    monkeypatch.setattr(extensions, "GithubIntegration", CountingIntegration)
+    CountingIntegration.minted = 0
+
+    app = Flask(__name__)
+    app.config.update(
+        DB_FILE=str(tmp_path / "test.sqlite3"),
+        GITHUB_APP_ID=1,
+        GITHUB_ORGANIZATION="org",
+        GITHUB_PRIVATE_KEY="not a real key",
+    )
+    return app
+
+
+def test_init_makes_no_requests(app: Flask):
+    FlaskGithub(app)
+
+    assert CountingIntegration.minted == 0
+
+
+def test_workers_share_one_token(app: Flask):
+    workers = [FlaskGithub(app) for _ in range(3)]
+
+    for worker in workers:
+        worker.get_client()
+
+    assert {worker.token for worker in workers} == {"token-1"}
+    assert CountingIntegration.minted == 1
@@ -0,0 +1,83 @@
+import hashlib
+import hmac
+import json
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+from app.app import database
+from app.webhooks import bp
+from db import DBManager
+
+SECRET = "test-secret"
+PUSH_PAYLOAD = (Path(__file__).parent / "payloads" / "push.json").read_bytes()
+
+
+@pytest.fixture
+def app(tmp_path: Path) -> Flask:
+    app = Flask(__name__)
+    app.config.update(
+        DB_FILE=str(tmp_path / "test.sqlite3"),
+        GITHUB_WEBHOOK_SECRET=SECRET,
+    )
+    database.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
+
+def post_event(app: Flask, event: str, body: bytes, secret: str = SECRET):
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return app.test_client().post(
+        "/webhooks/github",
+        data=body,
+        content_type="application/json",
+        headers={
+            "X-GitHub-Event": event,
+            "X-GitHub-Delivery": "72d3162e-cc78-11e3-81ab-4c9367dc0958",
+            "X-Hub-Signature-256": f"sha256={signature}",
+        },
+    )
+
+
+def test_push_records_head(app: Flask):
+    response = post_event(app, "push", PUSH_PAYLOAD)
+
+    assert response.json == {"status": "recorded"}
+    head = DBManager(app.config["DB_FILE"]).pushes.get("brave-otter")
+    assert head
+    assert head.sha == "0d1a26e67d8f5eaf1f6ba5c57fc3c7d91ac0fd1c"
+    assert head.author_login == head.committer_login == "student"
+
+
+def test_bad_signature_is_rejected(app: Flask):
+    response = post_event(app, "push", PUSH_PAYLOAD, secret="wrong")
+
+    assert response.status_code == 401
+    assert DBManager(app.config["DB_FILE"]).pushes.get("brave-otter") is None
+
+
+def test_other_branches_are_ignored(app: Flask):
+    payload = json.loads(PUSH_PAYLOAD)
+    payload["ref"] = "refs/heads/feature"
+
+    response = post_event(app, "push", json.dumps(payload).encode())
+
+    assert response.json == {"status": "ignored"}
+
+
+def test_late_deliveries_of_older_pushes_are_ignored(app: Flask):
+    newer = json.loads(PUSH_PAYLOAD)
+    older = json.loads(PUSH_PAYLOAD)
+    older["head_commit"]["id"] = older["before"]
+    older["repository"]["pushed_at"] -= 60
+
+    assert post_event(app, "push", json.dumps(newer).encode()).json == {
+        "status": "recorded"
+    }
+    assert post_event(app, "push", json.dumps(older).encode()).json == {
+        "status": "stale"
+    }
+
+    head = DBManager(app.config["DB_FILE"]).pushes.get("brave-otter")
+    assert head and head.sha == newer["head_commit"]["id"]